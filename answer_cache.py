@@ -0,0 +1,257 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from monitoring import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+
+class SemanticAnswerCache:
+    """Cache of RAG answers looked up by query embedding similarity.
+
+    Each entry stores the query embedding, the answer and the pages it was
+    generated from, together with the content hash each page had in the index
+    at the time. A new query whose embedding has a cosine similarity of at
+    least the threshold with a cached query gets the cached answer.
+
+    The index version and page hashes are those the indexer records on the
+    live collection in Qdrant (see VectorStore.record_index_version()), so
+    servers on other hosts see every re-index. Callers pass the current
+    version to refresh() before using the cache. Entries are dropped when any
+    of their pages is re-indexed with different content, when they expire,
+    and least recently used first when the cache is full. While the index
+    version is unknown, nothing is cached.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        threshold: float = 0.95,
+        ttl: float = 86400
+    ):
+        """Initialize the cache.
+
+        Args:
+            max_entries (int): Maximum number of answers before the least recently used is evicted.
+            threshold (float): Minimum cosine similarity between queries for a hit.
+            ttl (float): Seconds an answer stays valid. 0 disables expiry.
+        """
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+
+        # Index version the entries were checked against, and its page content hashes
+        self.index_version: Optional[str] = None
+        self.page_versions: Dict[str, str] = {}
+        self.warned_unversioned = False
+
+        # entry id -> {"embedding_key", "query", "vector", "result", "page_versions", "stored_at"}
+        self.entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self.next_id = 0
+        self.matrix: Optional[np.ndarray] = None
+        self.matrix_ids: List[int] = []
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.expirations = 0
+
+    def is_current(self, index_version: Optional[str]) -> bool:
+        """Whether the cache was last refreshed against this index version."""
+        return index_version is not None and index_version == self.index_version
+
+    def refresh(self, index_version: Optional[str], page_versions: Dict[str, str]):
+        """Switch to a new index version and drop answers citing pages whose content changed.
+
+        Args:
+            index_version (Optional[str]): The live index version, see
+                NotionSearch.get_index_version(). None if the index has no recorded
+                version, which empties the cache and disables it until it has one.
+            page_versions (Dict[str, str]): Content hash of each page in that version.
+        """
+        with self.lock:
+            if index_version is None:
+                if not self.warned_unversioned:
+                    logger.warning("The live collection has no recorded index version; the answer cache is disabled until the next index or sync")
+                    self.warned_unversioned = True
+                self.invalidations += len(self.entries)
+                self.remove_entries(list(self.entries))
+                self.index_version = None
+                self.page_versions = {}
+                return
+
+            self.warned_unversioned = False
+            stale = [
+                entry_id for entry_id, entry in self.entries.items()
+                if any(page_versions.get(page_id) != version for page_id, version in entry["page_versions"].items())
+            ]
+            self.remove_entries(stale)
+            self.invalidations += len(stale)
+            if stale:
+                logger.info(f"Invalidated {len(stale)} cached answers citing re-indexed pages")
+            self.index_version = index_version
+            self.page_versions = page_versions
+
+    def remove_entries(self, entry_ids: List[int]):
+        for entry_id in entry_ids:
+            self.entries.pop(entry_id, None)
+        if entry_ids:
+            self.matrix = None
+
+    def get_matrix(self) -> Tuple[List[int], Optional[np.ndarray]]:
+        """Return the entry ids and their stacked query vectors, rebuilt after changes."""
+        if self.matrix is None and self.entries:
+            self.matrix_ids = list(self.entries)
+            self.matrix = np.stack([self.entries[entry_id]["vector"] for entry_id in self.matrix_ids])
+        return self.matrix_ids, self.matrix
+
+    @staticmethod
+    def normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding_key: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Look up the answer to the most similar cached query.
+
+        Args:
+            embedding_key (str): Identifies the embedding model and size; only
+                entries stored under the same key are compared.
+            embedding (List[float]): The query embedding.
+
+        Returns:
+            Optional[Dict[str, Any]]: The cached result, with "cached_query" and
+                "similarity" added, or None on a miss.
+        """
+        vector = self.normalize(embedding)
+
+        with self.lock:
+            if self.index_version is None:
+                return None
+
+            if self.ttl:
+                now = time.time()
+                expired = [entry_id for entry_id, entry in self.entries.items() if now - entry["stored_at"] > self.ttl]
+                self.remove_entries(expired)
+                self.expirations += len(expired)
+
+            best_id, best_similarity = None, self.threshold
+            entry_ids, matrix = self.get_matrix()
+            if matrix is not None and matrix.shape[1] == vector.shape[0]:
+                similarities = matrix @ vector
+                for i in np.argsort(-similarities):
+                    if similarities[i] < self.threshold:
+                        break
+                    if self.entries[entry_ids[i]]["embedding_key"] == embedding_key:
+                        best_id, best_similarity = entry_ids[i], float(similarities[i])
+                        break
+
+            if best_id is None:
+                self.misses += 1
+                record_cache_lookup("answer", 0, 1)
+                return None
+
+            self.hits += 1
+            record_cache_lookup("answer", 1, 0)
+            self.entries.move_to_end(best_id)
+            entry = self.entries[best_id]
+            return dict(entry["result"], cached_query=entry["query"], similarity=round(best_similarity, 4))
+
+    def put(self, embedding_key: str, query: str, embedding: List[float], result: Dict[str, Any]):
+        """Store a RAG answer.
+
+        Args:
+            embedding_key (str): Identifies the embedding model and size.
+            query (str): The query the answer was generated for.
+            embedding (List[float]): The query embedding.
+            result (Dict[str, Any]): The RAG result, with "answer" and "pages". Answers citing
+                no pages are not cached, since no re-index would ever invalidate them.
+        """
+        if not result["pages"]:
+            return
+
+        with self.lock:
+            if self.index_version is None:
+                return
+
+            self.entries[self.next_id] = {
+                "embedding_key": embedding_key,
+                "query": query,
+                "vector": self.normalize(embedding),
+                "result": result,
+                "page_versions": {page["page_id"]: self.page_versions.get(page["page_id"]) for page in result["pages"]},
+                "stored_at": time.time()
+            }
+            self.next_id += 1
+            self.matrix = None
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_pages(self, page_ids: List[str]):
+        """Drop every answer citing one of the pages, e.g. after re-indexing them in this process."""
+        page_ids = set(page_ids)
+        with self.lock:
+            stale = [
+                entry_id for entry_id, entry in self.entries.items()
+                if page_ids.intersection(entry["page_versions"])
+            ]
+            self.remove_entries(stale)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.remove_entries(list(self.entries))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and cache occupancy."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "expirations": self.expirations
+        }
+
+
+_default_answer_cache = None
+_default_answer_cache_lock = threading.Lock()
+
+
+def get_default_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Return the process-wide answer cache, configured from environment variables.
+
+    ANSWER_CACHE_SIZE bounds the number of answers (0 disables the cache),
+    ANSWER_CACHE_THRESHOLD is the minimum query similarity for a hit and
+    ANSWER_CACHE_TTL the lifetime of an answer in seconds.
+    """
+    global _default_answer_cache
+
+    max_entries = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+    if max_entries <= 0:
+        return None
+
+    with _default_answer_cache_lock:
+        if _default_answer_cache is None:
+            _default_answer_cache = SemanticAnswerCache(
+                max_entries=max_entries,
+                threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+                ttl=float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+            )
+
+        return _default_answer_cache
@@ -1,12 +1,17 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 import os
 import sys
 from dotenv import load_dotenv
 import traceback
+import time
 
 try:
-    from search import NotionSearch
-    from rag import RAGProcessor
+    from services import get_services
+    from search import SEARCH_MODES
+    from vector_store import EmbeddingMismatchError
+    from query_cache import get_default_query_cache
+    from answer_cache import get_default_answer_cache
+    from monitoring import REQUEST_LATENCY, render_metrics
 except ImportError as e:
     print(f"Import error: {e}")
     sys.exit(1)
@@ -14,9 +19,35 @@ except ImportError as e:
 # Load environment variables
 load_dotenv()
 
+MAX_BATCH_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "512"))
+
 # Initialize Flask app
 app = Flask(__name__)
 
+# Build the shared clients once per worker instead of on every request.
+# A collection built with other embeddings stops the worker, like the async
+# server, rather than serving meaningless results.
+services = get_services()
+try:
+    services.warm()
+except EmbeddingMismatchError:
+    raise
+except Exception as e:
+    print(f"Service warm-up failed, clients will be built on first request: {e}")
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    # Label by route pattern rather than path, so queries don't each get a series
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_LATENCY.labels(endpoint=endpoint, method=request.method, status=str(response.status_code)).observe(
+        time.perf_counter() - g.start_time
+    )
+    return response
+
 # Root route
 @app.route("/")
 def index():
@@ -25,7 +56,9 @@ def index():
         "message": "Notion Search API is running",
         "endpoints": {
             "health": "/health",
+            "metrics": "/metrics",
             "search": "/search/<query>",
+            "search_batch": "POST /search/batch",
             "rag": "/rag/<query>"
         }
     })
@@ -33,16 +66,25 @@ def index():
 # Health check endpoint
 @app.route("/health")
 def health():
-    return jsonify({"status": "ok"})
+    answer_cache = get_default_answer_cache()
+    return jsonify({
+        "status": "ok",
+        "query_cache": get_default_query_cache().get_stats(),
+        "answer_cache": answer_cache.get_stats() if answer_cache else None
+    })
 
 # Search endpoint
 @app.route("/search/<query>")
 def search(query):
+    mode = request.args.get('mode')
+    if mode is not None and mode not in SEARCH_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(SEARCH_MODES)}"}), 400
+    
     try:
         limit = request.args.get('limit', default=5, type=int)
-        search_client = NotionSearch()
-        results = search_client.search(query, limit=limit)
-        return jsonify({"results": results})
+        timings = {}
+        results = services.search.search(query, limit=limit, mode=mode, timings=timings)
+        return jsonify({"results": results, "timings": timings})
     except Exception as e:
         error_details = {
             "error": str(e),
@@ -51,12 +93,54 @@ def search(query):
         print(f"Error in search endpoint: {error_details}")
         return jsonify(error_details), 500
 
+# Batch search endpoint: {"queries": [...], "limit": 5, "mode": "dense", "group_by_page": true}
+@app.route("/search/batch", methods=["POST"])
+def search_batch():
+    body = request.get_json(silent=True) or {}
+    queries = body.get("queries")
+    if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+        return jsonify({"error": "queries must be a list of strings"}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"at most {MAX_BATCH_QUERIES} queries per batch"}), 400
+    limit = body.get("limit", 5)
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    group_by_page = body.get("group_by_page", True)
+    if not isinstance(group_by_page, bool):
+        return jsonify({"error": "group_by_page must be true or false"}), 400
+    mode = body.get("mode")
+    if mode is not None and mode not in SEARCH_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(SEARCH_MODES)}"}), 400
+    
+    try:
+        timings = {}
+        results = services.search.search_batch(
+            queries,
+            limit=limit,
+            group_by_page=group_by_page,
+            mode=mode,
+            timings=timings
+        )
+        return jsonify({"results": results, "timings": timings})
+    except Exception as e:
+        error_details = {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+        print(f"Error in batch search endpoint: {error_details}")
+        return jsonify(error_details), 500
+
+# Prometheus metrics endpoint
+@app.route("/metrics")
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
 # RAG endpoint
 @app.route("/rag/<query>")
 def rag(query):
     try:
-        rag_processor = RAGProcessor()
-        result = rag_processor.generate_response(query)
+        result = services.rag.generate_response(query)
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
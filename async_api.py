@@ -0,0 +1,189 @@
+"""ASGI version of the API with streaming RAG answers.
+
+Run with: hypercorn async_api:app --bind 0.0.0.0:8001
+"""
+import os
+import json
+import sys
+import traceback
+import time
+from dotenv import load_dotenv
+from quart import Quart, Response, g, jsonify, request, make_response
+
+try:
+    from services import AsyncServiceContainer
+    from search import SEARCH_MODES
+    from query_cache import get_default_query_cache
+    from monitoring import REQUEST_LATENCY, render_metrics
+    from answer_cache import get_default_answer_cache
+except ImportError as e:
+    print(f"Import error: {e}")
+    sys.exit(1)
+
+# Load environment variables
+load_dotenv()
+
+MAX_BATCH_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "512"))
+
+# Initialize Quart app
+app = Quart(__name__)
+services = AsyncServiceContainer()
+
+
+@app.before_serving
+async def startup():
+    await services.start()
+
+
+@app.after_serving
+async def shutdown():
+    await services.close()
+
+
+@app.before_request
+async def start_timer():
+    g.start_time = time.perf_counter()
+
+
+@app.after_request
+async def record_latency(response):
+    # Streamed responses are timed until their headers are sent; see LLM_LATENCY for the answer
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_LATENCY.labels(endpoint=endpoint, method=request.method, status=str(response.status_code)).observe(
+        time.perf_counter() - g.start_time
+    )
+    return response
+
+
+# Root route
+@app.route("/")
+async def index():
+    return jsonify({
+        "status": "ok",
+        "message": "Notion Search async API is running",
+        "endpoints": {
+            "health": "/health",
+            "metrics": "/metrics",
+            "search": "/search/<query>",
+            "search_batch": "POST /search/batch",
+            "rag": "/rag/<query>",
+            "rag_stream": "/rag/stream/<query>"
+        }
+    })
+
+
+# Health check endpoint
+@app.route("/health")
+async def health():
+    answer_cache = get_default_answer_cache()
+    return jsonify({
+        "status": "ok",
+        "query_cache": get_default_query_cache().get_stats(),
+        "answer_cache": answer_cache.get_stats() if answer_cache else None
+    })
+
+
+# Search endpoint
+@app.route("/search/<query>")
+async def search(query):
+    mode = request.args.get('mode')
+    if mode is not None and mode not in SEARCH_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(SEARCH_MODES)}"}), 400
+    
+    try:
+        limit = request.args.get('limit', default=5, type=int)
+        timings = {}
+        results = await services.search.search(query, limit=limit, mode=mode, timings=timings)
+        return jsonify({"results": results, "timings": timings})
+    except Exception as e:
+        error_details = {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+        print(f"Error in search endpoint: {error_details}")
+        return jsonify(error_details), 500
+
+
+# Batch search endpoint: {"queries": [...], "limit": 5, "mode": "dense", "group_by_page": true}
+@app.route("/search/batch", methods=["POST"])
+async def search_batch():
+    body = await request.get_json(silent=True) or {}
+    queries = body.get("queries")
+    if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+        return jsonify({"error": "queries must be a list of strings"}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"at most {MAX_BATCH_QUERIES} queries per batch"}), 400
+    limit = body.get("limit", 5)
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    group_by_page = body.get("group_by_page", True)
+    if not isinstance(group_by_page, bool):
+        return jsonify({"error": "group_by_page must be true or false"}), 400
+    mode = body.get("mode")
+    if mode is not None and mode not in SEARCH_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(SEARCH_MODES)}"}), 400
+    
+    try:
+        timings = {}
+        results = await services.search.search_batch(
+            queries,
+            limit=limit,
+            group_by_page=group_by_page,
+            mode=mode,
+            timings=timings
+        )
+        return jsonify({"results": results, "timings": timings})
+    except Exception as e:
+        error_details = {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+        print(f"Error in batch search endpoint: {error_details}")
+        return jsonify(error_details), 500
+
+
+# Prometheus metrics endpoint
+@app.route("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
+# RAG endpoint
+@app.route("/rag/<query>")
+async def rag(query):
+    try:
+        result = await services.rag.generate_response(query)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Streaming RAG endpoint (Server-Sent Events)
+@app.route("/rag/stream/<query>")
+async def rag_stream(query):
+    try:
+        rag_processor = services.rag
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 500
+
+    async def events():
+        async for event, data in rag_processor.stream_response(query):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+    response = await make_response(
+        events(),
+        {
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+    # The answer can take longer than Quart's default response timeout
+    response.timeout = None
+    return response
+
+
+if __name__ == "__main__":
+    print("Starting Quart server on port 8001...")
+    app.run(host="0.0.0.0", port=8001)
@@ -0,0 +1,175 @@
+import logging
+from collections import Counter
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Blocks whose text is their rich_text array, written after a prefix
+RICH_TEXT_PREFIXES = {
+    "paragraph": "",
+    "heading_1": "# ",
+    "heading_2": "## ",
+    "heading_3": "### ",
+    "bulleted_list_item": "• ",
+    "numbered_list_item": "• ",
+    "quote": "> ",
+    "toggle": "",
+    "template": ""
+}
+
+# Block type -> function returning the text line of other blocks, or None if it has no text
+BLOCK_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Optional[str]]] = {}
+
+# Blocks that only hold other blocks or have no text of their own; their
+# children are fetched and extracted separately
+LAYOUT_BLOCK_TYPES = {
+    "breadcrumb", "column", "column_list", "divider", "link_to_page",
+    "synced_block", "table", "table_of_contents", "unsupported"
+}
+
+
+def handles(*block_types: str):
+    """Register the decorated function as the handler of the given block types."""
+    def register(handler):
+        for block_type in block_types:
+            BLOCK_HANDLERS[block_type] = handler
+        return handler
+    return register
+
+
+def join_rich_text(rich_text: List[Dict[str, Any]]) -> str:
+    """Join a rich_text array into one line of plain text.
+
+    The items are consecutive runs of one text, so they are joined without
+    separators (a single run, the usual case, is taken as is); line breaks
+    inside the text become spaces, so every block is one line.
+    """
+    if len(rich_text) == 1:
+        text = rich_text[0].get("plain_text", "")
+    else:
+        text = "".join([item.get("plain_text", "") for item in rich_text])
+    if "\n" in text:
+        text = text.replace("\n", " ")
+    return text
+
+
+def get_caption(value: Dict[str, Any]) -> str:
+    return join_rich_text(value.get("caption", []))
+
+
+@handles("to_do")
+def extract_to_do(block: Dict[str, Any]) -> Optional[str]:
+    value = block["to_do"]
+    text = join_rich_text(value.get("rich_text", []))
+    return f"[{'x' if value.get('checked') else ' '}] {text}" if text else None
+
+
+@handles("callout")
+def extract_callout(block: Dict[str, Any]) -> Optional[str]:
+    value = block["callout"]
+    text = join_rich_text(value.get("rich_text", []))
+    icon = value.get("icon") or {}
+    if text and icon.get("type") == "emoji":
+        return f"{icon['emoji']} {text}"
+    return text
+
+
+@handles("code")
+def extract_code(block: Dict[str, Any]) -> Optional[str]:
+    value = block["code"]
+    code = join_rich_text(value.get("rich_text", []))
+    if not code:
+        return None
+    caption = get_caption(value)
+    language = value.get("language", "")
+    return f"{caption}: {language} code: {code}" if caption else f"{language} code: {code}"
+
+
+@handles("equation")
+def extract_equation(block: Dict[str, Any]) -> str:
+    return block["equation"].get("expression", "").strip()
+
+
+@handles("table_row")
+def extract_table_row(block: Dict[str, Any]) -> Optional[str]:
+    cells = [join_rich_text(cell) for cell in block["table_row"].get("cells", [])]
+    return " | ".join(cells) if any(cells) else None
+
+
+@handles("bookmark", "embed", "link_preview")
+def extract_link(block: Dict[str, Any]) -> Optional[str]:
+    value = block[block["type"]]
+    url = value.get("url", "")
+    caption = get_caption(value)
+    return f"{caption} ({url})" if caption and url else caption or url
+
+
+@handles("image", "video", "audio", "file", "pdf")
+def extract_media(block: Dict[str, Any]) -> Optional[str]:
+    value = block[block["type"]]
+    return get_caption(value) or value.get("name", "")
+
+
+@handles("child_page", "child_database")
+def extract_child_title(block: Dict[str, Any]) -> str:
+    return block[block["type"]].get("title", "").strip()
+
+
+def extract_blocks(blocks: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Dict[str, int]]]:
+    """Extract the text of Notion blocks, one line per block with text.
+
+    Each block is dispatched on its type: text blocks through
+    RICH_TEXT_PREFIXES, which covers most blocks of a typical page without a
+    function call, and the others through BLOCK_HANDLERS. A line of another
+    block that starts with "#" gets a backslash in front, so only headings
+    read as headings to the chunker.
+
+    Args:
+        blocks (List[Dict[str, Any]]): Blocks in document order, e.g. from
+            NotionConnector.fetch_page_content().
+
+    Returns:
+        Tuple[str, Dict[str, Dict[str, int]]]: The text, and per block type the number
+            of blocks "extracted", "skipped" (layout, empty or unknown types) and
+            "failed".
+    """
+    lines = []
+    # Only the rare outcomes are counted per block; extracted counts are derived at the end
+    skipped = Counter()
+    failed = Counter()
+
+    for block in blocks:
+        block_type = block.get("type")
+        prefix = RICH_TEXT_PREFIXES.get(block_type)
+        try:
+            if prefix is not None:
+                text = join_rich_text(block[block_type].get("rich_text", []))
+                if text:
+                    if prefix:
+                        text = prefix + text
+                    elif text[0] == "#":
+                        text = "\\" + text
+            else:
+                handler = BLOCK_HANDLERS.get(block_type)
+                if handler is None:
+                    if block_type not in LAYOUT_BLOCK_TYPES:
+                        logger.debug(f"No text extractor for block type {block_type}")
+                    skipped[block_type] += 1
+                    continue
+                text = handler(block)
+                if text and text[0] == "#":
+                    text = "\\" + text
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            logger.warning(f"Error extracting {block_type} block {block.get('id')}: {str(e)}")
+            failed[block_type] += 1
+            continue
+
+        if text:
+            lines.append(text)
+        else:
+            skipped[block_type] += 1
+
+    extracted = Counter(block.get("type") for block in blocks)
+    extracted.subtract(skipped)
+    extracted.subtract(failed)
+    return "\n".join(lines), {"extracted": dict(+extracted), "skipped": dict(skipped), "failed": dict(failed)}
@@ -0,0 +1,111 @@
+import os
+import json
+import logging
+import tempfile
+import threading
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+
+class IndexCheckpoint:
+    """Append-only journal of a full index run, used to resume it after a failure.
+
+    The first record names the versioned collection being built; later records
+    mark each page as fetched, embedded or upserted. Every record is fsynced,
+    so the journal never claims more progress than was durably made.
+    """
+
+    STAGES = ("fetched", "embedded", "upserted")
+
+    def __init__(self, path: Optional[str] = None):
+        """Initialize the checkpoint, loading an existing journal if there is one.
+
+        Args:
+            path (Optional[str]): Journal location. Defaults to INDEX_CHECKPOINT_PATH,
+                or a file in the system temp directory.
+        """
+        self.path = path or os.getenv("INDEX_CHECKPOINT_PATH") or os.path.join(
+            tempfile.gettempdir(), "notion_index_checkpoint.jsonl"
+        )
+        self.collection_name: Optional[str] = None
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.file = None
+        self.load()
+
+    def load(self):
+        """Replay the journal from disk. A torn final line from a crash is ignored."""
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Ignoring incomplete checkpoint record in {self.path}")
+                    continue
+                self._apply(record)
+
+        upserted = sum(1 for entry in self.pages.values() if entry.get("status") == "upserted")
+        logger.info(f"Loaded index checkpoint for {self.collection_name}: {upserted}/{len(self.pages)} pages upserted")
+
+    def _apply(self, record: Dict[str, Any]):
+        if record["event"] == "start":
+            self.collection_name = record["collection"]
+            self.pages = {}
+        elif record["event"] in self.STAGES:
+            entry = self.pages.setdefault(record["page_id"], {})
+            entry.update({key: value for key, value in record.items() if key not in ("event", "page_id")})
+            # Stages only move forward, even if records from worker threads interleave
+            if self.STAGES.index(record["event"]) >= self.STAGES.index(entry.get("status", "fetched")):
+                entry["status"] = record["event"]
+
+    def _append(self, record: Dict[str, Any]):
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a")
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self._apply(record)
+
+    def start(self, collection_name: str):
+        """Begin a new journal for a run building the given collection."""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+            self.file = open(self.path, "w")
+        self._append({"event": "start", "collection": collection_name})
+        logger.info(f"Started index checkpoint for {collection_name} at {self.path}")
+
+    def record(self, stage: str, page_id: str, **fields):
+        """Durably record that a page reached a stage.
+
+        Args:
+            stage (str): One of "fetched", "embedded" or "upserted".
+            page_id (str): The Notion page ID.
+            **fields: Extra page details to remember, e.g. last_edited_time,
+                content_hash and chunks.
+        """
+        self._append({"event": stage, "page_id": page_id, **fields})
+
+    def get_completed_pages(self) -> Dict[str, Dict[str, Any]]:
+        """Return the pages whose chunks are all upserted, keyed by page ID."""
+        return {page_id: entry for page_id, entry in self.pages.items() if entry.get("status") == "upserted"}
+
+    def complete(self):
+        """Remove the journal once the run has finished and gone live."""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.collection_name = None
+            self.pages = {}
@@ -0,0 +1,197 @@
+import os
+import re
+import codecs
+import logging
+from typing import List, Dict, Any, Tuple
+from dotenv import load_dotenv
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Markdown-style headings as written by NotionConnector.extract_text_from_blocks()
+HEADING_PATTERN = re.compile(r"^(#{1,6}) +(.*)$")
+
+# A sentence ends at ., ! or ? (optionally followed by a closing quote or bracket) and whitespace
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+
+
+class TokenChunker:
+    """Splits page text into chunks that follow its headings and fit a token budget.
+
+    The text is read line by line. A heading always starts a new chunk and
+    updates the heading path ("# A > ## B") recorded with every chunk of its
+    section. Paragraphs are packed into chunks of at most max_tokens tokens
+    (plus the headings opening the chunk); a paragraph that does not fit on
+    its own is split into sentences, one per line, and a sentence that still
+    does not fit is cut at token boundaries. Within a section, each chunk
+    starts with the last lines of the previous one, up to overlap_tokens
+    tokens.
+
+    Every line is tokenized once and chunks are built by appending, so the
+    time taken is linear in the size of the page.
+    """
+
+    def __init__(self, max_tokens: int = 512, overlap_tokens: int = 32):
+        """Initialize the chunker.
+
+        Args:
+            max_tokens (int): Maximum tokens per chunk, counted with cl100k_base (the
+                tokenizer of the OpenAI embedding models). Falls back to a ~4
+                characters per token estimate without tiktoken.
+            overlap_tokens (int): Tokens of trailing lines repeated at the start of the
+                next chunk of the same section.
+        """
+        if overlap_tokens >= max_tokens:
+            raise ValueError(f"overlap_tokens ({overlap_tokens}) must be smaller than max_tokens ({max_tokens})")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(f"Could not load the cl100k_base tokenizer, estimating token counts: {str(e)}")
+        else:
+            logger.warning("tiktoken is not installed, estimating token counts")
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens in a text."""
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return len(text) // 4 + 1
+
+    def split_tokens(self, text: str) -> List[Tuple[str, int]]:
+        """Cut a text into pieces of at most max_tokens tokens, with their token counts.
+
+        Pieces are cut at character boundaries: a character whose bytes span two
+        token slices goes to the next piece instead of becoming U+FFFD.
+        """
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text)
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            pieces = []
+            for start in range(0, len(tokens), self.max_tokens):
+                piece_tokens = tokens[start:start + self.max_tokens]
+                piece = decoder.decode(self.encoding.decode_bytes(piece_tokens))
+                if piece:
+                    pieces.append((piece, len(piece_tokens)))
+            return pieces
+        size = (self.max_tokens - 1) * 4
+        return [(text[start:start + size], self.max_tokens) for start in range(0, len(text), size)]
+
+    def split_paragraph(self, paragraph: str, tokens: int) -> List[Tuple[str, int]]:
+        """Split a paragraph into lines that each fit in a chunk: itself, its sentences or pieces of them."""
+        if tokens <= self.max_tokens:
+            return [(paragraph, tokens)]
+
+        lines = []
+        for sentence in SENTENCE_BOUNDARY.split(paragraph):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            sentence_tokens = self.count_tokens(sentence)
+            if sentence_tokens <= self.max_tokens:
+                lines.append((sentence, sentence_tokens))
+            else:
+                lines.extend(self.split_tokens(sentence))
+        return lines
+
+    @staticmethod
+    def format_heading_path(headings: List[Tuple[int, str]]) -> str:
+        return " > ".join(f"{'#' * level} {heading}" for level, heading in headings)
+
+    def chunk(self, text: str) -> List[Dict[str, Any]]:
+        """Split text into chunks.
+
+        Args:
+            text (str): Page text, one paragraph or heading per line.
+
+        Returns:
+            List[Dict[str, Any]]: Chunks in page order, each with "text", "heading_path"
+                (empty before the first heading) and "tokens".
+        """
+        chunks = []
+        headings: List[Tuple[int, str]] = []
+        # Lines of the chunk being built as (text, tokens, is_heading)
+        current: List[Tuple[str, int, bool]] = []
+        current_tokens = 0
+        # Whether lines other than the previous chunk's overlap were added
+        has_new_lines = False
+        has_new_body = False
+
+        def flush(keep_overlap: bool):
+            nonlocal current, current_tokens, has_new_lines, has_new_body
+            if has_new_lines:
+                chunks.append({
+                    "text": "\n".join(line for line, _, _ in current),
+                    "heading_path": self.format_heading_path(headings),
+                    "tokens": current_tokens
+                })
+
+            overlap = []
+            overlap_tokens = 0
+            if keep_overlap:
+                # Trailing body lines, never the whole chunk, so every chunk makes progress
+                for line in reversed(current[1:]):
+                    if line[2] or overlap_tokens + line[1] > self.overlap_tokens:
+                        break
+                    overlap.append(line)
+                    overlap_tokens += line[1]
+                overlap.reverse()
+
+            current = overlap
+            current_tokens = overlap_tokens
+            has_new_lines = has_new_body = False
+
+        for raw_line in text.split("\n"):
+            line = raw_line.strip()
+            if not line:
+                continue
+
+            heading = HEADING_PATTERN.match(line)
+            if heading:
+                # Consecutive headings stay together at the start of one chunk
+                if has_new_body:
+                    flush(keep_overlap=False)
+                elif not has_new_lines:
+                    current, current_tokens = [], 0
+                level = len(heading.group(1))
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+                headings.append((level, heading.group(2).strip()))
+
+                tokens = self.count_tokens(line)
+                current.append((line, tokens, True))
+                current_tokens += tokens
+                has_new_lines = True
+                continue
+
+            for piece, tokens in self.split_paragraph(line, self.count_tokens(line)):
+                if current_tokens + tokens > self.max_tokens and has_new_body:
+                    flush(keep_overlap=True)
+                    # The overlap is dropped if the new line would not fit next to it
+                    if current_tokens + tokens > self.max_tokens:
+                        current, current_tokens = [], 0
+                current.append((piece, tokens, False))
+                current_tokens += tokens
+                has_new_lines = has_new_body = True
+
+        # A trailing heading without body is kept, so pages of only headings are not lost
+        flush(keep_overlap=False)
+        return chunks
+
+
+def create_chunker() -> TokenChunker:
+    """Create the chunker configured with CHUNK_MAX_TOKENS and CHUNK_OVERLAP_TOKENS."""
+    return TokenChunker(
+        max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "512")),
+        overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+    )
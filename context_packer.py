@@ -0,0 +1,149 @@
+import os
+import logging
+from typing import List, Dict, Any
+from dotenv import load_dotenv
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+
+class ContextPacker:
+    """Packs retrieved chunks into a RAG prompt context within a token budget.
+
+    Chunks are taken best score first. Chunks of the same page with consecutive
+    chunk_idx values are merged into one passage, dropping the paragraphs that
+    TokenChunker repeats at the start of each chunk, and passages are
+    added while the formatted context still fits the budget.
+    """
+
+    def __init__(self, model: str = "gpt-3.5-turbo"):
+        """Initialize the packer.
+
+        Args:
+            model (str): Chat model whose tokenizer is used to count tokens. Falls
+                back to a ~4 characters per token estimate without tiktoken.
+        """
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except Exception as e:
+                logger.warning(f"Could not load tokenizer for {model}, estimating token counts: {str(e)}")
+        else:
+            logger.warning("tiktoken is not installed, estimating token counts")
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens in a text."""
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return len(text) // 4 + 1
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut a text down to at most max_tokens tokens."""
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text)[:max_tokens])
+        return text[:max(max_tokens - 1, 0) * 4]
+
+    @staticmethod
+    def merge_text(previous: str, following: str) -> str:
+        """Join two consecutive chunks, dropping the paragraphs repeated as overlap."""
+        previous_paragraphs = previous.split("\n")
+        following_paragraphs = following.split("\n")
+
+        for size in range(min(len(previous_paragraphs), len(following_paragraphs)), 0, -1):
+            if previous_paragraphs[-size:] == following_paragraphs[:size]:
+                following_paragraphs = following_paragraphs[size:]
+                break
+
+        return "\n".join(previous_paragraphs + following_paragraphs)
+
+    def merge_adjacent(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge chunks of the same page with consecutive chunk_idx values into passages.
+
+        Args:
+            chunks (List[Dict[str, Any]]): Search results.
+
+        Returns:
+            List[Dict[str, Any]]: Passages with first_chunk/last_chunk indices and the
+                best score of their chunks, best passage first.
+        """
+        by_page = {}
+        for chunk in chunks:
+            by_page.setdefault(chunk["page_id"], {})[chunk["chunk_idx"]] = chunk
+
+        passages = []
+        for page_chunks in by_page.values():
+            passage = None
+            for chunk_idx in sorted(page_chunks):
+                chunk = page_chunks[chunk_idx]
+                if passage is not None and chunk_idx == passage["last_chunk"] + 1:
+                    passage["content"] = self.merge_text(passage["content"], chunk["content"])
+                    passage["last_chunk"] = chunk_idx
+                    passage["score"] = max(passage["score"], chunk["score"])
+                    continue
+
+                passage = {
+                    "title": chunk["title"],
+                    "page_id": chunk["page_id"],
+                    "first_chunk": chunk_idx,
+                    "last_chunk": chunk_idx,
+                    "total_chunks": chunk["total_chunks"],
+                    "content": chunk["content"],
+                    "score": chunk["score"]
+                }
+                passages.append(passage)
+
+        return sorted(passages, key=lambda passage: passage["score"], reverse=True)
+
+    def format_context(self, passages: List[Dict[str, Any]]) -> str:
+        """Format passages as the numbered context section of a prompt."""
+        context_parts = []
+        for i, passage in enumerate(passages, 1):
+            if passage["first_chunk"] == passage["last_chunk"]:
+                chunks = f"Chunk {passage['first_chunk'] + 1}/{passage['total_chunks']}"
+            else:
+                chunks = f"Chunks {passage['first_chunk'] + 1}-{passage['last_chunk'] + 1}/{passage['total_chunks']}"
+            context_parts.append(f"{i}. Title: {passage['title']} ({chunks})\nContent: {passage['content']}")
+        return "\n\n".join(context_parts)
+
+    def pack(self, chunks: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """Select the best chunks whose merged, formatted context fits the budget.
+
+        Args:
+            chunks (List[Dict[str, Any]]): Search results, with scores.
+            budget (int): Maximum number of context tokens.
+
+        Returns:
+            List[Dict[str, Any]]: Passages to put in the prompt, best first.
+        """
+        selected = []
+        passages = []
+        for chunk in sorted(chunks, key=lambda chunk: chunk["score"], reverse=True):
+            candidate = self.merge_adjacent(selected + [chunk])
+            if self.count_tokens(self.format_context(candidate)) <= budget:
+                selected.append(chunk)
+                passages = candidate
+
+        if not passages and chunks:
+            # Even the best chunk alone is too long; send as much of it as fits
+            passages = self.merge_adjacent([max(chunks, key=lambda chunk: chunk["score"])])
+            overhead = self.count_tokens(self.format_context([dict(passages[0], content="")]))
+            passages[0]["content"] = self.truncate(passages[0]["content"], max(budget - overhead, 0))
+            selected = passages[:1]
+
+        tokens = self.count_tokens(self.format_context(passages))
+        logger.info(f"Packed {len(selected)}/{len(chunks)} chunks into {len(passages)} passages ({tokens}/{budget} tokens)")
+        return passages
+
+
+def get_context_budget(default: int) -> int:
+    """Return the context token budget: RAG_CONTEXT_TOKENS, capped at what the model has room for."""
+    configured = os.getenv("RAG_CONTEXT_TOKENS")
+    return min(int(configured), default) if configured else default
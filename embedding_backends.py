@@ -0,0 +1,277 @@
+import os
+import re
+import math
+import asyncio
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from dotenv import load_dotenv
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Native output size of text-embedding-3-small
+NATIVE_DIMENSIONS = 1536
+
+DEFAULT_LOCAL_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_HASHING_DIMENSIONS = 256
+
+
+def get_embedding_dimensions() -> Optional[int]:
+    """Return the configured embedding size (EMBEDDING_DIMENSIONS), or None for the model's native size.
+
+    text-embedding-3 models are trained so that a shortened embedding keeps most
+    of its retrieval quality, and the API returns shortened, re-normalized
+    vectors when asked for fewer dimensions.
+    """
+    dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+    return int(dimensions) if dimensions else None
+
+
+def get_embedding_cache_key(model: str, dimensions: Optional[int]) -> str:
+    """Return the model key under which embeddings of a given size are cached."""
+    return f"{model}@{dimensions}" if dimensions else model
+
+
+class EmbeddingBackend(ABC):
+    """Turns texts into embedding vectors for both indexing and queries.
+
+    Indexing and search must use the same backend, model and size, so each
+    backend describes itself with metadata() and collections record it.
+    """
+
+    name = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    @abstractmethod
+    def dimensions(self) -> int:
+        """Size of the vectors this backend produces."""
+
+    @property
+    def cache_key(self) -> str:
+        """Key under which this backend's embeddings are cached."""
+        return f"{self.name}:{self.model}@{self.dimensions}"
+
+    def metadata(self) -> Dict[str, Any]:
+        """Describe the embeddings, as recorded on collections built with them."""
+        return {
+            "embedding_backend": self.name,
+            "embedding_model": self.model,
+            "embedding_dimensions": self.dimensions
+        }
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts, returning one vector per text in order."""
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts without blocking the event loop."""
+        return await asyncio.to_thread(self.embed, texts)
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """Embeddings from the OpenAI API (text-embedding-3-small by default)."""
+
+    name = "openai"
+
+    def __init__(
+        self,
+        client: Optional[OpenAI] = None,
+        async_client: Optional[AsyncOpenAI] = None,
+        model: str = DEFAULT_EMBEDDING_MODEL,
+        dimensions: Optional[int] = None
+    ):
+        """Initialize the backend.
+
+        Args:
+            client (Optional[OpenAI]): Shared OpenAI client. One is created on first use
+                if neither client is given.
+            async_client (Optional[AsyncOpenAI]): Shared async OpenAI client, used by aembed().
+            model (str): Embedding model name.
+            dimensions (Optional[int]): Shortened embedding size; None for the native size.
+        """
+        super().__init__(model)
+        self.client = client
+        self.async_client = async_client
+        self.requested_dimensions = dimensions
+        self.lock = threading.Lock()
+
+    @property
+    def dimensions(self) -> int:
+        return self.requested_dimensions or NATIVE_DIMENSIONS
+
+    @property
+    def cache_key(self) -> str:
+        # Same keys as before backends were pluggable, so existing caches stay valid
+        return get_embedding_cache_key(self.model, self.requested_dimensions)
+
+    def get_client(self) -> OpenAI:
+        with self.lock:
+            if self.client is None:
+                api_key = os.getenv("OPENAI_API_KEY")
+                if not api_key:
+                    raise ValueError("OpenAI API key not found in environment variables")
+                self.client = OpenAI(api_key=api_key, http_client=httpx.Client(timeout=60.0))
+            return self.client
+
+    def request_params(self, texts: List[str]) -> Dict[str, Any]:
+        params = {"input": texts, "model": self.model}
+        if self.requested_dimensions:
+            params["dimensions"] = self.requested_dimensions
+        return params
+
+    @staticmethod
+    def parse_response(response) -> List[List[float]]:
+        # The API returns one item per input, tagged with its input index
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.parse_response(self.get_client().embeddings.create(**self.request_params(texts)))
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        if self.async_client is None:
+            return await super().aembed(texts)
+        return self.parse_response(await self.async_client.embeddings.create(**self.request_params(texts)))
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Local CPU/GPU embeddings from a sentence-transformers model.
+
+    Needs the optional sentence-transformers package. With runtime="onnx" the
+    model runs on ONNX Runtime, which is usually faster on CPU. The model is
+    loaded on first use.
+    """
+
+    name = "sentence-transformers"
+
+    def __init__(self, model: str = DEFAULT_LOCAL_MODEL, runtime: str = "torch", device: Optional[str] = None):
+        """Initialize the backend.
+
+        Args:
+            model (str): Hugging Face model name or local path.
+            runtime (str): "torch" or "onnx".
+            device (Optional[str]): e.g. "cpu" or "cuda". Defaults to the best available.
+        """
+        super().__init__(model)
+        self.runtime = runtime
+        self.device = device
+        self.batch_size = int(os.getenv("EMBEDDING_LOCAL_BATCH_SIZE", "32"))
+        self._model = None
+        self.lock = threading.Lock()
+
+    def get_model(self):
+        with self.lock:
+            if self._model is None:
+                if SentenceTransformer is None:
+                    raise ImportError("sentence-transformers is not installed; pip install sentence-transformers")
+                kwargs = {"device": self.device}
+                if self.runtime != "torch":
+                    kwargs["backend"] = self.runtime
+                self._model = SentenceTransformer(self.model, **kwargs)
+                logger.info(f"Loaded local embedding model {self.model} ({self.runtime})")
+            return self._model
+
+    @property
+    def dimensions(self) -> int:
+        return self.get_model().get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.get_model().encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """Deterministic feature-hashing embeddings for tests and air-gapped setups.
+
+    Words and their character trigrams are hashed into a fixed number of
+    dimensions, so texts sharing vocabulary get similar vectors. No model,
+    no network, and the same vectors on every machine.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimensions: int = DEFAULT_HASHING_DIMENSIONS):
+        super().__init__("feature-hashing-v1")
+        self._dimensions = dimensions
+
+    @property
+    def dimensions(self) -> int:
+        return self._dimensions
+
+    def embed_text(self, text: str) -> List[float]:
+        vector = [0.0] * self._dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            features = [(word, 1.0)] + [(word[i:i+3], 0.3) for i in range(len(word) - 2)]
+            for feature, weight in features:
+                digest = hashlib.md5(feature.encode("utf-8")).digest()
+                index = int.from_bytes(digest[:4], "little") % self._dimensions
+                vector[index] += weight if digest[4] & 1 else -weight
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_text(text) for text in texts]
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts)
+
+
+def get_embedding_backend_name() -> str:
+    """Return the embedding backend selected by EMBEDDING_BACKEND."""
+    return os.getenv("EMBEDDING_BACKEND", "openai").lower()
+
+
+def create_embedding_backend(
+    openai_client: Optional[OpenAI] = None,
+    async_openai_client: Optional[AsyncOpenAI] = None
+) -> EmbeddingBackend:
+    """Create the embedding backend configured with environment variables.
+
+    EMBEDDING_BACKEND selects "openai" (default), "sentence-transformers" or
+    "hashing". EMBEDDING_DIMENSIONS sets the OpenAI and hashing vector size;
+    EMBEDDING_LOCAL_MODEL, EMBEDDING_LOCAL_RUNTIME and EMBEDDING_LOCAL_DEVICE
+    configure the sentence-transformers model.
+
+    Args:
+        openai_client (Optional[OpenAI]): Shared OpenAI client for the openai backend.
+        async_openai_client (Optional[AsyncOpenAI]): Shared async OpenAI client for the openai backend.
+    """
+    backend = get_embedding_backend_name()
+
+    if backend == "openai":
+        return OpenAIEmbeddingBackend(
+            client=openai_client,
+            async_client=async_openai_client,
+            dimensions=get_embedding_dimensions()
+        )
+    if backend == "sentence-transformers":
+        return SentenceTransformerBackend(
+            model=os.getenv("EMBEDDING_LOCAL_MODEL", DEFAULT_LOCAL_MODEL),
+            runtime=os.getenv("EMBEDDING_LOCAL_RUNTIME", "torch").lower(),
+            device=os.getenv("EMBEDDING_LOCAL_DEVICE") or None
+        )
+    if backend == "hashing":
+        return HashingEmbeddingBackend(dimensions=get_embedding_dimensions() or DEFAULT_HASHING_DIMENSIONS)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend} (expected openai, sentence-transformers or hashing)")
@@ -0,0 +1,205 @@
+import os
+import time
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import threading
+from array import array
+from typing import List, Dict, Any, Optional
+from dotenv import load_dotenv
+from monitoring import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Least recently used entries deleted per statement when evicting
+EVICTION_BATCH_SIZE = 500
+
+
+class EmbeddingCache:
+    """Disk-backed embedding cache keyed on (model, sha256 of the embedded text).
+
+    Vectors are stored as float32 blobs in SQLite. The total vector size is
+    kept as a running count; when it grows past the size limit, the least
+    recently used entries are evicted in batches.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size_mb: Optional[float] = None):
+        """Open (or create) the cache database.
+
+        Args:
+            path (Optional[str]): SQLite file location. Defaults to EMBEDDING_CACHE_PATH,
+                or a file in the system temp directory.
+            max_size_mb (Optional[float]): Maximum total vector size before eviction.
+                Defaults to EMBEDDING_CACHE_MAX_MB (512).
+        """
+        self.path = path or os.getenv("EMBEDDING_CACHE_PATH") or os.path.join(
+            tempfile.gettempdir(), "notion_embedding_cache.sqlite"
+        )
+        if max_size_mb is None:
+            max_size_mb = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.conn.commit()
+        self.total_size = self._table_size()
+        logger.info(f"Opened embedding cache at {self.path}")
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Return the sha256 hex digest used as the cache key for a text."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, List[float]]:
+        """Look up cached embeddings.
+
+        Args:
+            model (str): The embedding model name.
+            texts (List[str]): Texts to look up.
+
+        Returns:
+            Dict[int, List[float]]: Cached embeddings keyed by index into texts.
+        """
+        hashes = [self.hash_text(text) for text in texts]
+        found = {}
+
+        with self.lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                batch = list(set(hashes[i:i+500]))
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model] + batch
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, text_hash) for text_hash in found]
+                )
+                self.conn.commit()
+
+        results = {}
+        for i, text_hash in enumerate(hashes):
+            if text_hash in found:
+                results[i] = array("f", found[text_hash]).tolist()
+
+        self.hits += len(results)
+        self.misses += len(texts) - len(results)
+        record_cache_lookup("embedding", len(results), len(texts) - len(results))
+        return results
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """Store embeddings and evict least recently used entries if over the size limit.
+
+        Args:
+            model (str): The embedding model name.
+            texts (List[str]): The embedded texts.
+            embeddings (List[List[float]]): Their embeddings, in the same order.
+        """
+        if not texts:
+            return
+
+        now = time.time()
+        rows = {}
+        for text, embedding in zip(texts, embeddings):
+            blob = array("f", embedding).tobytes()
+            text_hash = self.hash_text(text)
+            rows[text_hash] = (model, text_hash, blob, len(blob), now)
+
+        with self.lock:
+            # Entries being replaced no longer count towards the size
+            replaced = 0
+            hashes = list(rows)
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i+500]
+                placeholders = ",".join("?" * len(batch))
+                replaced += self.conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model] + batch
+                ).fetchone()[0]
+
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows.values()
+            )
+            self.conn.commit()
+            self.total_size += sum(row[3] for row in rows.values()) - replaced
+            if self.total_size > self.max_size_bytes:
+                self._evict()
+
+    def _table_size(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits its size limit."""
+        # Other processes may write to the same file, so recount before evicting
+        self.total_size = self._table_size()
+        if self.total_size <= self.max_size_bytes:
+            return
+
+        # Evict down to 90% of the limit so eviction doesn't run on every write.
+        # Oldest entries come off the last_used index a batch at a time.
+        target = int(self.max_size_bytes * 0.9)
+        evicted = 0
+        freed = 0
+        while self.total_size - freed > target:
+            batch = []
+            for rowid, size in self.conn.execute(
+                "SELECT rowid, size FROM embeddings ORDER BY last_used ASC LIMIT ?", (EVICTION_BATCH_SIZE,)
+            ).fetchall():
+                if self.total_size - freed <= target:
+                    break
+                batch.append(rowid)
+                freed += size
+            if not batch:
+                break
+            self.conn.execute(f"DELETE FROM embeddings WHERE rowid IN ({','.join('?' * len(batch))})", batch)
+            evicted += len(batch)
+
+        self.conn.commit()
+        self.total_size -= freed
+        self.evictions += evicted
+        logger.info(f"Evicted {evicted} embeddings ({freed} bytes) from cache")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current cache size."""
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings").fetchone()
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size
+        }
+
+    def close(self):
+        """Close the underlying database connection."""
+        self.conn.close()
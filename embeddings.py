@@ -1,9 +1,13 @@
 import os
 from dotenv import load_dotenv
 import logging
-from openai import OpenAI
-from typing import List, Dict, Any
-import httpx
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import openai
+from embedding_cache import EmbeddingCache
+from embedding_backends import EmbeddingBackend, create_embedding_backend
+from monitoring import EMBEDDING_LATENCY, RETRIES, CHUNKS_EMBEDDED
 import time
 import random
 
@@ -12,69 +16,233 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+
+def is_input_error(error: Exception) -> bool:
+    """Whether a request failed because of its inputs (too large, or a text rejected), so smaller requests may succeed."""
+    if isinstance(error, (openai.BadRequestError, openai.UnprocessableEntityError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code == 413
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Whether a failed request may succeed if sent again unchanged."""
+    if is_input_error(error):
+        return False
+    # Bad credentials, a wrong model or an exhausted quota fail every request
+    if isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError, openai.NotFoundError)):
+        return False
+    if isinstance(error, openai.RateLimitError) and error.code == "insufficient_quota":
+        return False
+    return True
+
+
 class EmbeddingGenerator:
-    def __init__(self):
-        """Initialize the embedding generator with OpenAI API key."""
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        
-        if not self.api_key:
-            raise ValueError("OpenAI API key not found in environment variables")
-        
-        http_client = httpx.Client(timeout=60.0)  # Increased timeout
-        self.client = OpenAI(
-            api_key=self.api_key,
-            http_client=http_client
-        )
-        self.model = "text-embedding-3-small"
+    def __init__(self, backend: Optional[EmbeddingBackend] = None):
+        """Initialize the embedding generator.
+        
+        Args:
+            backend (Optional[EmbeddingBackend]): Backend that computes the embeddings.
+                Defaults to the one configured by EMBEDDING_BACKEND (OpenAI by default).
+        """
+        self.backend = backend or create_embedding_backend()
+        self.model = self.backend.model
+        self.cache_key = self.backend.cache_key
+        
+        # Requests are packed by item count and estimated tokens; the API accepts
+        # up to 2048 inputs and 300k tokens per request.
+        self.batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+        self.batch_max_tokens = int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000"))
+        self.max_concurrency = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+        
+        # Unchanged chunks are served from the on-disk cache instead of the API
+        if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true":
+            self.cache = EmbeddingCache()
+        else:
+            self.cache = None
     
-    def generate_embedding_with_retry(self, text: str, max_retries=3):
-        """Generate embedding with retry logic."""
+    def get_text_to_embed(self, chunk_data: Dict[str, Any]) -> str:
+        """Build the text that is embedded for a chunk."""
+        # Combine title and chunk for embedding, weighting the title more heavily
+        title = chunk_data["title"]
+        chunk = chunk_data["chunk"]
+        # Later chunks of a section don't contain its headings, so embed the path with them
+        heading_path = chunk_data.get("heading_path")
+        if heading_path:
+            return f"{title} {title}\n{heading_path}\n\n{chunk}"
+        return f"{title} {title}\n\n{chunk}"
+    
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Roughly estimate the number of tokens in a text (~4 characters per token)."""
+        return len(text) // 4 + 1
+    
+    def iter_batches(self, chunks_data: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """Pack chunks into request batches bounded by item count and estimated tokens.
+        
+        Args:
+            chunks_data (Iterable[Dict[str, Any]]): Chunks to embed; consumed lazily.
+            
+        Yields:
+            List[Dict[str, Any]]: Batches of chunks, in order.
+        """
+        current_batch = []
+        current_tokens = 0
+        
+        for chunk_data in chunks_data:
+            tokens = self.estimate_tokens(self.get_text_to_embed(chunk_data))
+            if current_batch and (len(current_batch) >= self.batch_size or current_tokens + tokens > self.batch_max_tokens):
+                yield current_batch
+                current_batch = []
+                current_tokens = 0
+            
+            current_batch.append(chunk_data)
+            current_tokens += tokens
+        
+        if current_batch:
+            yield current_batch
+    
+    def generate_embeddings_with_retry(self, texts: List[str], max_retries=3) -> List[List[float]]:
+        """Generate embeddings for several texts in one request, retrying transient errors.
+        
+        Errors that would fail again (see is_retryable_error()) are raised at once.
+        """
         for attempt in range(max_retries):
             try:
-                response = self.client.embeddings.create(
-                    input=text,
-                    model=self.model
-                )
-                return response.data[0].embedding
+                with EMBEDDING_LATENCY.labels(source="index").time():
+                    return self.backend.embed(texts)
             except Exception as e:
+                if not is_retryable_error(e):
+                    raise
                 if attempt < max_retries - 1:
                     wait_time = (2 ** attempt) + random.random()  # Exponential backoff with jitter
                     logger.warning(f"Embedding generation failed, retrying in {wait_time:.2f}s: {str(e)}")
+                    RETRIES.labels(service=f"{self.backend.name}_embeddings").inc()
                     time.sleep(wait_time)
                 else:
                     logger.error(f"All embedding generation attempts failed: {str(e)}")
                     raise
     
-    def generate_embeddings(self, chunks_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Generate embeddings for text chunks using OpenAI API.
+    def generate_embedding_with_retry(self, text: str, max_retries=3):
+        """Generate embedding with retry logic."""
+        return self.generate_embeddings_with_retry([text], max_retries)[0]
+    
+    def embed_batch(self, texts: List[str], indices: List[int], max_retries=3) -> Dict[int, List[float]]:
+        """Embed a batch of texts, splitting it in half if the API rejects its inputs.
+        
+        Only input errors (see is_input_error()) are split, to isolate the texts that
+        fail on their own; the halves are sent once each, as retrying does not help
+        them. Other errors, such as bad credentials, an exhausted quota or an API that
+        is still down after the retries, are raised.
         
         Args:
-            chunks_data (List[Dict[str, Any]]): List of dictionaries containing chunk data.
+            texts (List[str]): All texts being embedded.
+            indices (List[int]): Indices of the texts in this batch.
+            max_retries (int): Attempts for transient errors.
             
         Returns:
-            List[Dict[str, Any]]: List of documents with embeddings.
+            Dict[int, List[float]]: Embeddings keyed by text index. Only texts that are
+                rejected on their own are missing.
         """
+        try:
+            embeddings = self.generate_embeddings_with_retry([texts[i] for i in indices], max_retries)
+            return dict(zip(indices, embeddings))
+        except Exception as e:
+            if not is_input_error(e):
+                raise
+            if len(indices) == 1:
+                logger.error(f"Error generating embedding for text {indices[0]}: {str(e)}")
+                return {}
+            
+            middle = len(indices) // 2
+            logger.warning(f"Splitting rejected batch of {len(indices)} texts into two: {str(e)}")
+            results = self.embed_batch(texts, indices[:middle], max_retries=1)
+            results.update(self.embed_batch(texts, indices[middle:], max_retries=1))
+            return results
+    
+    def embed_chunk_batch(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Embed one batch of chunks, serving what it can from the cache.
+        
+        Args:
+            batch (List[Dict[str, Any]]): Chunks to embed.
+            
+        Returns:
+            List[Dict[str, Any]]: Copies of the chunks with an "embedding" key, in order.
+                Chunks that could not be embedded are logged and left out.
+        """
+        texts = [self.get_text_to_embed(chunk_data) for chunk_data in batch]
+        
+        embeddings = self.cache.get_many(self.cache_key, texts) if self.cache else {}
+        missing = [i for i in range(len(texts)) if i not in embeddings]
+        
+        CHUNKS_EMBEDDED.labels(source="cache").inc(len(texts) - len(missing))
+        if missing:
+            new_embeddings = self.embed_batch(texts, missing)
+            embeddings.update(new_embeddings)
+            CHUNKS_EMBEDDED.labels(source="api").inc(len(new_embeddings))
+            if self.cache:
+                self.cache.put_many(
+                    self.cache_key,
+                    [texts[i] for i in new_embeddings],
+                    list(new_embeddings.values())
+                )
+        
         documents = []
+        for i, chunk_data in enumerate(batch):
+            if i not in embeddings:
+                logger.error(f"No embedding generated for chunk {chunk_data['id']}, skipping")
+                continue
+            
+            # Copy chunk_data and add embedding
+            doc_with_embedding = chunk_data.copy()
+            doc_with_embedding["embedding"] = embeddings[i]
+            documents.append(doc_with_embedding)
         
-        for chunk_data in chunks_data:
-            try:
-                # Combine title and chunk for embedding
-                title = chunk_data["title"]
-                chunk = chunk_data["chunk"]
-                
-                # Weight the title more heavily
-                text_to_embed = f"{title} {title}\n\n{chunk}"
-                
-                embedding = self.generate_embedding_with_retry(text_to_embed)
-                
-                # Copy chunk_data and add embedding
-                doc_with_embedding = chunk_data.copy()
-                doc_with_embedding["embedding"] = embedding
-                
-                documents.append(doc_with_embedding)
-                
-                logger.info(f"Generated embedding for chunk {chunk_data['id']}: {title} (chunk {chunk_data['chunk_idx'] + 1}/{chunk_data['total_chunks']})")
-            except Exception as e:
-                logger.error(f"Error generating embedding for chunk {chunk_data['id']}: {str(e)}")
+        return documents
+    
+    def iter_embeddings(self, chunks_data: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Lazily generate embeddings for a stream of chunks.
+        
+        Chunks are packed into batched requests and up to max_concurrency batches
+        are in flight at once. Documents are yielded in input order as soon as
+        their batch completes, so a consumer can store them while later batches
+        are still being embedded.
+        
+        Args:
+            chunks_data (Iterable[Dict[str, Any]]): Chunks to embed; consumed lazily.
+            
+        Yields:
+            Dict[str, Any]: Documents with embeddings.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            in_flight = deque()
+            
+            for batch in self.iter_batches(chunks_data):
+                in_flight.append(executor.submit(self.embed_chunk_batch, batch))
+                # Keep a bounded window of batches so memory doesn't grow with the input
+                if len(in_flight) >= self.max_concurrency * 2:
+                    yield from in_flight.popleft().result()
+                # Hand finished batches downstream without waiting for the window to fill
+                while in_flight and in_flight[0].done():
+                    yield from in_flight.popleft().result()
+            
+            while in_flight:
+                yield from in_flight.popleft().result()
+    
+    def generate_embeddings(self, chunks_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Generate embeddings for text chunks with the embedding backend.
+        
+        Embeddings already in the cache are reused; the remaining chunks are
+        packed into batched requests, and several batches are sent concurrently.
+        
+        Args:
+            chunks_data (List[Dict[str, Any]]): List of dictionaries containing chunk data.
+            
+        Returns:
+            List[Dict[str, Any]]: List of documents with embeddings, in input order.
+        """
+        documents = list(self.iter_embeddings(chunks_data))
         
-        return documents
\ No newline at end of file
+        logger.info(f"Generated embeddings for {len(documents)}/{len(chunks_data)} chunks")
+        if self.cache:
+            logger.info(f"Embedding cache stats: {self.cache.get_stats()}")
+        return documents
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Measure the recall cost of shortened (Matryoshka) embeddings on the indexed Notion chunks.
+
+text-embedding-3 embeddings shortened with the `dimensions` parameter are the
+leading components of the full embedding, re-normalized. This benchmark
+truncates the stored vectors the same way, so it needs no API calls, and
+compares top-k neighbours at each size against the full-size vectors.
+
+Usage: python evals/dimension_benchmark.py --dimensions 256,512,768,1024 --limit 10
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from typing import List, Dict, Any
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from vector_store import VectorStore
+    from quantization_benchmark import load_points
+except ImportError as e:
+    print(f"Import error: {e}")
+    print("Make sure you're running from the project root directory")
+    sys.exit(1)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def top_k(vectors: np.ndarray, query_indices: List[int], limit: int) -> List[set]:
+    """Return the indices of each query's nearest neighbours by cosine similarity, excluding itself."""
+    scores = vectors[query_indices] @ vectors.T
+    scores[np.arange(len(query_indices)), query_indices] = -np.inf
+    return [set(row) for row in np.argsort(-scores, axis=1)[:, :limit]]
+
+
+def run_dimension_benchmark(dimensions: List[int], sample: int, limit: int, max_points: int = None) -> List[Dict[str, Any]]:
+    """Compare recall@k, vector storage and brute-force search time across embedding sizes."""
+    vector_store = VectorStore()
+
+    print(f"📥 Loading vectors from {vector_store.collection_name}...")
+    points = load_points(vector_store, max_points)
+    if not points:
+        print("❌ No points found, index your Notion content first")
+        return []
+
+    full = normalize(np.array([point.vector for point in points], dtype=np.float32))
+    query_indices = random.Random(42).sample(range(len(points)), min(sample, len(points)))
+    print(f"✅ Loaded {len(points)} vectors ({full.shape[1]} dims), {len(query_indices)} sampled as queries")
+
+    ground_truth = top_k(full, query_indices, limit)
+
+    rows = []
+    for size in sorted(set(dimensions + [full.shape[1]]), reverse=True):
+        if size > full.shape[1]:
+            print(f"⚠️ Skipping {size} dimensions: the collection only has {full.shape[1]}")
+            continue
+
+        truncated = normalize(full[:, :size])
+        start_time = time.time()
+        neighbours = top_k(truncated, query_indices, limit)
+        elapsed = time.time() - start_time
+
+        recall = sum(len(found & truth) / limit for found, truth in zip(neighbours, ground_truth)) / len(query_indices)
+        row = {
+            "dimensions": size,
+            f"recall@{limit}": round(recall, 4),
+            "vector_storage_mb": round(len(points) * size * 4 / 1024 / 1024, 2),
+            "storage_ratio": round(full.shape[1] / size, 1),
+            "search_ms_per_query": round(elapsed * 1000 / len(query_indices), 3)
+        }
+        rows.append(row)
+        print(f"   {size:>5} dims: recall@{limit}={row[f'recall@{limit}']}, "
+              f"storage={row['vector_storage_mb']}MB ({row['storage_ratio']}x smaller), "
+              f"{row['search_ms_per_query']}ms/query")
+
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding dimension recall benchmark")
+    parser.add_argument("--dimensions", type=str, default="256,512,768,1024", help="Comma-separated sizes to compare")
+    parser.add_argument("--sample", type=int, default=500, help="Number of chunk vectors used as queries")
+    parser.add_argument("--limit", type=int, default=10, help="Neighbours per query (k for recall@k)")
+    parser.add_argument("--max-points", type=int, help="Only load this many points from the collection")
+    parser.add_argument("--output", type=str, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    print("📐 Running Embedding Dimension Benchmark...")
+    rows = run_dimension_benchmark(
+        [int(size) for size in args.dimensions.split(",")],
+        args.sample,
+        args.limit,
+        args.max_points
+    )
+
+    if args.output and rows:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
@@ -0,0 +1,679 @@
+#!/usr/bin/env python3
+"""
+Load test for the Flask API: throughput, latency percentiles and error rates per endpoint.
+
+By default everything runs locally. Stub OpenAI and Notion servers with
+injectable latency stand in for the real APIs, the retrieval benchmark
+fixture is indexed through them with `main.py --index`, and api.py is started
+under gunicorn (one gthread worker) against that index. Closed-loop clients
+then send requests drawn from a weighted query mix, their number stepped or
+ramped through the configured stages, and every stage is reported per
+endpoint. With --url the load is sent to an already running API instead.
+
+Stages are comma-separated "clients:seconds" (hold) or "start-end:seconds"
+(linear ramp), e.g. "1-16:30,16:60". Without --stages they are built from
+--concurrency, --ramp and --duration.
+
+A query mix file is a JSON list of requests with relative weights:
+    [{"endpoint": "search", "query": "ranking models", "weight": 4, "params": {"mode": "hybrid"}},
+     {"endpoint": "rag", "query": "how are notifications ranked?", "weight": 1},
+     {"endpoint": "search_batch", "queries": ["two-tower", "HNSW"], "weight": 0.5}]
+
+Usage:
+    python evals/load_test.py --stages 1:20,4:20,16:20,64:20 --output load.json
+    python evals/load_test.py --concurrency 32 --ramp 30 --duration 60 --mix query_mix.json --threads 16
+    python evals/load_test.py --embedding-latency-ms 150 --llm-latency-ms 2000 --stub-error-rate 0.01
+    python evals/load_test.py --url http://localhost:8000 --concurrency 8 --duration 30
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import importlib.util
+from collections import Counter, defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import quote
+import numpy as np
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Add parent directory to path for imports
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+try:
+    from embedding_backends import HashingEmbeddingBackend, NATIVE_DIMENSIONS
+    from evals.retrieval_benchmark import create_retrieval_fixture, to_notion, percentile
+except ImportError as e:
+    print(f"Import error: {e}")
+    print("Make sure you're running from the project root directory")
+    sys.exit(1)
+
+# Method and route pattern of each endpoint a query mix can use
+ENDPOINTS = {
+    "search": ("GET", "/search/<query>"),
+    "rag": ("GET", "/rag/<query>"),
+    "search_batch": ("POST", "/search/batch")
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Base handler of the stub servers: JSON in and out, with injected latency and errors."""
+
+    # Keep-alive, so the app's pooled HTTP clients behave as they do against the real APIs
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def send_json(self, payload: Dict[str, Any], status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def inject(self, route: str) -> bool:
+        """Wait out the route's latency; returns False if this request should fail instead."""
+        server = self.server
+        with server.lock:
+            server.requests[route] += 1
+            fail = server.rng.random() < server.error_rate
+            latency_ms = server.latency_ms.get(route, 0.0)
+            if latency_ms:
+                latency_ms *= 1 + server.rng.uniform(-server.jitter, server.jitter)
+            if fail:
+                server.errors[route] += 1
+
+        if latency_ms > 0:
+            time.sleep(latency_ms / 1000)
+        return not fail
+
+
+class OpenAIStubHandler(StubHandler):
+    """OpenAI embeddings and chat completions.
+
+    Embeddings come from the hashing backend at the requested size, so search
+    results are still meaningful; chat completions return a canned answer.
+    """
+
+    def do_POST(self):
+        body = self.read_json()
+        if self.path == "/v1/embeddings":
+            if self.inject("embeddings"):
+                self.send_embeddings(body)
+            else:
+                self.send_json({"error": {"message": "Injected stub error", "type": "server_error"}}, 500)
+        elif self.path == "/v1/chat/completions":
+            if self.inject("chat"):
+                self.send_completion(body)
+            else:
+                self.send_json({"error": {"message": "Injected stub error", "type": "server_error"}}, 500)
+        else:
+            self.send_json({"error": {"message": f"Unknown URL {self.path}", "type": "invalid_request_error"}}, 404)
+
+    def send_embeddings(self, body: Dict[str, Any]):
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        embedder = HashingEmbeddingBackend(dimensions=body.get("dimensions") or NATIVE_DIMENSIONS)
+
+        data = []
+        for index, vector in enumerate(embedder.embed(texts)):
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+
+        tokens = sum(len(text.split()) for text in texts)
+        self.send_json({
+            "object": "list",
+            "data": data,
+            "model": body.get("model"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    def send_completion(self, body: Dict[str, Any]):
+        answer = "This is a stub answer from the load-test OpenAI server."
+        common = {"id": "chatcmpl-stub", "created": int(time.time()), "model": body.get("model")}
+
+        if not body.get("stream"):
+            self.send_json(dict(common, object="chat.completion", choices=[{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }], usage={"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}))
+            return
+
+        # Server-sent events, one word per chunk, ending the connection afterwards
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for word in answer.split(" "):
+            chunk = dict(common, object="chat.completion.chunk", choices=[{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class NotionStubHandler(StubHandler):
+    """Notion database query, page and block children endpoints serving the fixture pages."""
+
+    def send_not_found(self):
+        self.send_json({"object": "error", "status": 404, "code": "object_not_found", "message": f"Unknown URL {self.path}"}, 404)
+
+    def send_error_response(self):
+        self.send_json({"object": "error", "status": 500, "code": "internal_server_error", "message": "Injected stub error"}, 500)
+
+    def do_POST(self):
+        self.read_json()
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if len(parts) == 4 and parts[1] == "databases" and parts[3] == "query":
+            if not self.inject("databases.query"):
+                return self.send_error_response()
+            self.send_json({"object": "list", "results": list(self.server.pages.values()), "has_more": False, "next_cursor": None})
+        else:
+            self.send_not_found()
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if len(parts) == 4 and parts[1] == "blocks" and parts[3] == "children" and parts[2] in self.server.blocks:
+            if not self.inject("blocks.children.list"):
+                return self.send_error_response()
+            self.send_json({"object": "list", "results": self.server.blocks[parts[2]], "has_more": False, "next_cursor": None})
+        elif len(parts) == 3 and parts[1] == "pages" and parts[2] in self.server.pages:
+            if not self.inject("pages.retrieve"):
+                return self.send_error_response()
+            self.send_json(self.server.pages[parts[2]])
+        else:
+            self.send_not_found()
+
+
+def start_stub_server(
+    handler_class,
+    latency_ms: Dict[str, float],
+    jitter: float,
+    error_rate: float,
+    seed: int,
+    **state
+) -> ThreadingHTTPServer:
+    """Start a stub server on a free local port in a background thread.
+
+    Args:
+        handler_class: The StubHandler subclass implementing the routes.
+        latency_ms (Dict[str, float]): Mean injected latency per route.
+        jitter (float): Relative spread of the latency, e.g. 0.2 for +/-20%.
+        error_rate (float): Fraction of requests answered with a 500.
+        seed (int): Seed of the latency and error draws.
+        **state: Extra attributes for the handler, e.g. the Notion pages.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+    server.daemon_threads = True
+    server.latency_ms = latency_ms
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.requests = Counter()
+    server.errors = Counter()
+    for name, value in state.items():
+        setattr(server, name, value)
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def get_server_url(server: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def build_notion_fixture(fixture: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]:
+    """Return the fixture as Notion pages and block lists keyed by page id."""
+    pages, blocks = {}, {}
+    for page in fixture["pages"]:
+        notion_page, page_blocks = to_notion(page)
+        notion_page.update({"object": "page", "last_edited_time": "2024-01-01T00:00:00.000Z"})
+        for index, block in enumerate(page_blocks):
+            block.update({"object": "block", "id": f"{page['page_id']}-block-{index}"})
+        pages[page["page_id"]] = notion_page
+        blocks[page["page_id"]] = page_blocks
+    return pages, blocks
+
+
+def load_query_mix(path: Optional[str], fixture: Dict[str, Any], rag_fraction: float) -> List[Dict[str, Any]]:
+    """Read a query mix file, or mix the fixture queries between search and RAG."""
+    if path:
+        with open(path, "r") as f:
+            mix = json.load(f)
+    else:
+        mix = []
+        for query in fixture["queries"]:
+            mix.append({"endpoint": "search", "query": query["query"], "weight": 1 - rag_fraction})
+            mix.append({"endpoint": "rag", "query": query["query"], "weight": rag_fraction})
+
+    mix = [entry for entry in mix if entry.get("weight", 1) > 0]
+    for entry in mix:
+        if entry.get("endpoint") not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in query mix: {entry.get('endpoint')} (expected {', '.join(ENDPOINTS)})")
+    if not mix:
+        raise ValueError("The query mix is empty")
+    return mix
+
+
+def parse_stages(spec: str) -> List[Dict[str, Any]]:
+    """Parse "clients:seconds" and "start-end:seconds" stages."""
+    stages = []
+    for part in spec.split(","):
+        clients, seconds = part.strip().split(":")
+        start, _, end = clients.partition("-")
+        stages.append({
+            "name": part.strip(),
+            "start_clients": int(start),
+            "end_clients": int(end or start),
+            "seconds": float(seconds)
+        })
+    return stages
+
+
+def send_request(session: requests.Session, base_url: str, entry: Dict[str, Any], timeout: float) -> Tuple[str, str]:
+    """Send one query mix request; returns the endpoint label and the status (code or error kind)."""
+    method, route = ENDPOINTS[entry["endpoint"]]
+    label = f"{method} {route}"
+    try:
+        if entry["endpoint"] == "search_batch":
+            body = dict(entry.get("params", {}), queries=entry["queries"])
+            response = session.post(f"{base_url}/search/batch", json=body, timeout=timeout)
+        else:
+            path = f"/{entry['endpoint']}/{quote(entry['query'], safe='')}"
+            response = session.get(f"{base_url}{path}", params=entry.get("params"), timeout=timeout)
+        return label, str(response.status_code)
+    except requests.Timeout:
+        return label, "timeout"
+    except requests.ConnectionError:
+        return label, "connection_error"
+
+
+class LoadGenerator:
+    """Closed-loop clients: each sends its next request as soon as the previous one completes.
+
+    One thread per client of the busiest stage is started up front; a client
+    only sends while its number is below the current stage's target, so the
+    number of concurrent requests follows the stages.
+    """
+
+    def __init__(self, base_url: str, mix: List[Dict[str, Any]], stages: List[Dict[str, Any]], timeout: float, seed: int):
+        self.base_url = base_url.rstrip("/")
+        self.mix = mix
+        self.weights = [entry.get("weight", 1) for entry in mix]
+        self.stages = stages
+        self.timeout = timeout
+        self.seed = seed
+        self.current = (0, 0)
+        self.records: List[Dict[str, Any]] = []
+        self.stop_event = threading.Event()
+
+    def target(self, elapsed: float) -> Tuple[int, int]:
+        """Return the stage index and number of active clients at a point in the run."""
+        for index, stage in enumerate(self.stages):
+            if elapsed < stage["seconds"]:
+                progress = elapsed / stage["seconds"]
+                clients = stage["start_clients"] + (stage["end_clients"] - stage["start_clients"]) * progress
+                return index, max(1, round(clients))
+            elapsed -= stage["seconds"]
+        return len(self.stages) - 1, 0
+
+    def client(self, client_id: int):
+        rng = random.Random(self.seed + client_id)
+        session = requests.Session()
+        while not self.stop_event.is_set():
+            stage, clients = self.current
+            if client_id >= clients:
+                time.sleep(0.01)
+                continue
+
+            entry = rng.choices(self.mix, weights=self.weights)[0]
+            start = time.perf_counter()
+            endpoint, status = send_request(session, self.base_url, entry, self.timeout)
+            self.records.append({
+                "stage": stage,
+                "endpoint": endpoint,
+                "status": status,
+                "latency": time.perf_counter() - start
+            })
+        session.close()
+
+    def run(self) -> List[Dict[str, Any]]:
+        """Run every stage and return one record per completed request."""
+        max_clients = max(max(stage["start_clients"], stage["end_clients"]) for stage in self.stages)
+        threads = [threading.Thread(target=self.client, args=(i,), daemon=True) for i in range(max_clients)]
+
+        started = time.perf_counter()
+        self.current = self.target(0)
+        for thread in threads:
+            thread.start()
+
+        total = sum(stage["seconds"] for stage in self.stages)
+        last_stage = -1
+        while (elapsed := time.perf_counter() - started) < total:
+            self.current = self.target(elapsed)
+            if self.current[0] != last_stage:
+                last_stage = self.current[0]
+                print(f"   ➡️  Stage {last_stage + 1}/{len(self.stages)}: {self.stages[last_stage]['name']}")
+            time.sleep(0.05)
+
+        # Requests still in flight finish and count towards the stage they started in
+        self.stop_event.set()
+        for thread in threads:
+            thread.join(timeout=self.timeout + 1)
+        return self.records
+
+
+def summarize(records: List[Dict[str, Any]], seconds: float) -> Dict[str, Any]:
+    """Throughput, error rate and latency percentiles (over all completed requests) of some requests."""
+    statuses = Counter(record["status"] for record in records)
+    errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+    latencies = [record["latency"] * 1000 for record in records]
+    summary = {
+        "requests": len(records),
+        "errors": errors,
+        "error_rate": round(errors / len(records), 4) if records else 0.0,
+        "throughput_rps": round(len(records) / seconds, 2) if seconds else 0.0,
+        "statuses": dict(statuses)
+    }
+    if latencies:
+        summary.update({
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(max(latencies), 2)
+        })
+    return summary
+
+
+def build_report(records: List[Dict[str, Any]], stages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Summarize the requests per stage and endpoint, and over the whole run."""
+    by_stage = defaultdict(list)
+    for record in records:
+        by_stage[record["stage"]].append(record)
+
+    report = {"stages": []}
+    for index, stage in enumerate(stages):
+        stage_records = by_stage[index]
+        by_endpoint = defaultdict(list)
+        for record in stage_records:
+            by_endpoint[record["endpoint"]].append(record)
+        report["stages"].append(dict(
+            stage,
+            endpoints={endpoint: summarize(items, stage["seconds"]) for endpoint, items in sorted(by_endpoint.items())},
+            total=summarize(stage_records, stage["seconds"])
+        ))
+
+    total_seconds = sum(stage["seconds"] for stage in stages)
+    by_endpoint = defaultdict(list)
+    for record in records:
+        by_endpoint[record["endpoint"]].append(record)
+    report["overall"] = {
+        "endpoints": {endpoint: summarize(items, total_seconds) for endpoint, items in sorted(by_endpoint.items())},
+        "total": summarize(records, total_seconds)
+    }
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    header = f"   {'endpoint':<22} {'reqs':>7} {'rps':>8} {'err%':>6} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8}"
+    for index, stage in enumerate(report["stages"]):
+        print(f"\n📈 Stage {index + 1}: {stage['name']} (clients:seconds)")
+        print(header)
+        rows = list(stage["endpoints"].items()) + [("total", stage["total"])]
+        for endpoint, summary in rows:
+            if not summary["requests"]:
+                print(f"   {endpoint:<22} {0:>7}")
+                continue
+            print(
+                f"   {endpoint:<22} {summary['requests']:>7} {summary['throughput_rps']:>8} "
+                f"{summary['error_rate'] * 100:>6.1f} {summary['p50_ms']:>8} {summary['p95_ms']:>8} {summary['p99_ms']:>8}"
+            )
+
+
+def read_log_tail(path: str, lines: int = 30) -> str:
+    try:
+        with open(path, "r", errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+    except OSError:
+        return ""
+
+
+def start_api(env: Dict[str, str], work_dir: str, threads: int, log_path: str, startup_timeout: float = 120) -> Tuple[subprocess.Popen, str]:
+    """Start api.py under gunicorn (one gthread worker) and wait until /health answers."""
+    port = get_free_port()
+    command = [
+        sys.executable, "-m", "gunicorn", "api:app",
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", "1",
+        "--worker-class", "gthread",
+        "--threads", str(threads),
+        "--pythonpath", ROOT_DIR
+    ]
+    log_file = open(log_path, "w")
+    process = subprocess.Popen(command, cwd=work_dir, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    log_file.close()
+
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            if requests.get(f"{base_url}/health", timeout=2).ok:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+
+    stop_process(process)
+    raise RuntimeError(f"API did not start under gunicorn:\n{read_log_tail(log_path)}")
+
+
+def stop_process(process: subprocess.Popen):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run_load_test(
+    stages: List[Dict[str, Any]],
+    mix_path: Optional[str] = None,
+    rag_fraction: float = 0.2,
+    url: Optional[str] = None,
+    threads: int = 8,
+    embedding_latency_ms: float = 50,
+    llm_latency_ms: float = 800,
+    notion_latency_ms: float = 100,
+    jitter: float = 0.2,
+    stub_error_rate: float = 0.0,
+    dimensions: Optional[int] = None,
+    cache: bool = False,
+    timeout: float = 30,
+    seed: int = 42
+) -> Dict[str, Any]:
+    """Start the stubs and the API (unless url is given), run the stages and report them."""
+    fixture = create_retrieval_fixture()
+    mix = load_query_mix(mix_path, fixture, rag_fraction)
+    generator_config = {"stages": stages, "mix": mix_path or "builtin", "requests_in_mix": len(mix), "timeout": timeout, "seed": seed}
+
+    if url:
+        print(f"🎯 Sending load to {url}")
+        records = LoadGenerator(url, mix, stages, timeout, seed).run()
+        return dict(build_report(records, stages), config=dict(generator_config, url=url))
+
+    if importlib.util.find_spec("gunicorn") is None:
+        raise RuntimeError("gunicorn is not installed; pip install gunicorn, or pass --url to test a running API")
+
+    pages, blocks = build_notion_fixture(fixture)
+    openai_stub = start_stub_server(
+        OpenAIStubHandler, {"embeddings": embedding_latency_ms, "chat": llm_latency_ms}, jitter, stub_error_rate, seed
+    )
+    notion_stub = start_stub_server(
+        NotionStubHandler,
+        {route: notion_latency_ms for route in ("databases.query", "blocks.children.list", "pages.retrieve")},
+        jitter, stub_error_rate, seed, pages=pages, blocks=blocks
+    )
+    print(f"🧪 Stub OpenAI at {get_server_url(openai_stub)}, stub Notion at {get_server_url(notion_stub)}")
+
+    # Keep the collection, index, caches and manifest out of the real ones; the
+    # local Qdrant storage ends up in work_dir both for the indexer (TMPDIR) and
+    # for the API (./qdrant_storage relative to its working directory)
+    work_dir = tempfile.mkdtemp(prefix="load_test_")
+    env = dict(
+        os.environ,
+        TMPDIR=work_dir,
+        OPENAI_API_KEY="stub",
+        OPENAI_BASE_URL=f"{get_server_url(openai_stub)}/v1",
+        NOTION_API_KEY="stub",
+        NOTION_DATABASE_ID="load-test",
+        NOTION_BASE_URL=get_server_url(notion_stub),
+        NOTION_RATE_LIMIT="1000",
+        QDRANT_URL="",
+        EMBEDDING_BACKEND="openai",
+        EMBEDDING_DIMENSIONS=str(dimensions or ""),
+        SYNC_MANIFEST_PATH=os.path.join(work_dir, "sync_manifest.json"),
+        LEXICAL_INDEX_PATH=os.path.join(work_dir, "lexical_index.json"),
+        INDEX_CHECKPOINT_PATH=os.path.join(work_dir, "index_checkpoint.jsonl"),
+        EMBEDDING_CACHE_PATH=os.path.join(work_dir, "embedding_cache.sqlite"),
+        QUERY_CACHE_PATH=os.path.join(work_dir, "query_cache.sqlite"),
+        PROMETHEUS_MULTIPROC_DIR=""
+    )
+    if not cache:
+        # A small query mix would otherwise be served from the caches after one round
+        env.update(QUERY_CACHE_SIZE="0", ANSWER_CACHE_SIZE="0")
+
+    process = None
+    try:
+        print("📚 Indexing the fixture through the stubs...")
+        index_log = os.path.join(work_dir, "index.log")
+        with open(index_log, "w") as log_file:
+            subprocess.run([sys.executable, os.path.join(ROOT_DIR, "main.py"), "--index"], cwd=work_dir, env=env, stdout=log_file, stderr=subprocess.STDOUT, check=True)
+
+        print(f"🚀 Starting api.py under gunicorn (1 worker, {threads} threads)...")
+        process, base_url = start_api(env, work_dir, threads, os.path.join(work_dir, "api.log"))
+
+        # The index step logs failures instead of exiting non-zero, so check it worked
+        response = requests.get(f"{base_url}/search/{quote(fixture['queries'][0]['query'], safe='')}", timeout=timeout)
+        if not response.ok or not response.json().get("results"):
+            raise RuntimeError(f"Smoke search returned no results:\n{read_log_tail(index_log)}\n{read_log_tail(os.path.join(work_dir, 'api.log'))}")
+        print(f"✅ Indexed {len(pages)} fixture pages, API is up at {base_url}")
+
+        for stub in (openai_stub, notion_stub):
+            stub.requests.clear()
+            stub.errors.clear()
+
+        print(f"🏋️ Running {len(stages)} stages with up to {max(max(s['start_clients'], s['end_clients']) for s in stages)} clients...")
+        records = LoadGenerator(base_url, mix, stages, timeout, seed).run()
+
+        report = build_report(records, stages)
+        report["config"] = dict(
+            generator_config,
+            gunicorn={"workers": 1, "worker_class": "gthread", "threads": threads},
+            stubs={
+                "embedding_latency_ms": embedding_latency_ms,
+                "llm_latency_ms": llm_latency_ms,
+                "notion_latency_ms": notion_latency_ms,
+                "jitter": jitter,
+                "error_rate": stub_error_rate
+            },
+            cache=cache,
+            embedding_dimensions=dimensions or NATIVE_DIMENSIONS
+        )
+        report["stub_calls"] = {
+            "openai": {"requests": dict(openai_stub.requests), "errors": dict(openai_stub.errors)},
+            "notion": {"requests": dict(notion_stub.requests), "errors": dict(notion_stub.errors)}
+        }
+        return report
+    finally:
+        if process:
+            stop_process(process)
+        openai_stub.shutdown()
+        notion_stub.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test for the Flask API against stub OpenAI and Notion servers")
+    parser.add_argument("--stages", type=str, help='Comma-separated "clients:seconds" or "start-end:seconds" stages')
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients, when --stages is not given")
+    parser.add_argument("--ramp", type=float, default=10, help="Seconds to ramp from 1 to --concurrency clients")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to hold --concurrency clients after the ramp")
+    parser.add_argument("--mix", type=str, help="JSON query mix file (see module docstring); defaults to the retrieval fixture queries")
+    parser.add_argument("--rag-fraction", type=float, default=0.2, help="Share of /rag requests in the default query mix")
+    parser.add_argument("--url", type=str, help="Send load to this running API instead of starting stubs and gunicorn")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn gthread threads of the API worker")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50, help="Stub OpenAI embeddings latency")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="Stub OpenAI chat completion latency")
+    parser.add_argument("--notion-latency-ms", type=float, default=100, help="Stub Notion API latency (indexing only)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative spread of the stub latencies")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Fraction of stub requests answered with a 500")
+    parser.add_argument("--dimensions", type=int, help="EMBEDDING_DIMENSIONS of the indexed fixture")
+    parser.add_argument("--cache", action="store_true", help="Keep the query embedding and answer caches enabled")
+    parser.add_argument("--timeout", type=float, default=30, help="Client timeout per request in seconds")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the query mix and stub draws")
+    parser.add_argument("--output", type=str, help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    stage_spec = args.stages or ",".join(
+        ([f"1-{args.concurrency}:{args.ramp:g}"] if args.ramp else []) + [f"{args.concurrency}:{args.duration:g}"]
+    )
+
+    print("🏁 Running API Load Test...")
+    try:
+        report = run_load_test(
+            parse_stages(stage_spec),
+            mix_path=args.mix,
+            rag_fraction=args.rag_fraction,
+            url=args.url,
+            threads=args.threads,
+            embedding_latency_ms=args.embedding_latency_ms,
+            llm_latency_ms=args.llm_latency_ms,
+            notion_latency_ms=args.notion_latency_ms,
+            jitter=args.jitter,
+            stub_error_rate=args.stub_error_rate,
+            dimensions=args.dimensions,
+            cache=args.cache,
+            timeout=args.timeout,
+            seed=args.seed
+        )
+    except (RuntimeError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"❌ Load test failed: {e}")
+        sys.exit(1)
+
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.output}")
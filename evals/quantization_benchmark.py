@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Benchmark the memory / recall / latency tradeoff of vector quantization on the indexed Notion chunks.
+
+Copies the live collection into a temporary collection per quantization mode,
+runs sampled chunk vectors as queries against each one, and compares the
+results with exact float32 search. Needs a Qdrant server (QDRANT_URL), since
+local storage does not implement quantization.
+
+Usage: python evals/quantization_benchmark.py --sample 200 --limit 10 --oversampling 1.0,2.0,4.0
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from typing import List, Dict, Any
+from dotenv import load_dotenv
+from qdrant_client.http import models
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from vector_store import VectorStore
+except ImportError as e:
+    print(f"Import error: {e}")
+    print("Make sure you're running from the project root directory")
+    sys.exit(1)
+
+
+def load_points(vector_store: VectorStore, max_points: int = None) -> List[models.Record]:
+    """Read points, with vectors, from the live collection."""
+    points = []
+    offset = None
+    while True:
+        batch, offset = vector_store.client.scroll(
+            collection_name=vector_store.collection_name,
+            limit=1000,
+            offset=offset,
+            with_payload=False,
+            with_vectors=True
+        )
+        points.extend(batch)
+        if offset is None or (max_points and len(points) >= max_points):
+            return points[:max_points] if max_points else points
+
+
+def estimate_memory_bytes(num_points: int, dim: int, quantization: str, on_disk: bool) -> int:
+    """Estimate the RAM used by vectors: quantized copies plus in-memory originals."""
+    quantized = {"none": 0, "scalar": dim, "binary": dim // 8}[quantization]
+    originals = 0 if on_disk else 4 * dim
+    return num_points * (quantized + originals)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def copy_collection(vector_store: VectorStore, name: str, points: List[models.Record], quantization: str, on_disk: bool):
+    """Create a collection with the given storage settings and load the points into it."""
+    vector_store.client.create_collection(
+        collection_name=name,
+        vectors_config=models.VectorParams(
+            size=len(points[0].vector),
+            distance=models.Distance.COSINE,
+            on_disk=on_disk
+        ),
+        quantization_config=vector_store.get_quantization_config(quantization)
+    )
+    for i in range(0, len(points), 256):
+        vector_store.client.upsert(
+            collection_name=name,
+            points=[models.PointStruct(id=point.id, vector=point.vector) for point in points[i:i+256]],
+            wait=True
+        )
+
+    # Searches are only representative once the HNSW index and quantized vectors are built
+    while vector_store.client.get_collection(name).status != models.CollectionStatus.GREEN:
+        time.sleep(1)
+
+
+def run_queries(vector_store: VectorStore, name: str, queries: List[models.Record], limit: int, params: models.SearchParams):
+    """Search with each query vector, excluding the query point itself.
+
+    Returns:
+        Tuple[List[List[str]], List[float]]: The result IDs and latency (ms) of each query.
+    """
+    results = []
+    latencies = []
+    for query in queries:
+        start_time = time.time()
+        hits = vector_store.client.search(
+            collection_name=name,
+            query_vector=query.vector,
+            search_params=params,
+            limit=limit + 1
+        )
+        latencies.append((time.time() - start_time) * 1000)
+        results.append([str(hit.id) for hit in hits if hit.id != query.id][:limit])
+    return results, latencies
+
+
+def run_quantization_benchmark(sample: int, limit: int, oversampling: List[float], on_disk: bool, max_points: int = None) -> List[Dict[str, Any]]:
+    """Benchmark every quantization mode against exact search on the live collection."""
+    vector_store = VectorStore()
+    if vector_store.is_local:
+        print("⚠️ Local Qdrant storage ignores quantization; set QDRANT_URL to benchmark a server")
+
+    print(f"📥 Loading vectors from {vector_store.collection_name}...")
+    points = load_points(vector_store, max_points)
+    if not points:
+        print("❌ No points found, index your Notion content first")
+        return []
+    dim = len(points[0].vector)
+    queries = random.Random(42).sample(points, min(sample, len(points)))
+    print(f"✅ Loaded {len(points)} vectors ({dim} dims), {len(queries)} sampled as queries")
+
+    rows = []
+    ground_truth = None
+    for quantization in ["none", "scalar", "binary"]:
+        name = f"{vector_store.collection_name}_bench_{quantization}"
+        print(f"\n🔧 Building {name}...")
+        copy_collection(vector_store, name, points, quantization, on_disk)
+
+        try:
+            if ground_truth is None:
+                ground_truth, _ = run_queries(vector_store, name, queries, limit, models.SearchParams(exact=True))
+
+            if quantization == "none":
+                settings = [(None, False)]
+            else:
+                settings = [(1.0, False)] + [(factor, True) for factor in oversampling]
+
+            for factor, rescore in settings:
+                params = models.SearchParams(
+                    quantization=models.QuantizationSearchParams(rescore=rescore, oversampling=factor)
+                )
+                results, latencies = run_queries(vector_store, name, queries, limit, params)
+                recall = sum(
+                    len(set(result) & set(truth)) / max(len(truth), 1)
+                    for result, truth in zip(results, ground_truth)
+                ) / len(queries)
+
+                row = {
+                    "quantization": quantization,
+                    "on_disk": on_disk,
+                    "oversampling": factor,
+                    "rescore": rescore,
+                    f"recall@{limit}": round(recall, 4),
+                    "p50_ms": round(percentile(latencies, 50), 2),
+                    "p95_ms": round(percentile(latencies, 95), 2),
+                    "qps": round(len(latencies) / (sum(latencies) / 1000), 1),
+                    "vector_ram_mb": round(estimate_memory_bytes(len(points), dim, quantization, on_disk) / 1024 / 1024, 2)
+                }
+                rows.append(row)
+                print(f"   oversampling={factor} rescore={rescore}: recall@{limit}={row[f'recall@{limit}']}, "
+                      f"p50={row['p50_ms']}ms, p95={row['p95_ms']}ms, RAM≈{row['vector_ram_mb']}MB")
+        finally:
+            vector_store.client.delete_collection(collection_name=name)
+
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantization memory/recall/latency benchmark")
+    parser.add_argument("--sample", type=int, default=200, help="Number of chunk vectors used as queries")
+    parser.add_argument("--limit", type=int, default=10, help="Results per query (k for recall@k)")
+    parser.add_argument("--oversampling", type=str, default="1.0,2.0,4.0", help="Comma-separated oversampling factors to try with rescoring")
+    parser.add_argument("--on-disk", action="store_true", help="Keep the float32 originals on disk")
+    parser.add_argument("--max-points", type=int, help="Only copy this many points from the collection")
+    parser.add_argument("--output", type=str, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    print("📏 Running Quantization Benchmark...")
+    rows = run_quantization_benchmark(
+        args.sample,
+        args.limit,
+        [float(factor) for factor in args.oversampling.split(",")],
+        args.on_disk,
+        args.max_points
+    )
+
+    if args.output and rows:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval benchmark: recall@k / MRR / nDCG and latency of NotionSearch.search().
+
+Builds a fixture collection from a labelled set of pages in a throwaway
+directory, going through the same extraction, chunking, embedding, upsert and
+lexical indexing code as a real index, then runs each labelled query through
+NotionSearch.search() and scores the ranked pages against the expected ones.
+Embeddings come from the deterministic hashing backend by default, so the
+benchmark needs no network and gives the same quality numbers on every run;
+--backend sentence-transformers benchmarks a local model instead.
+
+Usage:
+    python evals/retrieval_benchmark.py --k 5 --modes dense,hybrid --output retrieval.json
+    python evals/retrieval_benchmark.py --baseline evals/retrieval_baseline.json   # compare, exit 1 on regression
+    python evals/retrieval_benchmark.py --save-baseline evals/retrieval_baseline.json
+
+evals/retrieval_baseline.json is the committed baseline of the default run
+(hashing backend, builtin fixture, k=5). Save a new one in the same commit as
+a change that is meant to move the numbers.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+from typing import List, Dict, Any, Optional
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from notion_connector import NotionConnector
+    from embeddings import EmbeddingGenerator
+    from embedding_backends import EmbeddingBackend, create_embedding_backend
+    from vector_store import VectorStore
+    from search import NotionSearch
+    from query_cache import QueryEmbeddingCache, MemoryCacheBackend
+    from main import build_lexical_index
+except ImportError as e:
+    print(f"Import error: {e}")
+    print("Make sure you're running from the project root directory")
+    sys.exit(1)
+
+QUALITY_METRICS = ["recall", "mrr", "ndcg"]
+LATENCY_METRICS = ["p50_ms", "p95_ms", "p99_ms"]
+
+
+def create_retrieval_fixture() -> Dict[str, Any]:
+    """Labelled fixture: pages as (title, paragraphs) and queries with the page_ids that answer them."""
+    pages = [
+        ("ranking-models", "Ranking models for feeds", [
+            "# Ranking models",
+            "Feed ranking usually runs in two stages: candidate generation narrows millions of posts to a few thousand, then a heavier ranking model scores each candidate.",
+            "The ranking model predicts engagement probabilities such as click, like and share, and combines them into a single value score with tuned weights.",
+            "## Features",
+            "Useful features include author affinity, post age, content type embeddings and the viewer's recent interactions.",
+            "Gradient boosted trees are a strong baseline; deep models such as DLRM or two-tower networks scale better with sparse features."
+        ]),
+        ("recsys-retrieval", "Candidate retrieval for recommendations", [
+            "# Candidate retrieval",
+            "Two-tower models embed users and items separately so item embeddings can be precomputed and searched with approximate nearest neighbour indexes like HNSW or ScaNN.",
+            "Negative sampling matters: in-batch negatives are cheap but biased towards popular items, so a logQ correction is applied.",
+            "Retrieval quality is measured offline with recall@k against held-out interactions before any online A/B test."
+        ]),
+        ("notifications", "Instagram notification ranking", [
+            "# Notifications",
+            "Instagram ranks push notifications by predicting the probability that a notification leads to a session, while limiting volume per user.",
+            "Causal inference is used to estimate the incremental effect of sending a notification rather than its raw click-through rate.",
+            "A volume model decides how many notifications a user should get per day, trading engagement against unsubscribes."
+        ]),
+        ("content-moderation", "Content moderation with LLMs", [
+            "# Content moderation",
+            "Harmful content is detected with a cascade: cheap classifiers filter obvious cases, and large language models review borderline posts with the policy text in the prompt.",
+            "Human reviewers label a sample of decisions, and the labels are used to fine-tune the classifiers and measure precision per policy.",
+            "Appeals are routed back to reviewers, and overturned decisions become hard training examples."
+        ]),
+        ("ads-ctr", "Click-through rate prediction for ads", [
+            "# Ads CTR prediction",
+            "Ads ranking multiplies the predicted click-through rate by the bid to compute an expected value for each auction.",
+            "Calibration is critical because predicted probabilities are used directly in pricing; isotonic regression or Platt scaling fixes miscalibrated models.",
+            "Logistic regression with feature crosses was the classic model before deep and cross networks."
+        ]),
+        ("feature-store", "Feature store design", [
+            "# Feature store",
+            "A feature store serves the same feature definitions offline for training and online for inference, which prevents training-serving skew.",
+            "Online features live in a low-latency key-value store such as Redis, while offline features are materialized as point-in-time correct snapshots in the warehouse.",
+            "Streaming features are computed with Flink or Spark Structured Streaming from event logs."
+        ]),
+        ("embeddings-search", "Semantic search with embeddings", [
+            "# Semantic search",
+            "Documents are split into chunks, each chunk is embedded, and queries are matched by cosine similarity in a vector database such as Qdrant.",
+            "Hybrid search fuses dense vector results with BM25 keyword results using reciprocal rank fusion, which helps with identifiers and rare terms.",
+            "Quantization shrinks vectors to int8 or binary codes to save memory, with rescoring on the original vectors to recover recall."
+        ]),
+        ("ab-testing", "A/B testing and experimentation", [
+            "# Experimentation",
+            "Online experiments randomize users into control and treatment and compare metrics with a t-test or a bootstrap confidence interval.",
+            "Variance reduction with CUPED uses pre-experiment data to shrink confidence intervals, so experiments need fewer users.",
+            "Network effects in social products break the independence assumption, so cluster randomization is used instead."
+        ]),
+        ("rag-systems", "Retrieval-augmented generation", [
+            "# RAG",
+            "Retrieval-augmented generation retrieves relevant passages and puts them in the prompt so the language model answers from the knowledge base instead of memory.",
+            "The context has to fit the model's token budget, so passages are ranked, deduplicated and truncated before prompting.",
+            "Answer quality is graded on faithfulness to the sources and on whether the answer cites them."
+        ]),
+        ("model-serving", "Model serving and latency", [
+            "# Serving",
+            "Model servers batch requests dynamically to keep GPUs busy while staying under the latency budget of the calling service.",
+            "p99 latency is dominated by tail effects such as garbage collection pauses, cold caches and slow shards, so requests are hedged to a second replica.",
+            "Distillation and quantization reduce model size so inference fits on CPUs for cheaper serving."
+        ]),
+        ("fraud-detection", "Fraud detection", [
+            "# Fraud",
+            "Fraud detection models score transactions in real time using velocity features, device fingerprints and graph features linking accounts.",
+            "Labels arrive late because chargebacks take weeks, so models are trained on delayed labels and monitored for drift.",
+            "Rules catch known patterns immediately, while the model generalizes to new attack patterns."
+        ]),
+        ("search-relevance", "Search relevance evaluation", [
+            "# Relevance evaluation",
+            "Search quality is measured with nDCG and MRR on a labelled query set, where raters grade each result for relevance.",
+            "Click logs provide implicit labels, but position bias must be corrected with inverse propensity weighting.",
+            "Interleaving compares two rankers online with far fewer users than an A/B test."
+        ])
+    ]
+
+    queries = [
+        ("how are feed posts ranked", ["ranking-models"]),
+        ("two tower model nearest neighbour retrieval", ["recsys-retrieval"]),
+        ("when should instagram send a push notification", ["notifications"]),
+        ("causal effect of notifications", ["notifications"]),
+        ("using LLMs to moderate harmful posts", ["content-moderation"]),
+        ("calibrating predicted click probabilities for ads auctions", ["ads-ctr"]),
+        ("avoid training serving skew", ["feature-store"]),
+        ("BM25 and vector hybrid search", ["embeddings-search"]),
+        ("int8 quantization of vectors", ["embeddings-search", "model-serving"]),
+        ("reduce variance in experiments with CUPED", ["ab-testing"]),
+        ("fit retrieved passages in the prompt token budget", ["rag-systems"]),
+        ("reduce p99 tail latency", ["model-serving"]),
+        ("delayed chargeback labels", ["fraud-detection"]),
+        ("nDCG and MRR offline evaluation", ["search-relevance", "recsys-retrieval"]),
+        ("gradient boosted trees versus deep models", ["ranking-models"]),
+        ("position bias in click logs", ["search-relevance"])
+    ]
+
+    return {
+        "pages": [{"page_id": page_id, "title": title, "paragraphs": paragraphs} for page_id, title, paragraphs in pages],
+        "queries": [{"query": query, "expected_page_ids": expected} for query, expected in queries]
+    }
+
+
+def to_notion(page: Dict[str, Any]):
+    """Convert a fixture page into a Notion page and its blocks."""
+    notion_page = {"id": page["page_id"], "properties": {"Name": {"title": [{"text": {"content": page["title"]}}]}}}
+    blocks = []
+    for paragraph in page["paragraphs"]:
+        level = len(paragraph) - len(paragraph.lstrip("#"))
+        block_type = f"heading_{level}" if level else "paragraph"
+        blocks.append({
+            "type": block_type,
+            "has_children": False,
+            block_type: {"rich_text": [{"plain_text": paragraph.lstrip("# ")}]}
+        })
+    return notion_page, blocks
+
+
+def build_fixture_collection(fixture: Dict[str, Any], embedding_backend: EmbeddingBackend) -> VectorStore:
+    """Index the fixture pages into a local collection with the real indexing code."""
+    connector = NotionConnector()
+    notion_pages = [to_notion(page) for page in fixture["pages"]]
+    blocks_by_page = {notion_page["id"]: blocks for notion_page, blocks in notion_pages}
+    connector.fetch_page_content = lambda page_id: blocks_by_page[page_id]
+
+    chunks = []
+    for idx, (notion_page, _) in enumerate(notion_pages):
+        chunks.extend(connector.extract_page_chunks(idx, notion_page))
+    connector.close()
+
+    generator = EmbeddingGenerator(backend=embedding_backend)
+    generator.cache = None
+    documents = generator.generate_embeddings(chunks)
+
+    vector_store = VectorStore(embedding_backend=embedding_backend)
+    vector_store.upsert_documents(documents)
+    build_lexical_index(vector_store).save()
+    print(f"✅ Indexed {len(fixture['pages'])} fixture pages as {len(documents)} chunks")
+    return vector_store
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def score_ranking(ranked: List[str], expected: List[str], k: int) -> Dict[str, float]:
+    """Compute recall@k, reciprocal rank and nDCG@k (binary relevance) of a page ranking."""
+    top = ranked[:k]
+    relevant = set(expected)
+    hits = [page_id in relevant for page_id in top]
+
+    reciprocal_rank = next((1.0 / (rank + 1) for rank, hit in enumerate(hits) if hit), 0.0)
+    dcg = sum(1.0 / math.log2(rank + 2) for rank, hit in enumerate(hits) if hit)
+    ideal = sum(1.0 / math.log2(rank + 2) for rank in range(min(len(relevant), k)))
+
+    return {
+        "recall": sum(hits) / len(relevant),
+        "mrr": reciprocal_rank,
+        "ndcg": dcg / ideal if ideal else 0.0
+    }
+
+
+def run_mode(search: NotionSearch, queries: List[Dict[str, Any]], mode: str, k: int, repeats: int) -> Dict[str, Any]:
+    """Run every query through NotionSearch.search() and aggregate quality and latency."""
+    # Warm up the clients and the lexical index so the first query isn't an outlier
+    search.search(queries[0]["query"], limit=k * 3, max_pages=k, mode=mode)
+
+    latencies = []
+    per_query = []
+    start_time = time.perf_counter()
+    for repeat in range(repeats):
+        for item in queries:
+            query_start = time.perf_counter()
+            results = search.search(item["query"], limit=k * 3, max_pages=k, mode=mode)
+            latencies.append((time.perf_counter() - query_start) * 1000)
+
+            if repeat == 0:
+                ranked = list(dict.fromkeys(result["page_id"] for result in results))
+                scores = score_ranking(ranked, item["expected_page_ids"], k)
+                per_query.append(dict(query=item["query"], ranked=ranked[:k], **scores))
+    elapsed = time.perf_counter() - start_time
+
+    summary = {metric: round(sum(row[metric] for row in per_query) / len(per_query), 4) for metric in QUALITY_METRICS}
+    summary.update({
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "qps": round(len(latencies) / elapsed, 1),
+        "queries": len(latencies)
+    })
+    return {"summary": summary, "per_query": per_query}
+
+
+def compare_to_baseline(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    quality_tolerance: float,
+    latency_tolerance: float,
+    latency_floor_ms: float
+) -> List[str]:
+    """Print the change of each metric against a baseline run and return the regressions.
+
+    Quality metrics regress when they drop by more than quality_tolerance.
+    Latency percentiles regress when they grow by more than latency_tolerance
+    (relative) and latency_floor_ms, so sub-millisecond jitter is not flagged.
+    QPS is reported but not gated.
+    """
+    regressions = []
+    for mode, current in results["modes"].items():
+        previous = baseline.get("modes", {}).get(mode)
+        if previous is None:
+            print(f"⚠️ No baseline for mode {mode}")
+            continue
+
+        print(f"\n📊 {mode} vs baseline:")
+        for metric in QUALITY_METRICS + LATENCY_METRICS + ["qps"]:
+            new, old = current["summary"][metric], previous["summary"][metric]
+            change = new - old
+            if metric in QUALITY_METRICS:
+                regressed = change < -quality_tolerance
+            elif metric in LATENCY_METRICS:
+                regressed = new > old * (1 + latency_tolerance) and change > latency_floor_ms
+            else:
+                regressed = False
+
+            marker = "❌" if regressed else "✅"
+            print(f"   {marker} {metric}: {old} → {new} ({change:+.4f})")
+            if regressed:
+                regressions.append(f"{mode} {metric}: {old} → {new}")
+    return regressions
+
+
+def run_retrieval_benchmark(
+    k: int,
+    modes: List[str],
+    repeats: int,
+    dimensions: int,
+    dataset: Optional[str] = None,
+    backend: str = "hashing"
+) -> Dict[str, Any]:
+    """Build the fixture collection in a temporary directory and benchmark each search mode."""
+    if dataset:
+        with open(dataset, "r") as f:
+            fixture = json.load(f)
+    else:
+        fixture = create_retrieval_fixture()
+
+    # Keep the fixture collection, lexical index and caches out of the real ones
+    work_dir = tempfile.mkdtemp(prefix="retrieval_benchmark_")
+    previous_tempdir = tempfile.tempdir
+    tempfile.tempdir = work_dir
+    os.environ.pop("QDRANT_URL", None)
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(work_dir, "lexical_index.json")
+    os.environ["EMBEDDING_BACKEND"] = backend
+    os.environ["EMBEDDING_DIMENSIONS"] = str(dimensions)
+    for name in ("OPENAI_API_KEY", "NOTION_API_KEY", "NOTION_DATABASE_ID"):
+        os.environ.setdefault(name, "offline")
+
+    try:
+        embedding_backend = create_embedding_backend()
+        vector_store = build_fixture_collection(fixture, embedding_backend)
+
+        # An always-empty query cache, so every search pays for its embedding
+        search = NotionSearch(
+            query_cache=QueryEmbeddingCache(MemoryCacheBackend(max_entries=0)),
+            qdrant_client=vector_store.client,
+            embedding_backend=embedding_backend
+        )
+
+        results = {
+            "config": {
+                "k": k,
+                "repeats": repeats,
+                "embedding": embedding_backend.metadata(),
+                "pages": len(fixture["pages"]),
+                "labelled_queries": len(fixture["queries"]),
+                "dataset": dataset or "builtin"
+            },
+            "modes": {}
+        }
+        for mode in modes:
+            print(f"\n🔎 Running {len(fixture['queries'])} queries x {repeats} in {mode} mode...")
+            results["modes"][mode] = run_mode(search, fixture["queries"], mode, k, repeats)
+            summary = results["modes"][mode]["summary"]
+            print(f"   recall@{k}={summary['recall']}, MRR={summary['mrr']}, nDCG@{k}={summary['ndcg']}")
+            print(f"   p50={summary['p50_ms']}ms, p95={summary['p95_ms']}ms, p99={summary['p99_ms']}ms, {summary['qps']} QPS")
+
+        vector_store.client.close()
+        return results
+    finally:
+        tempfile.tempdir = previous_tempdir
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline retrieval quality and latency benchmark")
+    parser.add_argument("--k", type=int, default=5, help="Pages per query (k for recall@k and nDCG@k)")
+    parser.add_argument("--modes", type=str, default="dense,hybrid", help="Comma-separated search modes to benchmark")
+    parser.add_argument("--repeats", type=int, default=20, help="Times each query is run for the latency numbers")
+    parser.add_argument("--backend", type=str, default="hashing", help="Embedding backend: hashing, sentence-transformers or openai (needs network)")
+    parser.add_argument("--dimensions", type=int, default=256, help="Size of the hashing (or shortened OpenAI) embeddings")
+    parser.add_argument("--dataset", type=str, help='JSON file with {"pages": [{"page_id", "title", "paragraphs"}], "queries": [{"query", "expected_page_ids"}]}')
+    parser.add_argument("--output", type=str, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=str, help="Compare against this results file; exits with status 1 on regression")
+    parser.add_argument("--save-baseline", type=str, help="Write the results to this file as the new baseline")
+    parser.add_argument("--quality-tolerance", type=float, default=0.01, help="Allowed absolute drop in recall/MRR/nDCG")
+    parser.add_argument("--latency-tolerance", type=float, default=0.25, help="Allowed relative increase in latency percentiles")
+    parser.add_argument("--latency-floor-ms", type=float, default=1.0, help="Latency increases below this are never regressions")
+    args = parser.parse_args()
+
+    print("🏁 Running Offline Retrieval Benchmark...")
+    results = run_retrieval_benchmark(
+        args.k,
+        [mode.strip() for mode in args.modes.split(",")],
+        args.repeats,
+        args.dimensions,
+        args.dataset,
+        args.backend
+    )
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"\n💾 Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}).get("k") != args.k:
+            print(f"⚠️ Baseline was run with k={baseline.get('config', {}).get('k')}, not k={args.k}")
+
+        regressions = compare_to_baseline(results, baseline, args.quality_tolerance, args.latency_tolerance, args.latency_floor_ms)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions against {args.baseline}")
+            sys.exit(1)
+        print(f"\n✅ No regressions against {args.baseline}")
@@ -0,0 +1,197 @@
+import os
+import re
+import json
+import math
+import heapq
+import logging
+import tempfile
+import threading
+import unicodedata
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Words, keeping identifiers like "v2.1" or "OPS-1234" together
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-]\w+)*")
+
+
+class LexicalIndex:
+    """In-process BM25 inverted index over the chunks in the vector store.
+
+    Documents are keyed by their Qdrant point ID, so lexical hits can be fused
+    with dense results and their payloads fetched from Qdrant. The index is
+    persisted as JSON; readers call refresh() to pick up a newer file written
+    by the indexer. index_version names the vector store index version the
+    index was built for (see VectorStore.record_index_version()).
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        """Initialize an empty index.
+
+        Args:
+            path (Optional[str]): File location. Defaults to LEXICAL_INDEX_PATH, or a
+                file in the system temp directory.
+            k1 (float): BM25 term frequency saturation.
+            b (float): BM25 document length normalization.
+        """
+        self.path = path or os.getenv("LEXICAL_INDEX_PATH") or os.path.join(
+            tempfile.gettempdir(), "notion_lexical_index.json"
+        )
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.page_docs: Dict[str, List[str]] = {}
+        self.total_length = 0
+        self.index_version: Optional[str] = None
+        self.mtime: Optional[float] = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Split text into lowercase terms. Compound identifiers also yield their parts."""
+        text = unicodedata.normalize("NFKC", text).lower()
+        tokens = []
+        for token in TOKEN_PATTERN.findall(text):
+            tokens.append(token)
+            if "." in token or "-" in token:
+                tokens.extend(part for part in re.split(r"[.\-]", token) if part)
+        return tokens
+
+    def add(self, doc_id: str, payload: Dict[str, Any]):
+        """Index a chunk, replacing any previous version of it.
+
+        Args:
+            doc_id (str): The Qdrant point ID.
+            payload (Dict[str, Any]): The point payload (title, chunk and page_id).
+        """
+        tokens = self.tokenize(f"{payload.get('title', '')}\n{payload.get('chunk', '')}")
+
+        with self.lock:
+            if doc_id in self.doc_lengths:
+                self._remove(doc_id)
+
+            for term, count in Counter(tokens).items():
+                self.postings.setdefault(term, {})[doc_id] = count
+            self.doc_lengths[doc_id] = len(tokens)
+            self.total_length += len(tokens)
+            page_docs = self.page_docs.setdefault(payload.get("page_id", ""), [])
+            if doc_id not in page_docs:
+                page_docs.append(doc_id)
+
+    def _remove(self, doc_id: str):
+        # Caller holds the lock; page_docs is cleaned up by remove_pages
+        for term in list(self.postings):
+            postings = self.postings[term]
+            if postings.pop(doc_id, None) is not None and not postings:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def remove_pages(self, page_ids: List[str]):
+        """Remove every chunk of the given pages.
+
+        Args:
+            page_ids (List[str]): IDs of the Notion pages to remove.
+        """
+        with self.lock:
+            doc_ids = set()
+            for page_id in page_ids:
+                doc_ids.update(self.page_docs.pop(page_id, []))
+            doc_ids &= set(self.doc_lengths)
+            if not doc_ids:
+                return
+
+            for term in list(self.postings):
+                postings = self.postings[term]
+                for doc_id in doc_ids & postings.keys():
+                    del postings[doc_id]
+                if not postings:
+                    del self.postings[term]
+            for doc_id in doc_ids:
+                self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Rank chunks against a query with BM25.
+
+        Args:
+            query (str): The search query.
+            limit (int): Maximum number of hits.
+
+        Returns:
+            List[Tuple[str, float]]: (point ID, BM25 score) pairs, best first.
+        """
+        with self.lock:
+            if not self.doc_lengths:
+                return []
+
+            num_docs = len(self.doc_lengths)
+            avg_length = self.total_length / num_docs
+            scores: Dict[str, float] = {}
+
+            for term in set(self.tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+
+                idf = math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def clear(self):
+        """Remove every document."""
+        with self.lock:
+            self.postings = {}
+            self.doc_lengths = {}
+            self.page_docs = {}
+            self.total_length = 0
+
+    def load(self):
+        """Load the index from disk, if it has been saved."""
+        if not os.path.exists(self.path):
+            return
+
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, "r") as f:
+            data = json.load(f)
+
+        with self.lock:
+            self.postings = data["postings"]
+            self.doc_lengths = data["doc_lengths"]
+            self.page_docs = data["page_docs"]
+            self.total_length = sum(self.doc_lengths.values())
+            self.index_version = data.get("index_version")
+            self.mtime = mtime
+        logger.info(f"Loaded lexical index with {len(self.doc_lengths)} chunks from {self.path}")
+
+    def refresh(self):
+        """Reload the index if the file changed since it was last loaded."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self.mtime:
+            self.load()
+
+    def save(self):
+        """Write the index to disk atomically."""
+        with self.lock:
+            data = {
+                "postings": self.postings,
+                "doc_lengths": self.doc_lengths,
+                "page_docs": self.page_docs,
+                "index_version": self.index_version
+            }
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            self.mtime = os.path.getmtime(self.path)
+        logger.info(f"Saved lexical index with {len(self.doc_lengths)} chunks to {self.path}")
@@ -1,8 +1,14 @@
 import os
+import sys
 import logging
+from collections import defaultdict
 from notion_connector import NotionConnector
 from embeddings import EmbeddingGenerator
 from vector_store import VectorStore
+from sync_manifest import SyncManifest
+from pipeline import Pipeline
+from checkpoint import IndexCheckpoint
+from lexical_index import LexicalIndex
 from search import NotionSearch
 from rag import RAGProcessor
 from github_logging import setup_github_logging
@@ -11,55 +17,342 @@ from github_logging import setup_github_logging
 setup_github_logging()
 logger = logging.getLogger(__name__)
 
-def index_notion_content():
-    """Fetch Notion content, generate embeddings, and store them in the vector store."""
+def index_notion_content(resume: bool = False):
+    """Fetch Notion content, generate embeddings, and store them in the vector store.
+    
+    Runs as a streaming pipeline: database pages are fetched, chunked, embedded
+    and upserted by concurrent stages connected by bounded queues, so memory
+    stays constant and storage starts as soon as the first chunks are embedded.
+    
+    Progress is journaled in an IndexCheckpoint. If a run fails, its versioned
+    collection is kept, and resume=True continues filling it, skipping pages
+    that were already upserted (re-fetched pages hit the embedding cache).
+    
+    Args:
+        resume (bool): Continue the last failed run instead of starting over.
+    """
+    notion = None
     try:
         logger.info("Starting Notion content indexing")
         
-        # Fetch content from Notion
         logger.info("Connecting to Notion")
         notion = NotionConnector()
+        embedding_generator = EmbeddingGenerator()
+        vector_store = VectorStore(embedding_backend=embedding_generator.backend)
+        checkpoint = IndexCheckpoint()
         
-        logger.info("Fetching database content")
-        pages = notion.fetch_database_content()
-        logger.info(f"Fetched {len(pages)} pages from Notion database")
+        if resume and checkpoint.collection_name and vector_store.physical_collection_exists(checkpoint.collection_name):
+            target_collection = checkpoint.collection_name
+            completed_pages = checkpoint.get_completed_pages()
+            logger.info(f"Resuming index into {target_collection}: {len(completed_pages)} pages already upserted")
+            
+            # Pages that were only partly stored are rewritten from scratch
+            incomplete_ids = [page_id for page_id in checkpoint.pages if page_id not in completed_pages]
+            vector_store.delete_pages(incomplete_ids, collection_name=target_collection)
+        else:
+            if resume:
+                logger.warning("No index checkpoint to resume from, starting a full index")
+            
+            # A stale unfinished collection would otherwise survive garbage collection
+            stale_collection = checkpoint.collection_name
+            if stale_collection and stale_collection != vector_store.get_live_collection() and vector_store.physical_collection_exists(stale_collection):
+                logger.info(f"Dropping unfinished collection from a previous run: {stale_collection}")
+                vector_store.client.delete_collection(collection_name=stale_collection)
+                vector_store.delete_collection_metadata(stale_collection)
+            
+            target_collection = vector_store.create_versioned_collection()
+            checkpoint.start(target_collection)
+            completed_pages = {}
         
-        # Extract text from pages and split into chunks
-        logger.info("Extracting text from pages and splitting into chunks")
-        chunks_data = notion.extract_text_from_pages(pages)
-        logger.info(f"Created {len(chunks_data)} chunks from {len(pages)} pages")
+        # Per-page bookkeeping for the sync manifest; small compared to the content
+        indexed_pages = {}
+        embedded_counts = defaultdict(int)
+        upserted_counts = defaultdict(int)
+        changed_pages = []
         
-        # Generate embeddings
-        logger.info("Generating embeddings for chunks")
-        embedding_generator = EmbeddingGenerator()
-        documents = embedding_generator.generate_embeddings(chunks_data)
-        logger.info(f"Generated embeddings for {len(documents)} chunks")
+        def pending_pages():
+            for page in notion.iter_database_content():
+                entry = completed_pages.get(page["id"])
+                if entry and entry.get("last_edited_time") == page.get("last_edited_time"):
+                    indexed_pages[page["id"]] = (entry["last_edited_time"], entry["content_hash"], entry["chunks"])
+                    embedded_counts[page["id"]] = entry["chunks"]
+                    continue
+                if entry:
+                    changed_pages.append(page["id"])
+                yield page
+        
+        def extract_chunks(pages):
+            for page, page_chunks in notion.iter_page_chunks(pages):
+                title = page_chunks[0]["title"] if page_chunks else ""
+                content_hash = SyncManifest.hash_content(title, [chunk_data["chunk"] for chunk_data in page_chunks])
+                indexed_pages[page["id"]] = (page.get("last_edited_time"), content_hash, len(page_chunks))
+                
+                fields = {"last_edited_time": page.get("last_edited_time"), "content_hash": content_hash, "chunks": len(page_chunks)}
+                checkpoint.record("fetched", page["id"], **fields)
+                # A page that failed to fetch is not done, so --resume fetches it again
+                if not page_chunks and page["id"] not in notion.failed_pages:
+                    checkpoint.record("upserted", page["id"], **fields)
+                yield from page_chunks
+        
+        def embed_chunks(chunks):
+            for doc in embedding_generator.iter_embeddings(chunks):
+                embedded_counts[doc["page_id"]] += 1
+                if embedded_counts[doc["page_id"]] == doc["total_chunks"]:
+                    checkpoint.record("embedded", doc["page_id"])
+                yield doc
+        
+        def on_batch_stored(points):
+            for point in points:
+                page_id = point.payload["page_id"]
+                upserted_counts[page_id] += 1
+                if upserted_counts[page_id] == point.payload["total_chunks"]:
+                    checkpoint.record("upserted", page_id)
+        
+        def store_documents(documents):
+            return vector_store.upsert_documents(documents, collection_name=target_collection, on_batch_stored=on_batch_stored)
+        
+        pipeline = Pipeline("index")
+        try:
+            stats = pipeline.run([
+                ("fetch", pending_pages),
+                ("extract", extract_chunks),
+                ("embed", embed_chunks),
+                ("store", store_documents)
+            ])
+        except Exception:
+            logger.error(f"Indexing failed; progress is saved, run with --resume to continue into {target_collection}")
+            raise
+        logger.info(f"Indexed {len(indexed_pages)} pages, upserted {stats['points']} chunks ({stats['points_per_sec']} points/sec)")
         
-        # Store embeddings in vector database
-        logger.info("Storing embeddings in vector database")
-        vector_store = VectorStore()
-        vector_store.store_embeddings(documents)
-        logger.info("Embeddings stored successfully")
+        # Clean up pages that changed or disappeared since an interrupted run
+        removed_ids = [page_id for page_id in completed_pages if page_id not in indexed_pages]
+        vector_store.delete_pages(removed_ids, collection_name=target_collection)
+        for page_id in changed_pages:
+            vector_store.delete_stale_chunks(page_id, indexed_pages[page_id][2], collection_name=target_collection)
+        
+        lexical_index = build_lexical_index(vector_store, target_collection)
+        
+        # Go live and drop old versions
+        vector_store.swap_alias(target_collection)
+        vector_store.garbage_collect()
+        
+        # Record what was indexed so later runs can sync incrementally. Pages where
+        # some chunks failed to embed or whose content could not be fetched are
+        # left out so the next sync retries them.
+        manifest = SyncManifest()
+        manifest.clear()
+        for page_id, (last_edited_time, content_hash, chunk_count) in indexed_pages.items():
+            if page_id in notion.failed_pages:
+                logger.warning(f"Not recording page {page_id} in sync manifest: its content could not be fetched")
+                manifest.mark_failed(page_id)
+            elif embedded_counts[page_id] == chunk_count:
+                manifest.record_page(page_id, last_edited_time, content_hash, chunk_count)
+            else:
+                logger.warning(f"Not recording page {page_id} in sync manifest: some chunks failed to embed")
+                manifest.mark_failed(page_id)
+        manifest.save()
+        lexical_index.index_version = record_index_version(vector_store, manifest, target_collection)
+        lexical_index.save()
+        checkpoint.complete()
         
         return True
     except Exception as e:
         logger.error(f"Error indexing Notion content: {str(e)}")
         return False
+    finally:
+        if notion:
+            notion.close()
+
+def build_lexical_index(vector_store: VectorStore, collection_name: str = None) -> LexicalIndex:
+    """Build the BM25 index for hybrid search from the chunks stored in a collection.
+    
+    Args:
+        vector_store (VectorStore): The vector store to read from.
+        collection_name (str, optional): Physical collection to index. Defaults to
+            the live collection.
+    
+    Returns:
+        LexicalIndex: The index, not yet saved.
+    """
+    lexical_index = LexicalIndex()
+    for point in vector_store.iter_points(collection_name):
+        lexical_index.add(str(point.id), point.payload)
+    logger.info(f"Built lexical index over {len(lexical_index.doc_lengths)} chunks")
+    return lexical_index
+
+def record_index_version(vector_store, manifest, collection_name=None):
+    """Publish a new index version and the manifest's page hashes on the collection in Qdrant.
+    
+    API servers read them to invalidate cached answers, also when they don't
+    share the manifest file with the indexer.
+    
+    Args:
+        vector_store (VectorStore): The vector store.
+        manifest (SyncManifest): The saved sync manifest.
+        collection_name (Optional[str]): Physical collection. Defaults to the live collection.
+    
+    Returns:
+        str: The new index version.
+    """
+    page_versions = {page_id: entry["content_hash"] for page_id, entry in manifest.pages.items()}
+    index_version = vector_store.record_index_version(page_versions, collection_name)
+    logger.info(f"Recorded index version {index_version} for {len(page_versions)} pages")
+    return index_version
+
+def record_indexed_pages(manifest, pages, chunks_data, embedded_ids):
+    """Record indexed pages in the sync manifest.
+    
+    Pages where some chunks failed to embed are marked failed instead, so the
+    next incremental sync fetches and re-embeds them even though they are
+    older than its edited-since bound.
+    
+    Args:
+        manifest (SyncManifest): The manifest to update.
+        pages: The Notion pages that were processed.
+        chunks_data: The chunks extracted from those pages.
+        embedded_ids: IDs of the chunks that were successfully embedded and stored.
+    """
+    chunks_by_page = defaultdict(list)
+    for chunk_data in chunks_data:
+        chunks_by_page[chunk_data["page_id"]].append(chunk_data)
+    
+    for page in pages:
+        page_chunks = chunks_by_page.get(page["id"], [])
+        if any(chunk_data["id"] not in embedded_ids for chunk_data in page_chunks):
+            logger.warning(f"Not recording page {page['id']} in sync manifest: some chunks failed to embed")
+            manifest.mark_failed(page["id"])
+            continue
+        
+        title = page_chunks[0]["title"] if page_chunks else ""
+        content_hash = SyncManifest.hash_content(title, [chunk_data["chunk"] for chunk_data in page_chunks])
+        manifest.record_page(page["id"], page.get("last_edited_time"), content_hash, len(page_chunks))
+
+def sync_notion_content():
+    """Incrementally sync Notion content into the vector store.
+    
+    Only pages edited since the last sync are fetched; pages whose text is
+    unchanged are skipped, changed pages are re-embedded and replaced, and
+    pages removed from Notion are deleted from the vector store. Falls back
+    to a full index when there is no previous sync.
+    """
+    notion = None
+    try:
+        logger.info("Starting incremental Notion sync")
+        
+        notion = NotionConnector()
+        embedding_generator = EmbeddingGenerator()
+        vector_store = VectorStore(embedding_backend=embedding_generator.backend)
+        manifest = SyncManifest()
+        
+        if not manifest.pages or not vector_store.collection_exists():
+            logger.info("No previous sync found, running a full index")
+            # Release local Qdrant storage so the full index can reopen it
+            vector_store.client.close()
+            return index_notion_content()
+        
+        try:
+            vector_store.check_collection_metadata()
+        except ValueError as e:
+            # e.g. EMBEDDING_BACKEND or EMBEDDING_DIMENSIONS changed; vectors from different embeddings can't be mixed
+            logger.warning(f"Live collection doesn't match the embedding settings ({str(e)}), running a full index instead of a sync")
+            vector_store.client.close()
+            return index_notion_content()
+        
+        # Detect pages removed from the database
+        page_ids = set(notion.fetch_database_page_ids())
+        removed_ids = [page_id for page_id in manifest.pages if page_id not in page_ids]
+        
+        # Fetch pages edited since the last sync
+        logger.info(f"Fetching pages edited since {manifest.last_edited_time}")
+        pages = notion.fetch_database_content(edited_since=manifest.last_edited_time)
+        
+        # Retry pages that were never recorded, e.g. because embedding failed last time,
+        # and pages whose content could not be fetched last time
+        fetched_ids = {page["id"] for page in pages}
+        retry_ids = (page_ids - set(manifest.pages)) | (manifest.failed_pages & page_ids)
+        for page_id in retry_ids - fetched_ids:
+            pages.append(notion.fetch_page(page_id))
+        
+        logger.info(f"{len(pages)} pages to check, {len(removed_ids)} pages removed")
+        
+        chunks_data = notion.extract_text_from_pages(pages)
+        chunks_by_page = defaultdict(list)
+        for chunk_data in chunks_data:
+            chunks_by_page[chunk_data["page_id"]].append(chunk_data)
+        
+        # Pages that could not be fetched keep their indexed chunks and are retried next sync
+        failed_ids = {page["id"] for page in pages if page["id"] in notion.failed_pages}
+        for page_id in failed_ids:
+            manifest.mark_failed(page_id)
+        if failed_ids:
+            logger.warning(f"Could not fetch {len(failed_ids)} pages, keeping their indexed content and retrying them next sync")
+        
+        # Skip pages whose last_edited_time moved but whose text did not change. Pages
+        # that failed last time may be only partly indexed, so they are always replaced.
+        changed_pages = []
+        for page in pages:
+            if page["id"] in failed_ids:
+                continue
+            page_chunks = chunks_by_page.get(page["id"], [])
+            title = page_chunks[0]["title"] if page_chunks else ""
+            content_hash = SyncManifest.hash_content(title, [chunk_data["chunk"] for chunk_data in page_chunks])
+            if page["id"] not in manifest.failed_pages and manifest.is_unchanged(page["id"], content_hash):
+                manifest.record_page(page["id"], page.get("last_edited_time"), content_hash, len(page_chunks))
+            else:
+                changed_pages.append(page)
+        
+        changed_ids = {page["id"] for page in changed_pages}
+        changed_chunks = [chunk_data for chunk_data in chunks_data if chunk_data["page_id"] in changed_ids]
+        logger.info(f"{len(changed_pages)} pages changed ({len(changed_chunks)} chunks)")
+        
+        documents = embedding_generator.generate_embeddings(changed_chunks)
+        
+        # Replace the chunks of changed pages and drop removed pages
+        vector_store.delete_pages(list(changed_ids) + removed_ids)
+        # Update the lexical index in place only if it was built for the live index
+        lexical_index = LexicalIndex()
+        lexical_index.load()
+        if lexical_index.mtime is not None and lexical_index.index_version == vector_store.get_collection_metadata().get("index_version"):
+            lexical_index.remove_pages(list(changed_ids) + removed_ids)
+            vector_store.upsert_documents(
+                documents,
+                on_batch_stored=lambda points: [lexical_index.add(str(point.id), point.payload) for point in points]
+            )
+        else:
+            vector_store.upsert_documents(documents)
+            lexical_index = build_lexical_index(vector_store)
+        
+        record_indexed_pages(manifest, changed_pages, changed_chunks, {doc["id"] for doc in documents})
+        for page_id in removed_ids:
+            manifest.remove_page(page_id)
+        manifest.save()
+        lexical_index.index_version = record_index_version(vector_store, manifest)
+        lexical_index.save()
+        
+        logger.info(f"Sync complete: {len(documents)} chunks upserted, {len(removed_ids)} pages removed")
+        return True
+    except Exception as e:
+        logger.error(f"Error syncing Notion content: {str(e)}")
+        return False
+    finally:
+        if notion:
+            notion.close()
 
-def search_notion(query: str, limit: int = 5, group_by_page: bool = True):
+def search_notion(query: str, limit: int = 5, group_by_page: bool = True, mode: str = None):
     """Search for Notion content similar to the query.
     
     Args:
         query (str): The search query.
         limit (int, optional): Maximum number of results to return. Defaults to 5.
         group_by_page (bool, optional): Whether to group results by page. Defaults to True.
+        mode (str, optional): "dense" or "hybrid". Defaults to SEARCH_MODE.
     
     Returns:
         List[Dict[str, Any]]: List of search results.
     """
     try:
         search_client = NotionSearch()
-        results = search_client.search(query, limit=limit, group_by_page=group_by_page)
+        results = search_client.search(query, limit=limit, group_by_page=group_by_page, mode=mode)
         return results
     except Exception as e:
         logger.error(f"Error searching Notion: {str(e)}")
@@ -141,14 +434,19 @@ if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(description="Notion semantic search tool")
     parser.add_argument("--index", action="store_true", help="Index Notion content")
+    parser.add_argument("--incremental", action="store_true", help="With --index, only re-index pages changed since the last sync")
+    parser.add_argument("--resume", action="store_true", help="Resume the last interrupted full index from its checkpoint")
     parser.add_argument("--search", type=str, help="Search Notion content")
     parser.add_argument("--rag", type=str, help="Generate a comprehensive answer using RAG")
     parser.add_argument("--test", action="store_true", help="Run a test query")
-    parser.add_argument("--limit", type=int, default=5, help="Maximum number of search results")
+    parser.add_argument("--limit", type=int, default=5, help="Maximum number of chunks returned, also when grouped by page")
     parser.add_argument("--no-group", action="store_true", help="Don't group search results by page")
+    parser.add_argument("--mode", choices=["dense", "hybrid"], help="Search mode (defaults to SEARCH_MODE)")
     parser.add_argument("--github", action="store_true", help="Run in GitHub Actions mode")
     
     args = parser.parse_args()
+    if args.resume and args.incremental:
+        parser.error("--resume continues a full index and cannot be combined with --incremental")
     
     if args.github:
         # GitHub Actions specific run
@@ -160,12 +458,15 @@ if __name__ == "__main__":
             logger.error(f"Fatal error in GitHub Actions mode: {str(e)}")
             sys.exit(1)
             
-    if args.index:
-        index_notion_content()
+    if args.index or args.resume:
+        if args.incremental:
+            sync_notion_content()
+        else:
+            index_notion_content(resume=args.resume)
     
     if args.search:
         group_by_page = not args.no_group
-        results = search_notion(args.search, args.limit, group_by_page)
+        results = search_notion(args.search, args.limit, group_by_page, args.mode)
         display_search_results(results, args.search)
     
     if args.rag:
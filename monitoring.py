@@ -45,4 +45,104 @@ def setup_logging(log_to_file=False, log_level=logging.INFO):
         file_handler.setFormatter(formatter)
         logger.addHandler(file_handler)
     
-    return logging.getLogger(__name__)
\ No newline at end of file
+    return logging.getLogger(__name__)
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+    )
+except ImportError:
+    Counter = Histogram = None
+
+
+class NoopMetric:
+    """Stand-in for a Prometheus metric when prometheus-client is not installed."""
+
+    def labels(self, *args, **kwargs) -> "NoopMetric":
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def observe(self, amount: float):
+        pass
+
+    def time(self) -> "NoopMetric":
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def histogram(name, documentation, labelnames=(), buckets=None):
+    if Histogram is None:
+        return NoopMetric()
+    if buckets is None:
+        return Histogram(name, documentation, labelnames)
+    return Histogram(name, documentation, labelnames, buckets=buckets)
+
+
+def counter(name, documentation, labelnames=()):
+    if Counter is None:
+        return NoopMetric()
+    return Counter(name, documentation, labelnames)
+
+
+# Latency of each stage, so a slow request can be attributed to the stage at fault
+EMBEDDING_LATENCY = histogram(
+    "notion_embedding_request_seconds",
+    "Latency of OpenAI embedding requests",
+    ["source"]  # index or query
+)
+QDRANT_LATENCY = histogram(
+    "notion_qdrant_request_seconds",
+    "Latency of Qdrant requests",
+    ["operation"]
+)
+LLM_LATENCY = histogram(
+    "notion_llm_request_seconds",
+    "Latency of chat completions, until the last token for streamed answers",
+    ["stream"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+)
+REQUEST_LATENCY = histogram(
+    "notion_http_request_seconds",
+    "Latency of API requests",
+    ["endpoint", "method", "status"]
+)
+
+NOTION_API_CALLS = counter("notion_api_calls_total", "Notion API calls, including retried attempts", ["operation", "status"])
+RETRIES = counter("notion_retries_total", "Retried calls to external services", ["service"])
+CACHE_LOOKUPS = counter("notion_cache_lookups_total", "Cache lookups", ["cache", "result"])
+CHUNKS_EMBEDDED = counter("notion_chunks_embedded_total", "Chunks embedded for indexing", ["source"])  # api or cache
+CHUNKS_UPSERTED = counter("notion_chunks_upserted_total", "Chunks upserted into Qdrant")
+
+
+def record_cache_lookup(cache: str, hits: int, misses: int):
+    """Count cache hits and misses."""
+    if hits:
+        CACHE_LOOKUPS.labels(cache=cache, result="hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache=cache, result="miss").inc(misses)
+
+
+def render_metrics():
+    """Render every metric in the Prometheus text format.
+
+    With PROMETHEUS_MULTIPROC_DIR set (e.g. for gunicorn workers), the metrics
+    of all worker processes are aggregated.
+
+    Returns:
+        Tuple[bytes, str]: The response body and its content type.
+    """
+    if Counter is None:
+        return b"# prometheus-client is not installed\n", "text/plain; charset=utf-8"
+
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
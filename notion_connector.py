@@ -1,9 +1,16 @@
 import os
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Any, Iterable, Iterator, Set
 from dotenv import load_dotenv
 from notion_client import Client
-from notion_client.errors import APIResponseError
+from notion_client.errors import APIResponseError, HTTPResponseError, RequestTimeoutError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from rate_limiter import TokenBucket
+from chunker import create_chunker
+from block_extractor import extract_blocks
+from monitoring import NOTION_API_CALLS, RETRIES
 import logging
+import json
 import re
 import time
 import random
@@ -30,32 +37,101 @@ class NotionConnector:
         if not self.database_id:
             raise ValueError("Notion database ID not found in environment variables")
         
-        self.client = Client(auth=self.api_key)
+        # NOTION_BASE_URL points the client at a proxy or a local stub (see evals/load_test.py)
+        self.client = Client(auth=self.api_key, base_url=os.getenv("NOTION_BASE_URL", "https://api.notion.com"))
+        
+        # Notion allows an average of ~3 requests/s per integration; the limiter is
+        # shared by every fetch worker so concurrency never exceeds that budget.
+        rate_limit = float(os.getenv("NOTION_RATE_LIMIT", "3"))
+        self.rate_limiter = TokenBucket(rate=rate_limit)
+        self.max_workers = int(os.getenv("NOTION_FETCH_WORKERS", "4"))
+        
+        # Nested blocks are fetched on a separate pool shared by all pages
+        self.max_block_depth = int(os.getenv("NOTION_MAX_BLOCK_DEPTH", "10"))
+        self.block_executor = ThreadPoolExecutor(max_workers=int(os.getenv("NOTION_BLOCK_WORKERS", "4")))
+        self.chunker = create_chunker()
+        self.fetch_stats: Dict[str, Dict[str, Any]] = {}
+        # Pages whose content could not be fetched; callers must not treat them as empty
+        self.failed_pages: Set[str] = set()
+    
+    def close(self):
+        """Shut down the block fetch pool. The connector can't fetch page content afterwards."""
+        self.block_executor.shutdown(wait=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @staticmethod
+    def get_retry_after(error: Exception) -> Optional[float]:
+        """Return the Retry-After delay in seconds for a rate-limited response, if any."""
+        if not isinstance(error, HTTPResponseError) or error.status != 429:
+            return None
+        
+        try:
+            return float(error.headers.get("Retry-After", 1))
+        except (TypeError, ValueError):
+            return 1.0
     
     def with_retry(self, operation, max_retries=3, *args, **kwargs):
-        """Execute an operation with retry logic."""
+        """Execute an operation with rate limiting and retry logic.
+        
+        Rate-limited (429) responses wait for the server's Retry-After delay and
+        pause all workers sharing the limiter; other errors use exponential backoff.
+        """
+        operation_name = getattr(operation, "__qualname__", "unknown")
         for attempt in range(max_retries):
+            self.rate_limiter.acquire()
             try:
-                return operation(*args, **kwargs)
+                result = operation(*args, **kwargs)
+                NOTION_API_CALLS.labels(operation=operation_name, status="ok").inc()
+                return result
             except Exception as e:
+                NOTION_API_CALLS.labels(operation=operation_name, status="error").inc()
                 if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) + random.random()  # Exponential backoff with jitter
-                    logger.warning(f"Operation failed, retrying in {wait_time:.2f}s: {str(e)}")
-                    time.sleep(wait_time)
+                    RETRIES.labels(service="notion").inc()
+                    retry_after = self.get_retry_after(e)
+                    if retry_after is not None:
+                        self.rate_limiter.pause(retry_after)
+                        logger.warning(f"Rate limited by Notion, retrying after {retry_after:.2f}s")
+                    else:
+                        wait_time = (2 ** attempt) + random.random()  # Exponential backoff with jitter
+                        logger.warning(f"Operation failed, retrying in {wait_time:.2f}s: {str(e)}")
+                        time.sleep(wait_time)
                 else:
                     logger.error(f"All operation attempts failed: {str(e)}")
                     raise
     
-    def fetch_database_content(self) -> List[dict]:
+    def fetch_database_content(self, edited_since: Optional[str] = None) -> List[dict]:
         """Fetch all pages from the specified Notion database.
         
+        Args:
+            edited_since (Optional[str]): ISO 8601 timestamp. When given, only pages whose
+                last_edited_time is on or after it are returned.
+        
         Returns:
             List[dict]: List of pages from the Notion database.
             
         Raises:
             APIResponseError: If there's an error communicating with the Notion API.
         """
-        results = []
+        return list(self.iter_database_content(edited_since))
+    
+    def iter_database_content(self, edited_since: Optional[str] = None) -> Iterator[dict]:
+        """Lazily fetch pages from the specified Notion database, one result page at a time.
+        
+        Args:
+            edited_since (Optional[str]): ISO 8601 timestamp. When given, only pages whose
+                last_edited_time is on or after it are returned.
+        
+        Yields:
+            dict: Pages from the Notion database.
+            
+        Raises:
+            APIResponseError: If there's an error communicating with the Notion API.
+        """
         has_more = True
         next_cursor = None
         
@@ -63,52 +139,212 @@ class NotionConnector:
             query_params = {"database_id": self.database_id}
             if next_cursor:
                 query_params["start_cursor"] = next_cursor
+            if edited_since:
+                query_params["filter"] = {
+                    "timestamp": "last_edited_time",
+                    "last_edited_time": {"on_or_after": edited_since}
+                }
             
             try:
                 response = self.with_retry(self.client.databases.query, 3, **query_params)
-                results.extend(response["results"])
                 has_more = response["has_more"]
                 next_cursor = response.get("next_cursor")
                 logger.info(f"Fetched {len(response['results'])} pages from Notion")
             except APIResponseError as e:
                 logger.error(f"Error fetching Notion data: {str(e)}")
                 raise
+            
+            yield from response["results"]
+    
+    def fetch_database_page_ids(self) -> List[str]:
+        """Fetch the IDs of all pages currently in the Notion database.
+        
+        Only the title property is requested, so this is much cheaper than
+        fetch_database_content() and is used to detect deleted pages.
         
-        return results
+        Returns:
+            List[str]: IDs of all pages in the database.
+            
+        Raises:
+            APIResponseError: If there's an error communicating with the Notion API.
+        """
+        page_ids = []
+        has_more = True
+        next_cursor = None
+        
+        while has_more:
+            query_params = {
+                "database_id": self.database_id,
+                "filter_properties": ["title"],
+                "page_size": 100
+            }
+            if next_cursor:
+                query_params["start_cursor"] = next_cursor
+            
+            try:
+                response = self.with_retry(self.client.databases.query, 3, **query_params)
+                page_ids.extend(page["id"] for page in response["results"])
+                has_more = response["has_more"]
+                next_cursor = response.get("next_cursor")
+            except APIResponseError as e:
+                logger.error(f"Error listing Notion pages: {str(e)}")
+                raise
+        
+        logger.info(f"Listed {len(page_ids)} page IDs from Notion")
+        return page_ids
     
-    def fetch_page_content(self, page_id: str) -> List[Dict[str, Any]]:
-        """Fetch all blocks (content) from a Notion page.
+    def fetch_page(self, page_id: str) -> dict:
+        """Fetch a single page object (properties only, no blocks).
         
         Args:
             page_id (str): The ID of the Notion page.
             
         Returns:
-            List[Dict[str, Any]]: List of blocks from the Notion page.
+            dict: The Notion page object.
+        """
+        return self.with_retry(self.client.pages.retrieve, 3, page_id)
+    
+    def list_block_children(self, block_id: str) -> Tuple[List[Dict[str, Any]], int, int]:
+        """List the direct children of a block or page, following pagination.
+        
+        Args:
+            block_id (str): The ID of the block or page.
             
-        Raises:
-            APIResponseError: If there's an error communicating with the Notion API.
+        Returns:
+            Tuple[List[Dict[str, Any]], int, int]: The child blocks, the number of API
+                calls made and the approximate size of the responses in bytes.
+        """
+        children = []
+        api_calls = 0
+        response_bytes = 0
+        has_more = True
+        next_cursor = None
+        
+        while has_more:
+            query_params = {}
+            if next_cursor:
+                query_params["start_cursor"] = next_cursor
+            
+            response = self.with_retry(self.client.blocks.children.list, 3, block_id, **query_params)
+            api_calls += 1
+            response_bytes += len(json.dumps(response))
+            children.extend(response["results"])
+            has_more = response["has_more"]
+            next_cursor = response.get("next_cursor")
+        
+        return children, api_calls, response_bytes
+    
+    @staticmethod
+    def get_children_source(block: Dict[str, Any]) -> Optional[str]:
+        """Return the block ID whose children should be fetched, or None to not descend.
+        
+        Child pages and databases are indexed as pages of their own, and synced block
+        duplicates hold their content under the original block.
         """
+        if not block.get("has_children"):
+            return None
+        
+        block_type = block.get("type")
+        if block_type in ("child_page", "child_database"):
+            return None
+        
+        if block_type == "synced_block":
+            synced_from = block.get("synced_block", {}).get("synced_from")
+            if synced_from and synced_from.get("block_id"):
+                return synced_from["block_id"]
+        
+        return block["id"]
+    
+    def fetch_page_content(self, page_id: str) -> List[Dict[str, Any]]:
+        """Fetch all blocks (content) from a Notion page, including nested blocks.
+        
+        The block tree is walked one level at a time, fetching the children of all
+        blocks on a level in parallel on the shared block executor, down to
+        NOTION_MAX_BLOCK_DEPTH levels. Fetch stats for the page are logged and kept
+        in self.fetch_stats.
+        
+        If the page can't be fetched it is added to self.failed_pages and an
+        empty list is returned, so callers must check failed_pages before
+        treating the page as empty. If only the children of some blocks can't
+        be fetched, those subtrees are skipped (and counted in the page's
+        "failed_subtrees" stat) and the rest of the page is returned, but the
+        page is still added to failed_pages so a later sync fetches it whole.
+        
+        Args:
+            page_id (str): The ID of the Notion page.
+            
+        Returns:
+            List[Dict[str, Any]]: List of blocks from the Notion page, flattened in
+                document order (each parent is followed by its descendants).
+        """
+        start_time = time.time()
+        stats = {"api_calls": 0, "bytes": 0, "blocks": 0, "depth": 1, "wall_time": 0.0, "failed_subtrees": 0}
+        
+        def fetch_children(block):
+            try:
+                return self.list_block_children(self.get_children_source(block))
+            except (APIResponseError, HTTPResponseError, RequestTimeoutError) as e:
+                logger.error(f"Error fetching children of block {block['id']} on page {page_id}, skipping them: {str(e)}")
+                return None
+        
         try:
-            all_blocks = []
-            has_more = True
-            next_cursor = None
+            top_level, api_calls, response_bytes = self.list_block_children(page_id)
+            stats["api_calls"] += api_calls
+            stats["bytes"] += response_bytes
             
-            while has_more:
-                query_params = {}
-                if next_cursor:
-                    query_params["start_cursor"] = next_cursor
-                
-                response = self.with_retry(self.client.blocks.children.list, 3, page_id, **query_params)
-                all_blocks.extend(response["results"])
-                has_more = response["has_more"]
-                next_cursor = response.get("next_cursor")
+            children = {}
+            level = top_level
+            
+            while level:
+                parents = [block for block in level if self.get_children_source(block)]
+                if not parents:
+                    break
+                if stats["depth"] >= self.max_block_depth:
+                    logger.warning(f"Reached max block depth {self.max_block_depth} on page {page_id}, not descending further")
+                    break
                 
-            logger.info(f"Fetched {len(all_blocks)} blocks from page {page_id}")
-            return all_blocks
+                # Only this thread waits on the executor, so a bounded pool can't deadlock
+                level = []
+                for block, result in zip(parents, self.block_executor.map(fetch_children, parents)):
+                    if result is None:
+                        stats["failed_subtrees"] += 1
+                        continue
+                    block_children, api_calls, response_bytes = result
+                    children[block["id"]] = block_children
+                    stats["api_calls"] += api_calls
+                    stats["bytes"] += response_bytes
+                    level.extend(block_children)
+                stats["depth"] += 1
             
-        except APIResponseError as e:
-            logger.error(f"Error fetching page content for {page_id}: {str(e)}")
+        except (APIResponseError, HTTPResponseError, RequestTimeoutError) as e:
+            logger.error(f"Error fetching page content for {page_id}, marking it as failed: {str(e)}")
+            self.failed_pages.add(page_id)
             return []
+        
+        if stats["failed_subtrees"]:
+            self.failed_pages.add(page_id)
+        else:
+            self.failed_pages.discard(page_id)
+        
+        # Flatten the tree in document order
+        all_blocks = []
+        stack = list(reversed(top_level))
+        while stack:
+            block = stack.pop()
+            all_blocks.append(block)
+            stack.extend(reversed(children.get(block["id"], [])))
+        
+        stats["blocks"] = len(all_blocks)
+        stats["wall_time"] = time.time() - start_time
+        self.fetch_stats[page_id] = stats
+        
+        logger.info(
+            f"Fetched {stats['blocks']} blocks from page {page_id} "
+            f"(depth {stats['depth']}, {stats['api_calls']} API calls, "
+            f"{stats['bytes']} bytes, {stats['wall_time']:.2f}s"
+            + (f", {stats['failed_subtrees']} subtrees failed)" if stats["failed_subtrees"] else ")")
+        )
+        return all_blocks
     
     def extract_text_from_blocks(self, blocks: List[Dict[str, Any]]) -> str:
         """Extract text content from Notion blocks.
@@ -117,116 +353,59 @@ class NotionConnector:
             blocks (List[Dict[str, Any]]): List of Notion blocks.
             
         Returns:
-            str: Concatenated text content from all blocks.
+            str: Concatenated text content from all blocks, one line per block.
         """
-        content = []
-        
-        for block in blocks:
-            block_type = block.get("type")
-            
-            if block_type == "paragraph":
-                try:
-                    text_items = block.get("paragraph", {}).get("rich_text", [])
-                    if text_items:
-                        for text_item in text_items:
-                            content.append(text_item.get("plain_text", ""))
-                except Exception as e:
-                    logger.warning(f"Error extracting paragraph text: {str(e)}")
-                    
-            elif block_type == "heading_1":
-                try:
-                    text_items = block.get("heading_1", {}).get("rich_text", [])
-                    if text_items:
-                        heading_text = " ".join([item.get("plain_text", "") for item in text_items])
-                        content.append(f"# {heading_text}")
-                except Exception as e:
-                    logger.warning(f"Error extracting heading_1 text: {str(e)}")
-                    
-            elif block_type == "heading_2":
-                try:
-                    text_items = block.get("heading_2", {}).get("rich_text", [])
-                    if text_items:
-                        heading_text = " ".join([item.get("plain_text", "") for item in text_items])
-                        content.append(f"## {heading_text}")
-                except Exception as e:
-                    logger.warning(f"Error extracting heading_2 text: {str(e)}")
-                    
-            elif block_type == "heading_3":
-                try:
-                    text_items = block.get("heading_3", {}).get("rich_text", [])
-                    if text_items:
-                        heading_text = " ".join([item.get("plain_text", "") for item in text_items])
-                        content.append(f"### {heading_text}")
-                except Exception as e:
-                    logger.warning(f"Error extracting heading_3 text: {str(e)}")
-                    
-            elif block_type == "bulleted_list_item" or block_type == "numbered_list_item":
-                try:
-                    text_items = block.get(block_type, {}).get("rich_text", [])
-                    if text_items:
-                        item_text = " ".join([item.get("plain_text", "") for item in text_items])
-                        content.append(f"• {item_text}")
-                except Exception as e:
-                    logger.warning(f"Error extracting list item text: {str(e)}")
-                    
-            # Add more block types as needed
-            
-        return "\n".join(content)
+        text, _ = extract_blocks(blocks)
+        return text
     
-    def split_into_chunks(self, text: str, chunk_size: int = 2048, overlap: int = 128) -> List[str]:
-        """Split text into overlapping chunks.
+    def extract_page_chunks(self, idx: int, page: dict) -> List[Dict[str, Any]]:
+        """Fetch a single page's content and split it into chunks.
+        
+        Per-type block extraction counts are kept in self.fetch_stats[page_id]["block_types"].
         
         Args:
-            text (str): Text to split.
-            chunk_size (int): Maximum size of each chunk.
-            overlap (int): Overlap between chunks.
+            idx (int): Position of the page in the list being processed.
+            page (dict): The Notion page.
             
         Returns:
-            List[str]: List of text chunks.
+            List[Dict[str, Any]]: The page's chunks, or an empty list if the page has no title.
         """
-        if not text:
+        try:
+            # Extract title
+            title = page["properties"]["Name"]["title"][0]["text"]["content"]
+            page_id = page["id"]
+        except (KeyError, IndexError) as e:
+            logger.warning(f"Skipping page {idx} due to missing title: {str(e)}")
             return []
-            
-        # Split by paragraphs to maintain semantic meaning
-        paragraphs = text.split("\n")
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for paragraph in paragraphs:
-            # Skip empty paragraphs
-            if not paragraph.strip():
-                continue
-                
-            paragraph_size = len(paragraph)
-            
-            # If adding this paragraph would exceed chunk size, finalize the current chunk
-            if current_size + paragraph_size > chunk_size and current_chunk:
-                chunks.append("\n".join(current_chunk))
-                
-                # Keep some of the last paragraphs for overlap
-                overlap_size = 0
-                overlap_paragraphs = []
-                
-                for p in reversed(current_chunk):
-                    if overlap_size + len(p) <= overlap:
-                        overlap_paragraphs.insert(0, p)
-                        overlap_size += len(p)
-                    else:
-                        break
-                
-                current_chunk = overlap_paragraphs
-                current_size = overlap_size
-            
-            # Add the paragraph to the current chunk
-            current_chunk.append(paragraph)
-            current_size += paragraph_size
         
-        # Add the last chunk if it's not empty
-        if current_chunk:
-            chunks.append("\n".join(current_chunk))
+        # Fetch and extract content
+        blocks = self.fetch_page_content(page_id)
+        content, block_counts = extract_blocks(blocks)
+        self.fetch_stats.setdefault(page_id, {})["block_types"] = block_counts
+        if block_counts["failed"]:
+            logger.warning(f"Could not extract some blocks of page {page_id}: {block_counts['failed']}")
+        
+        # Split content into chunks along its headings
+        content_chunks = self.chunker.chunk(content)
         
-        return chunks
+        # Add each chunk as a separate item, but with reference to the original page
+        chunks_data = []
+        for chunk_idx, chunk in enumerate(content_chunks):
+            chunk_data = {
+                # Keyed on the page ID so ids stay stable across incremental syncs
+                "id": f"{page_id}-{chunk_idx}",
+                "page_idx": idx,
+                "page_id": page_id,
+                "title": title,
+                "chunk_idx": chunk_idx,
+                "chunk": chunk["text"],
+                "heading_path": chunk["heading_path"],
+                "total_chunks": len(content_chunks)
+            }
+            chunks_data.append(chunk_data)
+        
+        logger.info(f"Processed page {idx}: {title} into {len(content_chunks)} chunks")
+        return chunks_data
     
     def extract_text_from_pages(self, pages: List[dict]) -> List[Dict[str, Any]]:
         """Extract title and content text from Notion pages and split into chunks.
@@ -237,36 +416,30 @@ class NotionConnector:
         Returns:
             List[Dict[str, Any]]: List of dictionaries containing page info and content chunks.
         """
-        chunks_data = []
+        return [chunk_data for _, page_chunks in self.iter_page_chunks(pages) for chunk_data in page_chunks]
+    
+    def iter_page_chunks(self, pages: Iterable[dict]) -> Iterator[Tuple[dict, List[Dict[str, Any]]]]:
+        """Lazily fetch and chunk pages, several at a time.
         
-        for idx, page in enumerate(pages):
-            try:
-                # Extract title
-                title = page["properties"]["Name"]["title"][0]["text"]["content"]
-                page_id = page["id"]
-                
-                # Fetch and extract content
-                blocks = self.fetch_page_content(page_id)
-                content = self.extract_text_from_blocks(blocks)
-                
-                # Split content into chunks
-                content_chunks = self.split_into_chunks(content)
-                
-                # Add each chunk as a separate item, but with reference to the original page
-                for chunk_idx, chunk in enumerate(content_chunks):
-                    chunk_data = {
-                        "id": f"{idx}-{chunk_idx}",
-                        "page_idx": idx,
-                        "page_id": page_id,
-                        "title": title,
-                        "chunk_idx": chunk_idx,
-                        "chunk": chunk,
-                        "total_chunks": len(content_chunks)
-                    }
-                    chunks_data.append(chunk_data)
-                
-                logger.info(f"Processed page {idx}: {title} into {len(content_chunks)} chunks")
-            except (KeyError, IndexError) as e:
-                logger.warning(f"Skipping page {idx} due to missing title: {str(e)}")
+        Up to max_workers pages are fetched concurrently, with a bounded window of
+        pending pages. Results come back in page order, so chunk output is
+        deterministic regardless of which fetch finishes first.
         
-        return chunks_data
\ No newline at end of file
+        Args:
+            pages (Iterable[dict]): Notion pages; consumed lazily.
+            
+        Yields:
+            Tuple[dict, List[Dict[str, Any]]]: Each page with its chunks.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = deque()
+            
+            for idx, page in enumerate(pages):
+                in_flight.append((page, executor.submit(self.extract_page_chunks, idx, page)))
+                if len(in_flight) >= self.max_workers * 2:
+                    page, future = in_flight.popleft()
+                    yield page, future.result()
+            
+            while in_flight:
+                page, future = in_flight.popleft()
+                yield page, future.result()
\ No newline at end of file
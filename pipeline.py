@@ -0,0 +1,206 @@
+import os
+import time
+import queue
+import logging
+import threading
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+_END = object()
+
+
+class PipelineAborted(Exception):
+    """Raised inside a stage when another stage of the pipeline has failed."""
+
+
+class Channel:
+    """Bounded queue between two pipeline stages that records depth and backpressure stats."""
+
+    def __init__(self, name: str, maxsize: int, stop_event: threading.Event):
+        self.name = name
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stop_event = stop_event
+        self.items = 0
+        self.max_depth = 0
+        self.depth_total = 0
+        self.put_blocked = 0.0  # Time the producer waited on a full queue (backpressure)
+        self.get_waited = 0.0  # Time the consumer waited on an empty queue (starvation)
+
+    def put(self, item):
+        start_time = time.time()
+        while True:
+            if self.stop_event.is_set():
+                raise PipelineAborted(f"Pipeline stopped while writing to {self.name}")
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.put_blocked += time.time() - start_time
+
+        if item is not _END:
+            depth = self.queue.qsize()
+            self.items += 1
+            self.depth_total += depth
+            self.max_depth = max(self.max_depth, depth)
+
+    def close(self):
+        self.put(_END)
+
+    def __iter__(self):
+        while True:
+            start_time = time.time()
+            while True:
+                if self.stop_event.is_set():
+                    raise PipelineAborted(f"Pipeline stopped while reading from {self.name}")
+                try:
+                    item = self.queue.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    continue
+            self.get_waited += time.time() - start_time
+
+            if item is _END:
+                return
+            yield item
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "avg_depth": round(self.depth_total / self.items, 1) if self.items else 0.0,
+            "producer_blocked_seconds": round(self.put_blocked, 2),
+            "consumer_waited_seconds": round(self.get_waited, 2)
+        }
+
+
+class Pipeline:
+    """Run generator stages concurrently, connected by bounded queues.
+
+    The first stage takes no arguments and returns an iterable; each middle
+    stage maps an iterable to an iterable; the last stage consumes an iterable
+    and its return value is the pipeline's result. Every stage but the last
+    runs on its own thread, and a full queue blocks its producer, so memory
+    stays bounded by the queue sizes regardless of input size.
+    """
+
+    def __init__(self, name: str, queue_size: Optional[int] = None, log_interval: Optional[float] = None):
+        """Initialize the pipeline.
+
+        Args:
+            name (str): Name used in log messages.
+            queue_size (int, optional): Capacity of each queue. Defaults to
+                PIPELINE_QUEUE_SIZE (256).
+            log_interval (float, optional): Seconds between progress logs. Defaults
+                to PIPELINE_LOG_INTERVAL (10).
+        """
+        self.name = name
+        self.queue_size = queue_size or int(os.getenv("PIPELINE_QUEUE_SIZE", "256"))
+        self.log_interval = log_interval or float(os.getenv("PIPELINE_LOG_INTERVAL", "10"))
+        self.stop_event = threading.Event()
+        self.channels: List[Channel] = []
+        self.stage_names: List[str] = []
+        self.errors: List[BaseException] = []
+        self.start_time = 0.0
+
+    def _run_stage(self, name: str, fn: Callable, source, output: Channel):
+        try:
+            items = fn() if source is None else fn(source)
+            for item in items:
+                output.put(item)
+            output.close()
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            logger.error(f"Pipeline stage {name} failed: {str(e)}")
+            self.errors.append(e)
+            self.stop_event.set()
+
+    def _report(self):
+        while not self.stop_event.wait(self.log_interval):
+            self.log_stats()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return per-stage throughput and queue stats."""
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        stats = {}
+        for name, channel in zip(self.stage_names, self.channels):
+            channel_stats = channel.get_stats()
+            channel_stats["items_per_sec"] = round(channel.items / elapsed, 1)
+            stats[name] = channel_stats
+        return stats
+
+    def log_stats(self):
+        for name, stats in self.get_stats().items():
+            logger.info(
+                f"[{self.name}] {name}: {stats['items']} items ({stats['items_per_sec']}/s), "
+                f"queue depth {stats['depth']} (max {stats['max_depth']}, avg {stats['avg_depth']}), "
+                f"producer blocked {stats['producer_blocked_seconds']}s, "
+                f"consumer waited {stats['consumer_waited_seconds']}s"
+            )
+
+    def run(self, stages: List[Tuple[str, Callable]]):
+        """Run the stages to completion.
+
+        Args:
+            stages (List[Tuple[str, Callable]]): (name, function) pairs, see the class docstring.
+
+        Returns:
+            The return value of the last stage.
+
+        Raises:
+            Exception: The first error raised by any stage.
+        """
+        if len(stages) < 2:
+            raise ValueError("A pipeline needs at least a source and a sink stage")
+
+        self.start_time = time.time()
+        threads = []
+        source = None
+
+        for name, fn in stages[:-1]:
+            channel = Channel(name, self.queue_size, self.stop_event)
+            thread = threading.Thread(
+                target=self._run_stage,
+                args=(name, fn, source, channel),
+                name=f"{self.name}-{name}",
+                daemon=True
+            )
+            self.channels.append(channel)
+            self.stage_names.append(name)
+            threads.append(thread)
+            source = channel
+
+        reporter = threading.Thread(target=self._report, name=f"{self.name}-stats", daemon=True)
+
+        for thread in threads:
+            thread.start()
+        reporter.start()
+
+        sink_name, sink = stages[-1]
+        result = None
+        try:
+            result = sink(source)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            logger.error(f"Pipeline stage {sink_name} failed: {str(e)}")
+            self.errors.append(e)
+        finally:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+            reporter.join()
+
+        self.log_stats()
+        logger.info(f"[{self.name}] finished in {time.time() - self.start_time:.2f}s")
+
+        if self.errors:
+            raise self.errors[0]
+        return result
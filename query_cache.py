@@ -0,0 +1,202 @@
+import os
+import re
+import time
+import logging
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from dotenv import load_dotenv
+from embedding_cache import EmbeddingCache
+from monitoring import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a per-entry time to live."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        """Initialize the cache.
+
+        Args:
+            max_entries (int): Maximum number of entries before the least recently used is evicted.
+            ttl (float): Seconds an entry stays valid. 0 disables expiry.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        key = (model, query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            stored_at, embedding = entry
+            if self.ttl and time.time() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return embedding
+
+    def set(self, model: str, query: str, embedding: List[float]):
+        key = (model, query)
+        with self.lock:
+            self.entries[key] = (time.time(), embedding)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class SQLiteCacheBackend:
+    """On-disk backend shared by every worker process on the host.
+
+    Backed by EmbeddingCache, so it is content-addressed and LRU-evicted by size.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size_mb: float = 64):
+        self.cache = EmbeddingCache(path=path, max_size_mb=max_size_mb)
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        return self.cache.get_many(model, [query]).get(0)
+
+    def set(self, model: str, query: str, embedding: List[float]):
+        self.cache.put_many(model, [query], [embedding])
+
+
+class QueryEmbeddingCache:
+    """Cache of normalized query -> embedding for NotionSearch.
+
+    Lookups go to an in-process LRU/TTL cache first and then to an optional
+    shared backend (e.g. SQLiteCacheBackend), which is back-filled on misses.
+    """
+
+    def __init__(self, memory: MemoryCacheBackend, shared_backend=None):
+        """Initialize the cache.
+
+        Args:
+            memory (MemoryCacheBackend): The in-process cache.
+            shared_backend: Optional backend with get(model, query) and
+                set(model, query, embedding) methods, shared across processes.
+        """
+        self.memory = memory
+        self.shared_backend = shared_backend
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self.avg_miss_latency = 0.0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Normalize a query so trivially different spellings share an entry."""
+        query = unicodedata.normalize("NFKC", query).lower()
+        return re.sub(r"\s+", " ", query).strip()
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        """Look up the embedding of a query.
+
+        Args:
+            model (str): The embedding model name.
+            query (str): The raw search query.
+
+        Returns:
+            Optional[List[float]]: The cached embedding, or None on a miss.
+        """
+        key = self.normalize_query(query)
+        embedding = self.memory.get(model, key)
+
+        if embedding is None and self.shared_backend is not None:
+            try:
+                embedding = self.shared_backend.get(model, key)
+            except Exception as e:
+                logger.warning(f"Shared query cache lookup failed: {str(e)}")
+                embedding = None
+            if embedding is not None:
+                self.memory.set(model, key, embedding)
+
+        with self.lock:
+            if embedding is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.latency_saved += self.avg_miss_latency
+        record_cache_lookup("query_embedding", int(embedding is not None), int(embedding is None))
+
+        return embedding
+
+    def put(self, model: str, query: str, embedding: List[float], latency: float):
+        """Store the embedding of a query.
+
+        Args:
+            model (str): The embedding model name.
+            query (str): The raw search query.
+            embedding (List[float]): The query embedding.
+            latency (float): Seconds the embedding API call took, used to estimate
+                the latency saved by later hits.
+        """
+        key = self.normalize_query(query)
+        self.memory.set(model, key, embedding)
+
+        if self.shared_backend is not None:
+            try:
+                self.shared_backend.set(model, key, embedding)
+            except Exception as e:
+                logger.warning(f"Shared query cache write failed: {str(e)}")
+
+        with self.lock:
+            # Exponential moving average of the cost of a miss
+            if self.avg_miss_latency:
+                self.avg_miss_latency = 0.9 * self.avg_miss_latency + 0.1 * latency
+            else:
+                self.avg_miss_latency = latency
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the estimated latency saved."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "latency_saved_seconds": round(self.latency_saved, 3),
+            "avg_miss_latency_seconds": round(self.avg_miss_latency, 3)
+        }
+
+
+_default_query_cache = None
+_default_query_cache_lock = threading.Lock()
+
+
+def get_default_query_cache() -> QueryEmbeddingCache:
+    """Return the process-wide query cache, configured from environment variables.
+
+    QUERY_CACHE_SIZE and QUERY_CACHE_TTL size the in-process cache; setting
+    QUERY_CACHE_BACKEND=sqlite adds a shared on-disk store at QUERY_CACHE_PATH.
+    """
+    global _default_query_cache
+
+    with _default_query_cache_lock:
+        if _default_query_cache is None:
+            memory = MemoryCacheBackend(
+                max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+                ttl=float(os.getenv("QUERY_CACHE_TTL", "3600"))
+            )
+
+            shared_backend = None
+            if os.getenv("QUERY_CACHE_BACKEND", "memory").lower() == "sqlite":
+                path = os.getenv("QUERY_CACHE_PATH") or os.path.join(
+                    tempfile.gettempdir(), "notion_query_cache.sqlite"
+                )
+                shared_backend = SQLiteCacheBackend(path=path)
+
+            _default_query_cache = QueryEmbeddingCache(memory, shared_backend)
+
+        return _default_query_cache
@@ -1,10 +1,14 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 import logging
-from openai import OpenAI
+import asyncio
+from openai import OpenAI, AsyncOpenAI
 import os
 import httpx
 from dotenv import load_dotenv
-from search import NotionSearch
+from search import NotionSearch, AsyncNotionSearch
+from context_packer import ContextPacker, get_context_budget
+from answer_cache import SemanticAnswerCache, get_default_answer_cache
+from monitoring import LLM_LATENCY, RETRIES
 import time
 import random
 
@@ -13,21 +17,40 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 class RAGProcessor:
-    def __init__(self):
-        """Initialize the RAG processor."""
-        self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not self.openai_api_key:
-            raise ValueError("OpenAI API key not found in environment variables")
+    system_prompt = "You are a knowledgeable assistant that provides comprehensive answers based on the given context."
+    
+    def __init__(
+        self,
+        search_client: Optional[NotionSearch] = None,
+        openai_client: Optional[OpenAI] = None,
+        answer_cache: Optional[SemanticAnswerCache] = None
+    ):
+        """Initialize the RAG processor.
         
-        http_client = httpx.Client()
-        self.client = OpenAI(
-            api_key=self.openai_api_key,
-            http_client=http_client
-        )
+        Args:
+            search_client (Optional[NotionSearch]): Shared search client. One is created if not given.
+            openai_client (Optional[OpenAI]): Shared OpenAI client. One is created if not given.
+            answer_cache (Optional[SemanticAnswerCache]): Cache of answers to similar queries.
+                Defaults to the process-wide cache (disabled with ANSWER_CACHE_SIZE=0).
+        """
+        if openai_client is None:
+            self.openai_api_key = os.getenv("OPENAI_API_KEY")
+            if not self.openai_api_key:
+                raise ValueError("OpenAI API key not found in environment variables")
+            
+            http_client = httpx.Client()
+            openai_client = OpenAI(
+                api_key=self.openai_api_key,
+                http_client=http_client
+            )
+        self.client = openai_client
 
-        self.search_client = NotionSearch()
+        self.search_client = search_client or NotionSearch(openai_client=self.client)
         self.model = "gpt-3.5-turbo"  # Changed from gpt-4o-mini which appears to be a typo
         self.max_tokens = 4096  # Adjust based on your model
+        self.max_answer_tokens = 1000
+        self.context_packer = ContextPacker(self.model)
+        self.answer_cache = answer_cache or get_default_answer_cache()
     
     def retrieve_documents(self, query: str, limit: int = 15) -> List[Dict[str, Any]]:
         """Retrieve relevant document chunks based on the query.
@@ -45,6 +68,9 @@ class RAGProcessor:
     def construct_prompt(self, query: str, chunks: List[Dict[str, Any]]) -> str:
         """Construct a prompt for the language model using retrieved chunks.
         
+        The context is packed to fit the model's context window, minus room for
+        the answer, or RAG_CONTEXT_TOKENS if that is smaller.
+        
         Args:
             query (str): The user's query
             chunks (List[Dict[str, Any]]): List of retrieved document chunks
@@ -52,15 +78,16 @@ class RAGProcessor:
         Returns:
             str: The constructed prompt
         """
-        context_parts = []
-        
-        for i, chunk in enumerate(chunks, 1):
-            # Combine title and content for better context
-            content = f"Title: {chunk['title']} (Chunk {chunk['chunk_idx'] + 1}/{chunk['total_chunks']})\nContent: {chunk['content']}"
-            context_parts.append(f"{i}. {content}")
-        
-        context = "\n\n".join(context_parts)
+        prompt_tokens = self.context_packer.count_tokens(
+            self.system_prompt + self.format_prompt(query, "")
+        ) + 16  # Per-message overhead of the chat format
+        budget = get_context_budget(self.max_tokens - self.max_answer_tokens - prompt_tokens)
         
+        passages = self.context_packer.pack(chunks, budget)
+        return self.format_prompt(query, self.context_packer.format_context(passages))
+    
+    def format_prompt(self, query: str, context: str) -> str:
+        """Fill the prompt template."""
         prompt = f"""Using the provided context, answer the following question comprehensively.
 
 Context:
@@ -81,14 +108,86 @@ Answer:
                 if attempt < max_retries - 1:
                     wait_time = (2 ** attempt) + random.random()
                     logger.warning(f"RAG operation failed, retrying in {wait_time:.2f}s: {str(e)}")
+                    RETRIES.labels(service="openai_chat").inc()
                     time.sleep(wait_time)
                 else:
                     logger.error(f"All RAG operation attempts failed: {str(e)}")
                     raise
 
+    def completion_params(self, prompt: str) -> Dict[str, Any]:
+        """Build the chat completion parameters for a prompt."""
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": self.max_answer_tokens
+        }
+    
+    def group_chunks_by_page(self, query: str, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Group retrieved chunks by page for display in results.
+        
+        Args:
+            query (str): The user's query, used for excerpts
+            chunks (List[Dict[str, Any]]): List of retrieved document chunks
+            
+        Returns:
+            List[Dict[str, Any]]: Pages sorted by their highest chunk score
+        """
+        pages = {}
+        for chunk in chunks:
+            page_id = chunk["page_id"]
+            if page_id not in pages:
+                pages[page_id] = {
+                    "title": chunk["title"],
+                    "page_id": page_id,
+                    "chunks": [],
+                    "score": 0  # Will store the highest chunk score
+                }
+            
+            pages[page_id]["chunks"].append({
+                "chunk_idx": chunk["chunk_idx"],
+                "excerpt": self.search_client.create_relevant_excerpt(chunk["content"], query),
+                "score": chunk["score"]
+            })
+            
+            # Update page score to highest chunk score
+            pages[page_id]["score"] = max(pages[page_id]["score"], chunk["score"])
+        
+        # Convert to list and sort by score
+        return sorted(pages.values(), key=lambda x: x["score"], reverse=True)
+
+    def refresh_answer_cache(self) -> bool:
+        """Bring the answer cache up to date with the live index.
+        
+        Returns:
+            bool: Whether the cache can be used for this request; not if the index
+                version is unknown or could not be read.
+        """
+        try:
+            index_version = self.search_client.get_index_version()
+            if not self.answer_cache.is_current(index_version):
+                self.answer_cache.refresh(index_version, self.search_client.get_page_versions() if index_version else {})
+        except Exception as e:
+            logger.warning(f"Could not read the index version, not using the answer cache: {str(e)}")
+            return False
+        return index_version is not None
+    
+    def lookup_cached_answer(self, query: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Return the cached answer to a similar query, if any."""
+        cached = self.answer_cache.get(self.search_client.cache_key, embedding)
+        if cached is not None:
+            logger.info(f"Answer cache hit for '{query}': similar to '{cached['cached_query']}' ({cached['similarity']})")
+        return cached
+
     def generate_response(self, query: str) -> Dict[str, Any]:
         """Generate a comprehensive response to the query using RAG.
         
+        An answer to a sufficiently similar earlier query is returned from the
+        answer cache instead, with "cached_query" and "similarity" added.
+        
         Args:
             query (str): The user's query
             
@@ -96,6 +195,14 @@ Answer:
             Dict[str, Any]: A dictionary containing the generated response and retrieved chunks
         """
         try:
+            # The query embedding is cached, so the search below does not embed it again
+            embedding = None
+            if self.answer_cache is not None and self.refresh_answer_cache():
+                embedding = self.search_client.generate_query_embedding(query)
+                cached = self.lookup_cached_answer(query, embedding)
+                if cached is not None:
+                    return cached
+            
             # Retrieve relevant document chunks
             chunks = self.retrieve_documents(query)
             
@@ -103,52 +210,179 @@ Answer:
             prompt = self.construct_prompt(query, chunks)
             
             # Generate response using OpenAI API
-            response = self.with_retry(
-                self.client.chat.completions.create,
-                3,
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a knowledgeable assistant that provides comprehensive answers based on the given context."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=1000
-            )
+            with LLM_LATENCY.labels(stream="false").time():
+                response = self.with_retry(
+                    self.client.chat.completions.create,
+                    3,
+                    **self.completion_params(prompt)
+                )
             
             answer = response.choices[0].message.content
             
-            # Group chunks by page for display in results
-            pages = {}
-            for chunk in chunks:
-                page_id = chunk["page_id"]
-                if page_id not in pages:
-                    pages[page_id] = {
-                        "title": chunk["title"],
-                        "page_id": page_id,
-                        "chunks": [],
-                        "score": 0  # Will store the highest chunk score
-                    }
-                
-                pages[page_id]["chunks"].append({
-                    "chunk_idx": chunk["chunk_idx"],
-                    "excerpt": self.search_client.create_relevant_excerpt(chunk["content"], query),
-                    "score": chunk["score"]
-                })
-                
-                # Update page score to highest chunk score
-                pages[page_id]["score"] = max(pages[page_id]["score"], chunk["score"])
-            
-            # Convert to list and sort by score
-            page_list = sorted(pages.values(), key=lambda x: x["score"], reverse=True)
+            result = {
+                "answer": answer,
+                "pages": self.group_chunks_by_page(query, chunks)
+            }
+            if embedding is not None:
+                self.answer_cache.put(self.search_client.cache_key, query, embedding, result)
+            return result
             
+        except Exception as e:
+            logger.error(f"Error generating RAG response: {str(e)}")
             return {
-                "answer": answer,
-                "pages": page_list
+                "answer": f"Error generating response: {str(e)}",
+                "pages": []
+            } 
+
+
+class AsyncRAGProcessor(RAGProcessor):
+    """RAGProcessor for the async API, backed by AsyncOpenAI and AsyncNotionSearch.
+    
+    Prompt construction and page grouping are shared with RAGProcessor; only
+    the I/O methods are async, and answers can be streamed token by token.
+    """
+    
+    def __init__(
+        self,
+        search_client: AsyncNotionSearch,
+        openai_client: AsyncOpenAI,
+        answer_cache: Optional[SemanticAnswerCache] = None
+    ):
+        """Initialize the RAG processor.
+        
+        Args:
+            search_client (AsyncNotionSearch): Shared async search client.
+            openai_client (AsyncOpenAI): Shared async OpenAI client.
+            answer_cache (Optional[SemanticAnswerCache]): Cache of answers to similar queries.
+                Defaults to the process-wide cache (disabled with ANSWER_CACHE_SIZE=0).
+        """
+        self.client = openai_client
+        self.search_client = search_client
+        self.model = "gpt-3.5-turbo"
+        self.max_tokens = 4096
+        self.max_answer_tokens = 1000
+        self.context_packer = ContextPacker(self.model)
+        self.answer_cache = answer_cache or get_default_answer_cache()
+    
+    async def with_retry(self, operation, max_retries=3, *args, **kwargs):
+        """Await an operation with retry logic."""
+        for attempt in range(max_retries):
+            try:
+                return await operation(*args, **kwargs)
+            except Exception as e:
+                if attempt < max_retries - 1:
+                    wait_time = (2 ** attempt) + random.random()
+                    logger.warning(f"RAG operation failed, retrying in {wait_time:.2f}s: {str(e)}")
+                    RETRIES.labels(service="openai_chat").inc()
+                    await asyncio.sleep(wait_time)
+                else:
+                    logger.error(f"All RAG operation attempts failed: {str(e)}")
+                    raise
+    
+    async def refresh_answer_cache(self) -> bool:
+        """Bring the answer cache up to date with the live index. See RAGProcessor.refresh_answer_cache()."""
+        try:
+            index_version = await self.search_client.get_index_version()
+            if not self.answer_cache.is_current(index_version):
+                self.answer_cache.refresh(index_version, await self.search_client.get_page_versions() if index_version else {})
+        except Exception as e:
+            logger.warning(f"Could not read the index version, not using the answer cache: {str(e)}")
+            return False
+        return index_version is not None
+    
+    async def retrieve_documents(self, query: str, limit: int = 15) -> List[Dict[str, Any]]:
+        """Retrieve relevant document chunks based on the query."""
+        return await self.search_client.search(query, limit=limit, group_by_page=False)
+    
+    async def generate_response(self, query: str) -> Dict[str, Any]:
+        """Generate a comprehensive response to the query using RAG.
+        
+        Args:
+            query (str): The user's query
+            
+        Returns:
+            Dict[str, Any]: A dictionary containing the generated response and retrieved chunks
+        """
+        try:
+            embedding = None
+            if self.answer_cache is not None and await self.refresh_answer_cache():
+                embedding = await self.search_client.generate_query_embedding(query)
+                cached = self.lookup_cached_answer(query, embedding)
+                if cached is not None:
+                    return cached
+            
+            chunks = await self.retrieve_documents(query)
+            prompt = self.construct_prompt(query, chunks)
+            
+            with LLM_LATENCY.labels(stream="false").time():
+                response = await self.with_retry(
+                    self.client.chat.completions.create,
+                    3,
+                    **self.completion_params(prompt)
+                )
+            
+            result = {
+                "answer": response.choices[0].message.content,
+                "pages": self.group_chunks_by_page(query, chunks)
             }
+            if embedding is not None:
+                self.answer_cache.put(self.search_client.cache_key, query, embedding, result)
+            return result
             
         except Exception as e:
             logger.error(f"Error generating RAG response: {str(e)}")
             return {
                 "answer": f"Error generating response: {str(e)}",
                 "pages": []
-            } 
\ No newline at end of file
+            }
+    
+    async def stream_response(self, query: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream a RAG answer as (event, data) pairs.
+        
+        The retrieved pages are sent first as a "pages" event, followed by one
+        "token" event per answer delta and a final "done" event. Failures are
+        reported as an "error" event. A cached answer is sent as a single
+        "token" event.
+        
+        Args:
+            query (str): The user's query
+        """
+        try:
+            embedding = None
+            if self.answer_cache is not None and await self.refresh_answer_cache():
+                embedding = await self.search_client.generate_query_embedding(query)
+                cached = self.lookup_cached_answer(query, embedding)
+                if cached is not None:
+                    yield "pages", cached["pages"]
+                    yield "token", cached["answer"]
+                    yield "done", {"cached_query": cached["cached_query"], "similarity": cached["similarity"]}
+                    return
+            
+            chunks = await self.retrieve_documents(query)
+            pages = self.group_chunks_by_page(query, chunks)
+            yield "pages", pages
+            
+            prompt = self.construct_prompt(query, chunks)
+            start_time = time.time()
+            stream = await self.with_retry(
+                self.client.chat.completions.create,
+                3,
+                stream=True,
+                **self.completion_params(prompt)
+            )
+            
+            answer = []
+            async for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    answer.append(event.choices[0].delta.content)
+                    yield "token", event.choices[0].delta.content
+            
+            LLM_LATENCY.labels(stream="true").observe(time.time() - start_time)
+            
+            if embedding is not None:
+                self.answer_cache.put(self.search_client.cache_key, query, embedding, {"answer": "".join(answer), "pages": pages})
+            yield "done", {}
+            
+        except Exception as e:
+            logger.error(f"Error streaming RAG response: {str(e)}")
+            yield "error", {"error": str(e)}
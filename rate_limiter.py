@@ -0,0 +1,63 @@
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Thread-safe token-bucket rate limiter shared by concurrent API workers."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """Initialize the bucket.
+
+        Args:
+            rate (float): Tokens added per second, i.e. the sustained request rate.
+            capacity (float, optional): Maximum burst size. Defaults to rate, and to 1
+                for rates below one request per second.
+
+        Raises:
+            ValueError: If rate is not positive or capacity is below 1, since a bucket
+                that never holds a whole token would block acquire() forever.
+        """
+        if rate <= 0:
+            raise ValueError("Rate limit must be positive")
+        if capacity is not None and capacity < 1:
+            raise ValueError(f"Rate limiter capacity must be at least 1, got {capacity}")
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait_time = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for the given time, e.g. after a 429 with Retry-After.
+
+        Args:
+            seconds (float): How long every caller should back off.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            # Drain the bucket so callers don't burst as soon as the pause ends
+            self.tokens = 0
+            self.updated_at = self.paused_until
@@ -1,37 +1,74 @@
-from openai import OpenAI
-from qdrant_client import QdrantClient
+from openai import OpenAI, AsyncOpenAI
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.http import models
 import os
-import httpx
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 import logging
+import time
 from collections import defaultdict
+from query_cache import QueryEmbeddingCache, get_default_query_cache
+from lexical_index import LexicalIndex
+from embedding_backends import EmbeddingBackend, create_embedding_backend
+from vector_store import get_metadata_id, check_embedding_metadata, EmbeddingMismatchError
+from monitoring import EMBEDDING_LATENCY, QDRANT_LATENCY
 
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# Maximum number of inputs in one embeddings request
+EMBEDDING_BATCH_LIMIT = 2048
+
+# Values of SEARCH_MODE and of the mode argument of search()
+SEARCH_MODES = ("dense", "hybrid")
+
+# Collection metadata without the per-page versions, which grow with the number of pages
+METADATA_SUMMARY = models.PayloadSelectorExclude(exclude=["page_versions"])
+
 class NotionSearch:
-    def __init__(self):
-        """Initialize the search client."""
-        # Initialize OpenAI client
-        self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not self.openai_api_key:
-            raise ValueError("OpenAI API key not found in environment variables")
-        
-        # Create httpx client without proxies
-        http_client = httpx.Client()
-        
-        # Create OpenAI client with custom http client
-        self.openai_client = OpenAI(
-            api_key=self.openai_api_key,
-            http_client=http_client
-        )
+    def __init__(
+        self,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        openai_client: Optional[OpenAI] = None,
+        qdrant_client: Optional[QdrantClient] = None,
+        embedding_backend: Optional[EmbeddingBackend] = None
+    ):
+        """Initialize the search client.
         
-        # Update to the newer embedding model to match what you're using in embeddings.py
-        self.embedding_model = "text-embedding-3-small"
+        Args:
+            query_cache (Optional[QueryEmbeddingCache]): Cache for query embeddings.
+                Defaults to the process-wide cache.
+            openai_client (Optional[OpenAI]): Shared OpenAI client for the OpenAI embedding
+                backend. One is created on first use if not given.
+            qdrant_client (Optional[QdrantClient]): Shared Qdrant client. One is created if not given.
+            embedding_backend (Optional[EmbeddingBackend]): Backend that embeds queries; it must
+                match the one the collection was indexed with. Defaults to the one
+                configured by EMBEDDING_BACKEND.
+        """
+        self.embedding_backend = embedding_backend or create_embedding_backend(openai_client=openai_client)
+        self.embedding_model = self.embedding_backend.model
+        self.cache_key = self.embedding_backend.cache_key
         
+        self.qdrant_client = qdrant_client or self.create_qdrant_client()
+        self.collection_name = "notion_chunks"
+        self.query_cache = query_cache or get_default_query_cache()
+        
+        # Hybrid retrieval settings
+        self.search_mode = os.getenv("SEARCH_MODE", "dense")
+        self.rrf_k = int(os.getenv("SEARCH_RRF_K", "60"))
+        self.lexical_index = LexicalIndex()
+        self.lexical_warning = None
+        
+        # Quantized collections: fetch oversampling x limit candidates with the
+        # quantized vectors, then rescore them with the originals
+        self.oversampling = float(os.getenv("SEARCH_OVERSAMPLING")) if os.getenv("SEARCH_OVERSAMPLING") else None
+        self.rescore = os.getenv("SEARCH_RESCORE", "true").lower() == "true"
+    
+    @staticmethod
+    def create_qdrant_client() -> QdrantClient:
+        """Create a Qdrant client from environment variables."""
         # Check if QDRANT_URL is provided in environment variables
         qdrant_url = os.getenv("QDRANT_URL")
         
@@ -41,14 +78,63 @@ class NotionSearch:
             if not api_key:
                 raise ValueError("Qdrant API key not found in environment variables")
             
-            self.qdrant_client = QdrantClient(url=qdrant_url, api_key=api_key)
+            qdrant_client = QdrantClient(url=qdrant_url, api_key=api_key)
             logger.info(f"Connected to cloud Qdrant at {qdrant_url}")
         else:
             # Use local Qdrant
-            self.qdrant_client = QdrantClient(path="./qdrant_storage")
+            qdrant_client = QdrantClient(path="./qdrant_storage")
             logger.info("Connected to local Qdrant storage")
         
-        self.collection_name = "notion_chunks"
+        return qdrant_client
+    
+    def check_collection(self, vectors_config, metadata: Optional[Dict[str, Any]] = None):
+        """Raise EmbeddingMismatchError if the collection wasn't built with the query embedding backend.
+        
+        Args:
+            vectors_config: The collection's vector params, from get_collection().
+            metadata (Optional[Dict[str, Any]]): The collection's recorded metadata, if any,
+                see VectorStore.get_collection_metadata().
+        """
+        expected = self.embedding_backend.dimensions
+        if vectors_config.size != expected:
+            raise EmbeddingMismatchError(
+                f"Collection {self.collection_name} has {vectors_config.size}-dimensional vectors, "
+                f"but queries are embedded with {expected} dimensions ({self.embedding_backend.name} backend)"
+            )
+        if metadata:
+            check_embedding_metadata(metadata, self.embedding_backend.metadata())
+    
+    def get_collection_metadata(self, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Return the recorded metadata of the live collection, or None if there is none.
+        
+        Args:
+            fields (Optional[List[str]]): Keys to read. Defaults to all but the page versions,
+                which grow with the number of pages.
+        """
+        collection_name = self.collection_name
+        for alias in self.qdrant_client.get_aliases().aliases:
+            if alias.alias_name == self.collection_name:
+                collection_name = alias.collection_name
+        
+        try:
+            records = self.qdrant_client.retrieve(
+                collection_name=f"{self.collection_name}_metadata",
+                ids=[get_metadata_id(collection_name)],
+                with_payload=fields or METADATA_SUMMARY
+            )
+        except Exception:
+            return None  # No metadata collection yet
+        return records[0].payload if records else None
+    
+    def get_index_version(self) -> Optional[str]:
+        """Return the live index version recorded by the indexer (see VectorStore.record_index_version()), or None."""
+        metadata = self.get_collection_metadata(fields=["index_version"])
+        return metadata.get("index_version") if metadata else None
+    
+    def get_page_versions(self) -> Dict[str, str]:
+        """Return the content hash of every page in the live index, keyed by page ID."""
+        metadata = self.get_collection_metadata(fields=["page_versions"])
+        return metadata.get("page_versions", {}) if metadata else {}
     
     def generate_query_embedding(self, query: str) -> List[float]:
         """Generate an embedding for the search query.
@@ -59,80 +145,419 @@ class NotionSearch:
         Returns:
             List[float]: The embedding vector.
         """
-        response = self.openai_client.embeddings.create(
-            input=query,
-            model=self.embedding_model
-        )
+        cached = self.query_cache.get(self.cache_key, query)
+        if cached is not None:
+            logger.debug(f"Query embedding cache hit for: {query}")
+            return cached
+        
+        start_time = time.time()
+        with EMBEDDING_LATENCY.labels(source="query").time():
+            embedding = self.embedding_backend.embed([query])[0]
+        self.query_cache.put(self.cache_key, query, embedding, time.time() - start_time)
+        
+        return embedding
+    
+    def generate_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Generate embeddings for several queries, sending every cache miss in one request.
+        
+        Args:
+            queries (List[str]): The search queries.
+            
+        Returns:
+            List[List[float]]: One embedding per query, in order.
+        """
+        embeddings, missing = self.lookup_query_embeddings(queries)
+        
+        for i in range(0, len(missing), EMBEDDING_BATCH_LIMIT):
+            batch = missing[i:i+EMBEDDING_BATCH_LIMIT]
+            start_time = time.time()
+            with EMBEDDING_LATENCY.labels(source="query").time():
+                vectors = self.embedding_backend.embed(batch)
+            self.store_query_embeddings(batch, vectors, time.time() - start_time, embeddings)
         
-        return response.data[0].embedding
+        return [embeddings[query] for query in queries]
+    
+    def lookup_query_embeddings(self, queries: List[str]) -> Tuple[Dict[str, List[float]], List[str]]:
+        """Split queries into cached embeddings and the distinct queries still to embed."""
+        embeddings = {}
+        missing = []
+        for query in dict.fromkeys(queries):
+            cached = self.query_cache.get(self.cache_key, query)
+            if cached is not None:
+                embeddings[query] = cached
+            else:
+                missing.append(query)
+        return embeddings, missing
+    
+    def store_query_embeddings(self, batch: List[str], vectors: List[List[float]], latency: float, embeddings: Dict[str, List[float]]):
+        """Cache the embeddings of a batched request and add them to embeddings."""
+        for query, vector in zip(batch, vectors):
+            embeddings[query] = vector
+            self.query_cache.put(self.cache_key, query, vector, latency)
     
-    def search(self, query: str, limit: int = 10, group_by_page: bool = True, max_pages: int = 5) -> List[Dict[str, Any]]:
-        """Search for Notion chunks similar to the query."""
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        group_by_page: bool = True,
+        max_pages: int = 5,
+        mode: Optional[str] = None,
+        chunks_per_page: int = 3,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Search for Notion chunks similar to the query.
+        
+        Grouped dense searches are grouped by page inside Qdrant, fetching about
+        limit chunks from at most max_pages pages (see get_group_params());
+        ungrouped and hybrid searches rank limit chunks, which are grouped
+        afterwards. Either way at most limit chunks are returned.
+        
+        Args:
+            query (str): The search query.
+            limit (int): Maximum number of chunks to return.
+            group_by_page (bool): Whether to group results by page.
+            max_pages (int): Maximum number of pages when grouping.
+            mode (Optional[str]): "dense" for vector search only, or "hybrid" to fuse
+                vector and BM25 rankings with reciprocal rank fusion. Defaults to
+                SEARCH_MODE.
+            chunks_per_page (int): Maximum number of chunks per page when grouping.
+            timings (Optional[Dict[str, float]]): If given, filled with the latency
+                of each retrieval leg in milliseconds.
+            
+        Returns:
+            List[Dict[str, Any]]: Formatted search results.
+        """
+        mode = self.resolve_mode(mode)
+        timings = {} if timings is None else timings
+        
+        start_time = time.time()
         query_embedding = self.generate_query_embedding(query)
         
+        if group_by_page and mode == "dense":
+            with QDRANT_LATENCY.labels(operation="query_points_groups").time():
+                groups = self.qdrant_client.query_points_groups(
+                    **self.get_group_params(query_embedding, limit, max_pages, chunks_per_page)
+                )
+            timings["dense_ms"] = (time.time() - start_time) * 1000
+            self.log_timings(mode, timings)
+            return self.format_groups(groups.groups, query, max_chunks=limit)
+        
         # Use old format for Qdrant 1.6.0
-        search_results = self.qdrant_client.search(
-            collection_name=self.collection_name,
-            query_vector=query_embedding,  # Simple vector, not named
-            limit=limit
+        with QDRANT_LATENCY.labels(operation="search").time():
+            search_results = self.qdrant_client.search(
+                collection_name=self.collection_name,
+                query_vector=query_embedding,  # Simple vector, not named
+                search_params=self.get_search_params(),
+                limit=limit
+            )
+        timings["dense_ms"] = (time.time() - start_time) * 1000
+        
+        if mode == "hybrid":
+            lexical_hits = self.lexical_search(query, limit, timings)
+            
+            start_time = time.time()
+            fused, points = self.fuse_rankings(search_results, lexical_hits, limit)
+            missing_ids = [point_id for point_id, _ in fused if point_id not in points]
+            if missing_ids:
+                # Chunks found only by the lexical leg
+                with QDRANT_LATENCY.labels(operation="retrieve").time():
+                    records = self.qdrant_client.retrieve(collection_name=self.collection_name, ids=missing_ids, with_payload=True)
+                for record in records:
+                    points[str(record.id)] = record
+            search_results = self.build_fused_results(fused, points)
+            timings["fusion_ms"] = (time.time() - start_time) * 1000
+        
+        self.log_timings(mode, timings)
+        return self.format_results(search_results, query, group_by_page, max_pages, chunks_per_page)
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        limit: int = 10,
+        group_by_page: bool = True,
+        max_pages: int = 5,
+        mode: Optional[str] = None,
+        chunks_per_page: int = 3,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Run many searches with one embedding request and one Qdrant batch request.
+        
+        Qdrant has no batched grouped search, so grouped results are grouped by
+        page from the top `limit` chunks of each query.
+        
+        Args:
+            queries (List[str]): The search queries.
+            limit (int): Maximum number of chunks to retrieve per query.
+            group_by_page (bool): Whether to group results by page.
+            max_pages (int): Maximum number of pages per query when grouping.
+            mode (Optional[str]): "dense" or "hybrid", see search(). Defaults to SEARCH_MODE.
+            chunks_per_page (int): Maximum number of chunks per page when grouping.
+            timings (Optional[Dict[str, float]]): If given, filled with the latency
+                of each retrieval leg, for the whole batch, in milliseconds.
+            
+        Returns:
+            List[List[Dict[str, Any]]]: Formatted results for each query, in order.
+        """
+        mode = self.resolve_mode(mode)
+        timings = {} if timings is None else timings
+        if not queries:
+            return []
+        
+        start_time = time.time()
+        query_embeddings = self.generate_query_embeddings(queries)
+        with QDRANT_LATENCY.labels(operation="search_batch").time():
+            batch_results = self.qdrant_client.search_batch(
+                collection_name=self.collection_name,
+                requests=[
+                    models.SearchRequest(vector=query_embedding, limit=limit, params=self.get_search_params(), with_payload=True)
+                    for query_embedding in query_embeddings
+                ]
+            )
+        timings["dense_ms"] = (time.time() - start_time) * 1000
+        
+        if mode == "hybrid":
+            fused_batch, points, missing_ids = self.fuse_batch(queries, batch_results, limit, timings)
+            
+            start_time = time.time()
+            if missing_ids:
+                with QDRANT_LATENCY.labels(operation="retrieve").time():
+                    records = self.qdrant_client.retrieve(collection_name=self.collection_name, ids=missing_ids, with_payload=True)
+                for record in records:
+                    points[str(record.id)] = record
+            batch_results = [self.build_fused_results(fused, points) for fused in fused_batch]
+            timings["fusion_ms"] += (time.time() - start_time) * 1000
+        
+        self.log_timings(f"{mode}, batch of {len(queries)}", timings)
+        return [
+            self.format_results(search_results, query, group_by_page, max_pages, chunks_per_page)
+            for query, search_results in zip(queries, batch_results)
+        ]
+    
+    def fuse_batch(self, queries: List[str], batch_results, limit: int, timings: Dict[str, float]):
+        """Run the lexical leg for a batch and fuse it with the dense results.
+        
+        Returns:
+            Tuple: The fused (point ID, score) pairs of each query, the dense points
+                keyed by ID, and the IDs of lexical-only hits whose payloads are needed.
+        """
+        lexical_batch = []
+        lexical_ms = 0.0
+        for query in queries:
+            leg_timings = {}
+            lexical_batch.append(self.lexical_search(query, limit, leg_timings))
+            lexical_ms += leg_timings["lexical_ms"]
+        timings["lexical_ms"] = lexical_ms
+        
+        start_time = time.time()
+        fused_batch = []
+        points = {}
+        for search_results, lexical_hits in zip(batch_results, lexical_batch):
+            fused, dense_points = self.fuse_rankings(search_results, lexical_hits, limit)
+            fused_batch.append(fused)
+            points.update(dense_points)
+        missing_ids = list({point_id for fused in fused_batch for point_id, _ in fused if point_id not in points})
+        timings["fusion_ms"] = (time.time() - start_time) * 1000
+        
+        return fused_batch, points, missing_ids
+    
+    def get_search_params(self) -> models.SearchParams:
+        """Return the Qdrant search params; quantization settings are ignored by unquantized collections."""
+        return models.SearchParams(
+            quantization=models.QuantizationSearchParams(
+                rescore=self.rescore,
+                oversampling=self.oversampling
+            )
         )
+    
+    def get_group_params(self, query_embedding: List[float], limit: int, max_pages: int, chunks_per_page: int) -> Dict[str, Any]:
+        """Build the arguments of a grouped dense query that fetches about limit chunks.
+        
+        At most min(max_pages, limit) pages are fetched, with as many chunks each as
+        spreading limit over them takes (capped at chunks_per_page), so Qdrant
+        returns fewer than limit + pages chunks; format_groups() trims the rest.
+        """
+        pages = max(min(max_pages, limit), 1)
+        return {
+            "collection_name": self.collection_name,
+            "query": query_embedding,
+            "group_by": "page_id",
+            "limit": pages,
+            "group_size": min(chunks_per_page, -(-limit // pages)),
+            "search_params": self.get_search_params(),
+            "with_payload": True
+        }
+    
+    def check_mode(self, mode: Optional[str]) -> str:
+        """Resolve and validate a search mode."""
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        return mode
+    
+    def resolve_mode(self, mode: Optional[str]) -> str:
+        """Resolve a search mode, falling back to dense if the lexical index can't be used."""
+        mode = self.check_mode(mode)
+        if mode == "hybrid" and not self.lexical_index_matches(self.get_index_version()):
+            return "dense"
+        return mode
+    
+    def lexical_index_matches(self, index_version: Optional[str]) -> bool:
+        """Check that the lexical index exists and was built for the live index version.
+        
+        The index is a local file, so an API server on another host than the indexer
+        may not have it, or may have one left over from an older collection. Logs a
+        warning when that starts happening, rather than fusing with the wrong chunks.
+        """
+        self.lexical_index.refresh()
+        if self.lexical_index.mtime is None:
+            warning = f"Lexical index {self.lexical_index.path} not found"
+        elif self.lexical_index.index_version != index_version:
+            warning = (
+                f"Lexical index {self.lexical_index.path} was built for index version "
+                f"{self.lexical_index.index_version}, but the live one is {index_version}"
+            )
+        else:
+            self.lexical_warning = None
+            return True
+        
+        if warning != self.lexical_warning:
+            logger.warning(f"{warning}; falling back to dense search")
+            self.lexical_warning = warning
+        return False
+    
+    def lexical_search(self, query: str, limit: int, timings: Dict[str, float]) -> List[Tuple[str, float]]:
+        """Run the BM25 leg of a hybrid search, picking up a newly saved index first."""
+        start_time = time.time()
+        self.lexical_index.refresh()
+        hits = self.lexical_index.search(query, limit)
+        timings["lexical_ms"] = (time.time() - start_time) * 1000
+        return hits
+    
+    def fuse_rankings(self, dense_results, lexical_hits: List[Tuple[str, float]], limit: int) -> Tuple[List[Tuple[str, float]], Dict[str, Any]]:
+        """Fuse dense and lexical rankings with reciprocal rank fusion.
         
+        Each chunk scores sum(1 / (k + rank)) over the rankings it appears in, so
+        chunks ranked well by both legs rise to the top regardless of how the
+        legs' raw scores are scaled.
+        
+        Args:
+            dense_results: Scored points from the vector search.
+            lexical_hits (List[Tuple[str, float]]): (point ID, BM25 score) pairs.
+            limit (int): Maximum number of fused results.
+            
+        Returns:
+            Tuple[List[Tuple[str, float]], Dict[str, Any]]: The fused (point ID, score)
+                pairs, best first, and the dense points keyed by ID.
+        """
+        rankings = [[str(point.id) for point in dense_results], [point_id for point_id, _ in lexical_hits]]
+        scores = defaultdict(float)
+        for ranking in rankings:
+            for rank, point_id in enumerate(ranking, start=1):
+                scores[point_id] += 1.0 / (self.rrf_k + rank)
+        
+        fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return fused, {str(point.id): point for point in dense_results}
+    
+    def build_fused_results(self, fused: List[Tuple[str, float]], points: Dict[str, Any]) -> List[models.ScoredPoint]:
+        """Turn fused (point ID, score) pairs into scored points for format_results()."""
+        return [
+            models.ScoredPoint(id=point_id, version=0, score=score, payload=points[point_id].payload)
+            for point_id, score in fused
+            if point_id in points  # Lexical hits can briefly outlive their chunks
+        ]
+    
+    def log_timings(self, mode: str, timings: Dict[str, float]):
+        legs = ", ".join(f"{name[:-3]} {value:.1f}ms" for name, value in timings.items())
+        logger.info(f"Search latency ({mode}): {legs}")
+    
+    def format_results(
+        self,
+        search_results,
+        query: str,
+        group_by_page: bool = True,
+        max_pages: int = 5,
+        chunks_per_page: int = 3
+    ) -> List[Dict[str, Any]]:
+        """Format raw Qdrant search results, optionally grouped by page.
+        
+        Args:
+            search_results: Scored points returned by Qdrant.
+            query (str): The search query, used for excerpts and logging.
+            group_by_page (bool): Whether to group results by page.
+            max_pages (int): Maximum number of pages when grouping.
+            chunks_per_page (int): Maximum number of chunks per page when grouping.
+            
+        Returns:
+            List[Dict[str, Any]]: Formatted search results.
+        """
         # Process the results
         if not group_by_page:
             # Return individual chunks
-            formatted_results = []
-            for result in search_results:
-                formatted_results.append({
-                    "title": result.payload.get("title", "Untitled"),
-                    "page_id": result.payload.get("page_id", ""),
-                    "chunk_idx": result.payload.get("chunk_idx", 0),
-                    "total_chunks": result.payload.get("total_chunks", 1),
-                    "content": result.payload.get("chunk", ""),
-                    "score": result.score
-                })
+            formatted_results = [self.format_point(result) for result in search_results]
             
             logger.info(f"Found {len(formatted_results)} chunks for query: {query}")
             return formatted_results
         
         else:
-            # Group chunks by page and take the best chunk from each page
-            pages = defaultdict(list)
-            
+            # Group chunks by page; results arrive best first, so each page's
+            # first chunk is its best and pages keep the order of their best chunk
+            pages = {}
             for result in search_results:
-                page_id = result.payload.get("page_id", "")
-                pages[page_id].append({
-                    "title": result.payload.get("title", "Untitled"),
-                    "page_id": page_id,
-                    "chunk_idx": result.payload.get("chunk_idx", 0),
-                    "total_chunks": result.payload.get("total_chunks", 1),
-                    "content": result.payload.get("chunk", ""),
-                    "score": result.score
-                })
-            
-            # Take the top chunks from each page
-            top_results = []
-            
-            # Sort pages by their highest scoring chunk
-            sorted_pages = sorted(
-                pages.items(), 
-                key=lambda x: max(chunk["score"] for chunk in x[1]), 
-                reverse=True
-            )
+                pages.setdefault(result.payload.get("page_id", ""), []).append(result)
             
-            # Take the top pages
-            for page_id, chunks in sorted_pages[:max_pages]:
-                # Sort chunks within this page by score
-                sorted_chunks = sorted(chunks, key=lambda x: x["score"], reverse=True)
-                
-                # Add relevant excerpts from each chunk
-                for chunk in sorted_chunks[:3]:  # Take up to 3 best chunks per page
-                    excerpt = self.create_relevant_excerpt(chunk["content"], query)
-                    chunk["excerpt"] = excerpt
-                    top_results.append(chunk)
+            top_results = self.format_groups(
+                [models.PointGroup(id=page_id, hits=hits[:chunks_per_page]) for page_id, hits in list(pages.items())[:max_pages]],
+                query,
+                log=False
+            )
             
             logger.info(f"Found {len(top_results)} relevant chunks from {len(pages)} pages for query: {query}")
             return top_results
     
+    def format_groups(
+        self,
+        groups: List[models.PointGroup],
+        query: str,
+        log: bool = True,
+        max_chunks: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Format page groups, best page first, adding a relevant excerpt to each chunk.
+        
+        Args:
+            groups (List[models.PointGroup]): Groups of scored points, one per page.
+            query (str): The search query, used for excerpts and logging.
+            log (bool): Whether to log a summary.
+            max_chunks (Optional[int]): Stop after this many chunks, dropping the rest
+                of the last pages.
+            
+        Returns:
+            List[Dict[str, Any]]: Formatted search results.
+        """
+        top_results = []
+        for group in groups:
+            for hit in group.hits:
+                if max_chunks is not None and len(top_results) >= max_chunks:
+                    break
+                chunk = self.format_point(hit)
+                chunk["excerpt"] = self.create_relevant_excerpt(chunk["content"], query)
+                top_results.append(chunk)
+        
+        if log:
+            logger.info(f"Found {len(top_results)} relevant chunks from {len(groups)} pages for query: {query}")
+        return top_results
+    
+    def format_point(self, result) -> Dict[str, Any]:
+        """Convert a scored point into a search result."""
+        return {
+            "title": result.payload.get("title", "Untitled"),
+            "page_id": result.payload.get("page_id", ""),
+            "chunk_idx": result.payload.get("chunk_idx", 0),
+            "total_chunks": result.payload.get("total_chunks", 1),
+            "heading_path": result.payload.get("heading_path", ""),
+            "content": result.payload.get("chunk", ""),
+            "score": result.score
+        }
+    
     def create_relevant_excerpt(self, content: str, query: str, max_length: int = 300) -> str:
         """Create a relevant excerpt from content based on the query.
         
@@ -194,4 +619,227 @@ class NotionSearch:
         if len(content) <= max_length:
             return content
         
-        return content[:max_length] + "..."
\ No newline at end of file
+        return content[:max_length] + "..."
+
+
+class AsyncNotionSearch(NotionSearch):
+    """NotionSearch for the async API, backed by AsyncOpenAI and AsyncQdrantClient.
+    
+    Result formatting and excerpts are shared with NotionSearch; only the I/O
+    methods are async.
+    """
+    
+    def __init__(
+        self,
+        openai_client: Optional[AsyncOpenAI],
+        qdrant_client: AsyncQdrantClient,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        embedding_backend: Optional[EmbeddingBackend] = None
+    ):
+        """Initialize the search client.
+        
+        Args:
+            openai_client (Optional[AsyncOpenAI]): Shared async OpenAI client for the OpenAI
+                embedding backend; None for the other backends.
+            qdrant_client (AsyncQdrantClient): Shared async Qdrant client.
+            query_cache (Optional[QueryEmbeddingCache]): Cache for query embeddings.
+                Defaults to the process-wide cache.
+            embedding_backend (Optional[EmbeddingBackend]): Backend that embeds queries.
+                Defaults to the one configured by EMBEDDING_BACKEND.
+        """
+        self.embedding_backend = embedding_backend or create_embedding_backend(async_openai_client=openai_client)
+        self.qdrant_client = qdrant_client
+        self.embedding_model = self.embedding_backend.model
+        self.cache_key = self.embedding_backend.cache_key
+        self.collection_name = "notion_chunks"
+        self.query_cache = query_cache or get_default_query_cache()
+        self.search_mode = os.getenv("SEARCH_MODE", "dense")
+        self.rrf_k = int(os.getenv("SEARCH_RRF_K", "60"))
+        self.lexical_index = LexicalIndex()
+        self.lexical_warning = None
+        self.oversampling = float(os.getenv("SEARCH_OVERSAMPLING")) if os.getenv("SEARCH_OVERSAMPLING") else None
+        self.rescore = os.getenv("SEARCH_RESCORE", "true").lower() == "true"
+    
+    @staticmethod
+    def create_qdrant_client() -> AsyncQdrantClient:
+        """Create an async Qdrant client from environment variables."""
+        qdrant_url = os.getenv("QDRANT_URL")
+        
+        if qdrant_url:
+            api_key = os.getenv("QDRANT_API_KEY")
+            if not api_key:
+                raise ValueError("Qdrant API key not found in environment variables")
+            
+            qdrant_client = AsyncQdrantClient(url=qdrant_url, api_key=api_key)
+            logger.info(f"Connected to cloud Qdrant at {qdrant_url}")
+        else:
+            qdrant_client = AsyncQdrantClient(path="./qdrant_storage")
+            logger.info("Connected to local Qdrant storage")
+        
+        return qdrant_client
+    
+    async def get_collection_metadata(self, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Return the recorded metadata of the live collection, or None if there is none."""
+        collection_name = self.collection_name
+        for alias in (await self.qdrant_client.get_aliases()).aliases:
+            if alias.alias_name == self.collection_name:
+                collection_name = alias.collection_name
+        
+        try:
+            records = await self.qdrant_client.retrieve(
+                collection_name=f"{self.collection_name}_metadata",
+                ids=[get_metadata_id(collection_name)],
+                with_payload=fields or METADATA_SUMMARY
+            )
+        except Exception:
+            return None  # No metadata collection yet
+        return records[0].payload if records else None
+    
+    async def get_index_version(self) -> Optional[str]:
+        """Return the live index version recorded by the indexer, or None."""
+        metadata = await self.get_collection_metadata(fields=["index_version"])
+        return metadata.get("index_version") if metadata else None
+    
+    async def get_page_versions(self) -> Dict[str, str]:
+        """Return the content hash of every page in the live index, keyed by page ID."""
+        metadata = await self.get_collection_metadata(fields=["page_versions"])
+        return metadata.get("page_versions", {}) if metadata else {}
+    
+    async def resolve_mode(self, mode: Optional[str]) -> str:
+        """Resolve a search mode, falling back to dense if the lexical index can't be used."""
+        mode = self.check_mode(mode)
+        if mode == "hybrid" and not self.lexical_index_matches(await self.get_index_version()):
+            return "dense"
+        return mode
+    
+    async def generate_query_embedding(self, query: str) -> List[float]:
+        """Generate an embedding for the search query.
+        
+        Args:
+            query (str): The search query.
+            
+        Returns:
+            List[float]: The embedding vector.
+        """
+        cached = self.query_cache.get(self.cache_key, query)
+        if cached is not None:
+            logger.debug(f"Query embedding cache hit for: {query}")
+            return cached
+        
+        start_time = time.time()
+        with EMBEDDING_LATENCY.labels(source="query").time():
+            embedding = (await self.embedding_backend.aembed([query]))[0]
+        self.query_cache.put(self.cache_key, query, embedding, time.time() - start_time)
+        
+        return embedding
+    
+    async def generate_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Generate embeddings for several queries, sending every cache miss in one request."""
+        embeddings, missing = self.lookup_query_embeddings(queries)
+        
+        for i in range(0, len(missing), EMBEDDING_BATCH_LIMIT):
+            batch = missing[i:i+EMBEDDING_BATCH_LIMIT]
+            start_time = time.time()
+            with EMBEDDING_LATENCY.labels(source="query").time():
+                vectors = await self.embedding_backend.aembed(batch)
+            self.store_query_embeddings(batch, vectors, time.time() - start_time, embeddings)
+        
+        return [embeddings[query] for query in queries]
+    
+    async def search(
+        self,
+        query: str,
+        limit: int = 10,
+        group_by_page: bool = True,
+        max_pages: int = 5,
+        mode: Optional[str] = None,
+        chunks_per_page: int = 3,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Search for Notion chunks similar to the query. See NotionSearch.search()."""
+        mode = await self.resolve_mode(mode)
+        timings = {} if timings is None else timings
+        
+        start_time = time.time()
+        query_embedding = await self.generate_query_embedding(query)
+        
+        if group_by_page and mode == "dense":
+            with QDRANT_LATENCY.labels(operation="query_points_groups").time():
+                groups = await self.qdrant_client.query_points_groups(
+                    **self.get_group_params(query_embedding, limit, max_pages, chunks_per_page)
+                )
+            timings["dense_ms"] = (time.time() - start_time) * 1000
+            self.log_timings(mode, timings)
+            return self.format_groups(groups.groups, query, max_chunks=limit)
+        
+        with QDRANT_LATENCY.labels(operation="search").time():
+            search_results = await self.qdrant_client.search(
+                collection_name=self.collection_name,
+                query_vector=query_embedding,
+                search_params=self.get_search_params(),
+                limit=limit
+            )
+        timings["dense_ms"] = (time.time() - start_time) * 1000
+        
+        if mode == "hybrid":
+            lexical_hits = self.lexical_search(query, limit, timings)
+            
+            start_time = time.time()
+            fused, points = self.fuse_rankings(search_results, lexical_hits, limit)
+            missing_ids = [point_id for point_id, _ in fused if point_id not in points]
+            if missing_ids:
+                with QDRANT_LATENCY.labels(operation="retrieve").time():
+                    records = await self.qdrant_client.retrieve(collection_name=self.collection_name, ids=missing_ids, with_payload=True)
+                for record in records:
+                    points[str(record.id)] = record
+            search_results = self.build_fused_results(fused, points)
+            timings["fusion_ms"] = (time.time() - start_time) * 1000
+        
+        self.log_timings(mode, timings)
+        return self.format_results(search_results, query, group_by_page, max_pages, chunks_per_page)
+    
+    async def search_batch(
+        self,
+        queries: List[str],
+        limit: int = 10,
+        group_by_page: bool = True,
+        max_pages: int = 5,
+        mode: Optional[str] = None,
+        chunks_per_page: int = 3,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Run many searches in a few round trips. See NotionSearch.search_batch()."""
+        mode = await self.resolve_mode(mode)
+        timings = {} if timings is None else timings
+        if not queries:
+            return []
+        
+        start_time = time.time()
+        query_embeddings = await self.generate_query_embeddings(queries)
+        with QDRANT_LATENCY.labels(operation="search_batch").time():
+            batch_results = await self.qdrant_client.search_batch(
+                collection_name=self.collection_name,
+                requests=[
+                    models.SearchRequest(vector=query_embedding, limit=limit, params=self.get_search_params(), with_payload=True)
+                    for query_embedding in query_embeddings
+                ]
+            )
+        timings["dense_ms"] = (time.time() - start_time) * 1000
+        
+        if mode == "hybrid":
+            fused_batch, points, missing_ids = self.fuse_batch(queries, batch_results, limit, timings)
+            
+            start_time = time.time()
+            if missing_ids:
+                with QDRANT_LATENCY.labels(operation="retrieve").time():
+                    records = await self.qdrant_client.retrieve(collection_name=self.collection_name, ids=missing_ids, with_payload=True)
+                for record in records:
+                    points[str(record.id)] = record
+            batch_results = [self.build_fused_results(fused, points) for fused in fused_batch]
+            timings["fusion_ms"] += (time.time() - start_time) * 1000
+        
+        self.log_timings(f"{mode}, batch of {len(queries)}", timings)
+        return [
+            self.format_results(search_results, query, group_by_page, max_pages, chunks_per_page)
+            for query, search_results in zip(queries, batch_results)
+        ]
@@ -0,0 +1,196 @@
+import os
+import threading
+import logging
+from typing import Optional
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from qdrant_client import QdrantClient
+from dotenv import load_dotenv
+from search import NotionSearch, AsyncNotionSearch
+from embedding_backends import get_embedding_backend_name
+from rag import RAGProcessor, AsyncRAGProcessor
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+
+class ServiceContainer:
+    """Long-lived clients shared by every request in a worker process.
+
+    Each client is built lazily, once, and reused: one connection-pooled httpx
+    client backs the OpenAI client, and NotionSearch and RAGProcessor share the
+    same OpenAI and Qdrant clients. The OpenAI client (and OPENAI_API_KEY) is
+    only needed by the openai embedding backend and RAG answers, so search
+    with a local embedding backend runs without it. Containers must be created after gunicorn
+    forks its workers (i.e. don't run with --preload), since httpx clients and
+    local Qdrant storage handles are not fork-safe.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._http_client: Optional[httpx.Client] = None
+        self._openai_client: Optional[OpenAI] = None
+        self._qdrant_client: Optional[QdrantClient] = None
+        self._search: Optional[NotionSearch] = None
+        self._rag: Optional[RAGProcessor] = None
+
+    @property
+    def http_client(self) -> httpx.Client:
+        with self.lock:
+            if self._http_client is None:
+                max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+                self._http_client = httpx.Client(
+                    timeout=60.0,
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_connections
+                    )
+                )
+            return self._http_client
+
+    @property
+    def openai_client(self) -> OpenAI:
+        with self.lock:
+            if self._openai_client is None:
+                api_key = os.getenv("OPENAI_API_KEY")
+                if not api_key:
+                    raise ValueError("OpenAI API key not found in environment variables")
+                self._openai_client = OpenAI(api_key=api_key, http_client=self.http_client)
+            return self._openai_client
+
+    @property
+    def qdrant_client(self) -> QdrantClient:
+        with self.lock:
+            if self._qdrant_client is None:
+                self._qdrant_client = NotionSearch.create_qdrant_client()
+            return self._qdrant_client
+
+    @property
+    def search(self) -> NotionSearch:
+        with self.lock:
+            if self._search is None:
+                openai_client = self.openai_client if get_embedding_backend_name() == "openai" else None
+                self._search = NotionSearch(openai_client=openai_client, qdrant_client=self.qdrant_client)
+            return self._search
+
+    @property
+    def rag(self) -> RAGProcessor:
+        with self.lock:
+            if self._rag is None:
+                self._rag = RAGProcessor(search_client=self.search, openai_client=self.openai_client)
+            return self._rag
+
+    def warm(self):
+        """Build the search clients up front and open the collection, so the first request doesn't pay for it.
+        
+        The RAG processor, which needs an OpenAI key, is built on the first RAG request.
+        
+        Raises:
+            EmbeddingMismatchError: If the collection was built with different embeddings
+                than queries use. Qdrant being unreachable is only logged.
+        """
+        search = self.search  # Builds the Qdrant client, and the OpenAI client if queries need it
+        try:
+            collection = self.qdrant_client.get_collection(search.collection_name)
+            metadata = search.get_collection_metadata()
+        except Exception as e:
+            logger.warning(f"Could not open collection {search.collection_name} during warm-up: {str(e)}")
+        else:
+            search.check_collection(collection.config.params.vectors, metadata)
+        logger.info("Service container warmed up")
+
+    def close(self):
+        """Close the shared clients."""
+        with self.lock:
+            if self._qdrant_client is not None:
+                self._qdrant_client.close()
+            if self._http_client is not None:
+                self._http_client.close()
+            self._http_client = None
+            self._openai_client = None
+            self._qdrant_client = None
+            self._search = None
+            self._rag = None
+
+
+class AsyncServiceContainer:
+    """Async counterpart of ServiceContainer for the ASGI app.
+    
+    Async clients are bound to the event loop they are created on, so start()
+    must be awaited from the server's startup hook rather than at import time.
+    """
+    
+    def __init__(self):
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.openai_client: Optional[AsyncOpenAI] = None
+        self.search: Optional[AsyncNotionSearch] = None
+        self._rag: Optional[AsyncRAGProcessor] = None
+    
+    @property
+    def rag(self) -> AsyncRAGProcessor:
+        if self._rag is None:
+            raise ValueError("OpenAI API key not found in environment variables")
+        return self._rag
+    
+    async def start(self):
+        """Build the shared async clients and open the collection.
+        
+        Without OPENAI_API_KEY only search with a local embedding backend is served;
+        RAG requests fail.
+        """
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key and get_embedding_backend_name() == "openai":
+            raise ValueError("OpenAI API key not found in environment variables")
+        
+        max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+        self.http_client = httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+        if api_key:
+            self.openai_client = AsyncOpenAI(api_key=api_key, http_client=self.http_client)
+        self.search = AsyncNotionSearch(
+            openai_client=self.openai_client if get_embedding_backend_name() == "openai" else None,
+            qdrant_client=AsyncNotionSearch.create_qdrant_client()
+        )
+        if self.openai_client is not None:
+            self._rag = AsyncRAGProcessor(search_client=self.search, openai_client=self.openai_client)
+        
+        try:
+            collection = await self.search.qdrant_client.get_collection(self.search.collection_name)
+            metadata = await self.search.get_collection_metadata()
+        except Exception as e:
+            logger.warning(f"Could not open collection {self.search.collection_name} during warm-up: {str(e)}")
+        else:
+            self.search.check_collection(collection.config.params.vectors, metadata)
+        logger.info("Async service container started")
+    
+    async def close(self):
+        """Close the shared async clients."""
+        if self.search is not None:
+            await self.search.qdrant_client.close()
+        if self.http_client is not None:
+            await self.http_client.aclose()
+        self.http_client = None
+        self.openai_client = None
+        self.search = None
+        self._rag = None
+
+
+_services: Optional[ServiceContainer] = None
+_services_lock = threading.Lock()
+
+
+def get_services() -> ServiceContainer:
+    """Return the service container for this process."""
+    global _services
+
+    with _services_lock:
+        if _services is None:
+            _services = ServiceContainer()
+        return _services
@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from typing import List, Dict, Any, Optional, Set
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+
+class SyncManifest:
+    """Persisted record of what has been indexed for each Notion page.
+
+    The manifest maps page_id -> {"last_edited_time", "content_hash", "chunks"}
+    and remembers the newest last_edited_time seen, which is used as the
+    lower bound of the next incremental database query. Pages whose content
+    could not be fetched are kept in failed_pages so the next sync fetches
+    them again even though they are older than that bound.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Initialize the manifest, loading it from disk if it exists.
+
+        Args:
+            path (Optional[str]): Location of the manifest file. Defaults to the
+                SYNC_MANIFEST_PATH environment variable, or a file next to the
+                local Qdrant storage.
+        """
+        self.path = path or os.getenv("SYNC_MANIFEST_PATH") or os.path.join(
+            tempfile.gettempdir(), "notion_sync_manifest.json"
+        )
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.last_edited_time: Optional[str] = None
+        self.failed_pages: Set[str] = set()
+        self.load()
+
+    def load(self):
+        """Load the manifest from disk. A missing or corrupt file yields an empty manifest."""
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.pages = data.get("pages", {})
+            self.last_edited_time = data.get("last_edited_time")
+            self.failed_pages = set(data.get("failed_pages", []))
+            logger.info(f"Loaded sync manifest with {len(self.pages)} pages from {self.path}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable sync manifest {self.path}: {str(e)}")
+            self.pages = {}
+            self.last_edited_time = None
+            self.failed_pages = set()
+
+    def save(self):
+        """Atomically write the manifest to disk."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "last_edited_time": self.last_edited_time,
+                "pages": self.pages,
+                "failed_pages": sorted(self.failed_pages)
+            }, f)
+        os.replace(tmp_path, self.path)
+        logger.info(f"Saved sync manifest with {len(self.pages)} pages to {self.path}")
+
+    @staticmethod
+    def hash_content(title: str, chunks: List[str]) -> str:
+        """Compute a stable hash of a page's indexed text.
+
+        Args:
+            title (str): The page title.
+            chunks (List[str]): The page's content chunks, in order.
+
+        Returns:
+            str: Hex-encoded sha256 digest.
+        """
+        digest = hashlib.sha256(title.encode("utf-8"))
+        for chunk in chunks:
+            digest.update(b"\x00")
+            digest.update(chunk.encode("utf-8"))
+        return digest.hexdigest()
+
+    def is_unchanged(self, page_id: str, content_hash: str) -> bool:
+        """Check whether a page's content matches what was last indexed."""
+        entry = self.pages.get(page_id)
+        return entry is not None and entry.get("content_hash") == content_hash
+
+    def record_page(self, page_id: str, last_edited_time: str, content_hash: str, chunks: int):
+        """Record that a page has been indexed.
+
+        Args:
+            page_id (str): The Notion page ID.
+            last_edited_time (str): The page's ISO 8601 last_edited_time.
+            content_hash (str): Hash of the indexed text, see hash_content().
+            chunks (int): Number of chunks stored for the page.
+        """
+        self.pages[page_id] = {
+            "last_edited_time": last_edited_time,
+            "content_hash": content_hash,
+            "chunks": chunks
+        }
+        self.failed_pages.discard(page_id)
+        # ISO 8601 timestamps in the same timezone compare correctly as strings
+        if last_edited_time and (self.last_edited_time is None or last_edited_time > self.last_edited_time):
+            self.last_edited_time = last_edited_time
+
+    def mark_failed(self, page_id: str):
+        """Remember that a page could not be fetched or fully embedded, so the next sync retries it.
+
+        The page's existing entry, if any, is kept: its previously indexed
+        chunks stay searchable until a fetch succeeds. The next sync replaces
+        the page's chunks whether or not its text changed.
+        """
+        self.failed_pages.add(page_id)
+
+    def remove_page(self, page_id: str):
+        """Forget a page that no longer exists in Notion."""
+        self.pages.pop(page_id, None)
+        self.failed_pages.discard(page_id)
+
+    def clear(self):
+        """Drop every entry, e.g. before a full re-index."""
+        self.pages = {}
+        self.last_edited_time = None
+        self.failed_pages = set()
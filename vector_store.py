@@ -1,30 +1,74 @@
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Callable
 from dotenv import load_dotenv
 import logging
+import re
+import time
 import uuid
 import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from embedding_backends import EmbeddingBackend, create_embedding_backend
+from monitoring import QDRANT_LATENCY, CHUNKS_UPSERTED
 
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+def get_metadata_id(collection_name: str) -> str:
+    """Return the ID of a physical collection's point in the metadata side collection."""
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, f"notion-collection-{collection_name}"))
+
+
+class EmbeddingMismatchError(ValueError):
+    """A collection was built with other embeddings than the configured backend produces."""
+
+
+def check_embedding_metadata(metadata: Dict[str, Any], expected: Dict[str, Any]):
+    """Raise EmbeddingMismatchError if a collection's recorded embedding settings differ from the expected ones.
+    
+    Keys missing from the metadata (collections built before they were recorded) are not checked.
+    
+    Args:
+        metadata (Dict[str, Any]): The collection's metadata.
+        expected (Dict[str, Any]): The embedding backend's metadata().
+    """
+    for key, value in expected.items():
+        if key in metadata and metadata[key] != value:
+            raise EmbeddingMismatchError(
+                f"Collection {metadata.get('collection')} has {key}={metadata[key]}, but {value} is configured; "
+                f"run a full index to rebuild it"
+            )
+
+
 class VectorStore:
-    def __init__(self):
-        """Initialize the vector store client."""
+    def __init__(self, embedding_backend: Optional[EmbeddingBackend] = None, client: Optional[QdrantClient] = None):
+        """Initialize the vector store client.
+        
+        Args:
+            embedding_backend (Optional[EmbeddingBackend]): Backend the stored vectors come
+                from; sets the vector size and is recorded on new collections. Defaults
+                to the one configured by EMBEDDING_BACKEND.
+            client (Optional[QdrantClient]): Shared Qdrant client. One is created from
+                environment variables if not given.
+        """
         # Check if QDRANT_URL is provided in environment variables
         qdrant_url = os.getenv("QDRANT_URL")
         
-        if qdrant_url:
+        if client is not None:
+            self.client = client
+            self.is_local = not qdrant_url
+        elif qdrant_url:
             # Use cloud-hosted Qdrant
             api_key = os.getenv("QDRANT_API_KEY")
             if not api_key:
                 raise ValueError("Qdrant API key not found in environment variables")
             
             self.client = QdrantClient(url=qdrant_url, api_key=api_key)
+            self.is_local = False
             logger.info(f"Connected to cloud Qdrant at {qdrant_url}")
         else:
             # Use local Qdrant - with tmpdir for GitHub Actions compatibility
@@ -33,70 +77,491 @@ class VectorStore:
             os.makedirs(storage_path, exist_ok=True)
             
             self.client = QdrantClient(path=storage_path)
+            self.is_local = True
             logger.info(f"Connected to local Qdrant storage at {storage_path}")
         
         self.collection_name = "notion_chunks"
-        self.vector_size = 1536  # Size of text-embedding-3-small embeddings
+        self.embedding_backend = embedding_backend or create_embedding_backend()
+        
+        # Qdrant (as of 1.11) has no collection metadata, so it is kept in a small
+        # side collection with one point per physical collection
+        self.metadata_collection = f"{self.collection_name}_metadata"
+        
+        # Upserts are batched by payload size and pipelined; local storage is
+        # not safe for concurrent writers, so it always uses a single batch in flight.
+        self.batch_max_bytes = int(os.getenv("VECTOR_STORE_BATCH_BYTES", str(4 * 1024 * 1024)))
+        self.batch_max_points = int(os.getenv("VECTOR_STORE_BATCH_POINTS", "512"))
+        self.max_in_flight = int(os.getenv("VECTOR_STORE_UPSERT_WORKERS", "4"))
+        
+        # Memory/accuracy tradeoff for new collections: quantized vectors stay in
+        # RAM for scoring, and the float32 originals can live on disk for rescoring
+        self.quantization = os.getenv("VECTOR_STORE_QUANTIZATION", "none").lower()
+        self.on_disk = os.getenv("VECTOR_STORE_ON_DISK", "false").lower() == "true"
+    
+    @property
+    def embedding_model(self) -> str:
+        return self.embedding_backend.model
+    
+    @property
+    def vector_size(self) -> int:
+        return self.embedding_backend.dimensions
+    
+    def get_live_collection(self) -> Optional[str]:
+        """Return the physical collection the alias points to, if any."""
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == self.collection_name:
+                return alias.collection_name
+        return None
+    
+    def get_versions(self) -> List[int]:
+        """Return the version numbers of all versioned collections, ascending."""
+        pattern = re.compile(rf"^{re.escape(self.collection_name)}_v(\d+)$")
+        versions = []
+        for collection in self.client.get_collections().collections:
+            match = pattern.match(collection.name)
+            if match:
+                versions.append(int(match.group(1)))
+        return sorted(versions)
     
-    def create_collection(self):
-        """Create the vector collection if it doesn't exist."""
+    def create_collection(self, collection_name: Optional[str] = None):
+        """Create a vector collection if it doesn't exist.
+        
+        Args:
+            collection_name (Optional[str]): Physical collection to create. When not
+                given, makes sure the live collection exists, creating a first
+                version and pointing the alias at it if needed.
+        """
+        if collection_name is None:
+            if self.collection_exists():
+                logger.info(f"Collection {self.collection_name} already exists")
+                return
+            collection_name = self.create_versioned_collection()
+            self.swap_alias(collection_name)
+            return
+        
         collections = self.client.get_collections().collections
         collection_names = [collection.name for collection in collections]
         
-        if self.collection_name not in collection_names:
+        if collection_name not in collection_names:
             # Use the OLD format for Qdrant 1.6.0
             self.client.create_collection(
-                collection_name=self.collection_name,
+                collection_name=collection_name,
                 vectors_config=models.VectorParams(
                     size=self.vector_size,
-                    distance=models.Distance.COSINE
-                )
+                    distance=models.Distance.COSINE,
+                    on_disk=self.on_disk
+                ),
+                quantization_config=self.get_quantization_config()
             )
-            logger.info(f"Created collection: {self.collection_name}")
+            # Grouped searches and page deletes filter on page_id (local storage has no payload indexes)
+            if not self.is_local:
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name="page_id",
+                    field_schema=models.PayloadSchemaType.KEYWORD
+                )
+            self.set_collection_metadata(collection_name, self.embedding_backend.metadata())
+            logger.info(f"Created collection: {collection_name} ({self.vector_size} dimensions)")
         else:
-            logger.info(f"Collection {self.collection_name} already exists")
+            logger.info(f"Collection {collection_name} already exists")
     
-    def store_embeddings(self, documents: List[Dict[str, Any]]):
-        """Store document embeddings in the vector store."""
-        # First recreate collection to clear existing data
-        try:
+    def get_quantization_config(self, quantization: Optional[str] = None) -> Optional[models.QuantizationConfig]:
+        """Return the Qdrant quantization config for a quantization mode.
+        
+        Args:
+            quantization (Optional[str]): "none", "scalar" (int8, 4x smaller) or
+                "binary" (1 bit per dimension, 32x smaller). Defaults to
+                VECTOR_STORE_QUANTIZATION.
+                
+        Returns:
+            Optional[models.QuantizationConfig]: The config, or None for no quantization.
+        """
+        quantization = quantization or self.quantization
+        if quantization == "none":
+            return None
+        if quantization == "scalar":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=True
+                )
+            )
+        if quantization == "binary":
+            return models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(always_ram=True)
+            )
+        raise ValueError(f"Unknown quantization: {quantization}")
+    
+    def create_versioned_collection(self) -> str:
+        """Create the next versioned collection (e.g. notion_chunks_v3) and return its name."""
+        versions = self.get_versions()
+        collection_name = f"{self.collection_name}_v{versions[-1] + 1 if versions else 1}"
+        self.create_collection(collection_name)
+        return collection_name
+    
+    def swap_alias(self, collection_name: str):
+        """Atomically point the alias that searches use at the given collection.
+        
+        Args:
+            collection_name (str): The physical collection to make live.
+        """
+        operations = []
+        if self.get_live_collection() is not None:
+            operations.append(models.DeleteAliasOperation(
+                delete_alias=models.DeleteAlias(alias_name=self.collection_name)
+            ))
+        elif self.collection_name in [collection.name for collection in self.client.get_collections().collections]:
+            # A collection from before versioning holds the alias name; it has to go first
+            logger.warning(f"Replacing unversioned collection {self.collection_name} with an alias")
             self.client.delete_collection(collection_name=self.collection_name)
-            logger.info(f"Deleted existing collection: {self.collection_name}")
-        except Exception as e:
-            logger.warning(f"Error deleting collection (may not exist yet): {str(e)}")
         
-        self.create_collection()
+        operations.append(models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=collection_name, alias_name=self.collection_name)
+        ))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        logger.info(f"Alias {self.collection_name} now points to {collection_name}")
+    
+    def garbage_collect(self, retention: Optional[int] = None):
+        """Delete old collection versions, keeping the live one and the newest `retention` others.
+        
+        Args:
+            retention (Optional[int]): Number of previous versions to keep for rollback.
+                Defaults to VECTOR_STORE_RETENTION (1).
+        """
+        if retention is None:
+            retention = int(os.getenv("VECTOR_STORE_RETENTION", "1"))
+        
+        live_collection = self.get_live_collection()
+        old_collections = [
+            f"{self.collection_name}_v{version}" for version in self.get_versions()
+            if f"{self.collection_name}_v{version}" != live_collection
+        ]
+        
+        for collection_name in old_collections[:max(len(old_collections) - retention, 0)]:
+            self.client.delete_collection(collection_name=collection_name)
+            self.delete_collection_metadata(collection_name)
+            logger.info(f"Deleted old collection version: {collection_name}")
+    
+    def set_collection_metadata(self, collection_name: str, metadata: Dict[str, Any]):
+        """Record metadata (e.g. embedding model and dimensions) for a physical collection.
+        
+        Args:
+            collection_name (str): The physical collection.
+            metadata (Dict[str, Any]): JSON-serializable metadata.
+        """
+        if not self.physical_collection_exists(self.metadata_collection):
+            self.client.create_collection(
+                collection_name=self.metadata_collection,
+                vectors_config=models.VectorParams(size=1, distance=models.Distance.DOT)
+            )
+        
+        self.client.upsert(
+            collection_name=self.metadata_collection,
+            points=[models.PointStruct(
+                id=get_metadata_id(collection_name),
+                vector=[1.0],
+                payload={"collection": collection_name, **metadata}
+            )],
+            wait=True
+        )
+    
+    def get_collection_metadata(self, collection_name: Optional[str] = None) -> Dict[str, Any]:
+        """Return the metadata of a collection.
         
-        # Prepare points for the vector store
-        points = []
-        for doc in documents:
-            # Convert document ID to a valid UUID
-            uuid_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"notion-chunk-{doc['id']}"))
+        Collections created before metadata was recorded report only their vector
+        size, read from the collection config.
+        
+        Args:
+            collection_name (Optional[str]): Physical collection. Defaults to the live collection.
             
-            # Use the OLD format for Qdrant 1.6.0
-            point = models.PointStruct(
-                id=uuid_id,
-                vector=doc["embedding"],  # Use unnamed vector format
-                payload={
-                    "chunk_id": doc["id"],
-                    "page_idx": doc["page_idx"],
-                    "page_id": doc["page_id"],
-                    "title": doc["title"],
-                    "chunk_idx": doc["chunk_idx"],
-                    "chunk": doc["chunk"],
-                    "total_chunks": doc["total_chunks"]
-                }
+        Returns:
+            Dict[str, Any]: The collection's metadata.
+        """
+        collection_name = collection_name or self.get_live_collection() or self.collection_name
+        
+        if self.physical_collection_exists(self.metadata_collection):
+            records = self.client.retrieve(
+                collection_name=self.metadata_collection,
+                ids=[get_metadata_id(collection_name)],
+                with_payload=True
             )
+            if records:
+                return records[0].payload
+        
+        vectors = self.client.get_collection(collection_name).config.params.vectors
+        return {"collection": collection_name, "embedding_dimensions": vectors.size}
+    
+    def record_index_version(self, page_versions: Dict[str, str], collection_name: Optional[str] = None) -> str:
+        """Record a new index version, with the content hash of every indexed page, on a collection.
+        
+        Servers, possibly on other hosts than the indexer, compare the version to
+        notice that the collection changed and the page hashes to tell which pages did.
+        
+        Args:
+            page_versions (Dict[str, str]): Content hash of each indexed page, as in the sync manifest.
+            collection_name (Optional[str]): Physical collection. Defaults to the live collection.
             
-            points.append(point)
-        
-        # Store points in batches
-        batch_size = 100
-        for i in range(0, len(points), batch_size):
-            batch = points[i:i+batch_size]
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=batch,
+        Returns:
+            str: The new index version.
+        """
+        collection_name = collection_name or self.get_live_collection() or self.collection_name
+        index_version = f"{collection_name}:{uuid.uuid4().hex}"
+        metadata = self.get_collection_metadata(collection_name)
+        metadata.pop("collection", None)
+        self.set_collection_metadata(collection_name, {**metadata, "index_version": index_version, "page_versions": page_versions})
+        return index_version
+    
+    def delete_collection_metadata(self, collection_name: str):
+        """Forget the metadata of a deleted collection."""
+        if self.physical_collection_exists(self.metadata_collection):
+            self.client.delete(
+                collection_name=self.metadata_collection,
+                points_selector=models.PointIdsList(points=[get_metadata_id(collection_name)]),
                 wait=True
             )
-            logger.info(f"Stored batch of {len(batch)} document chunks")
\ No newline at end of file
+    
+    def check_collection_metadata(self, collection_name: Optional[str] = None):
+        """Make sure a collection was built with the configured embedding backend, model and dimensions.
+        
+        Args:
+            collection_name (Optional[str]): Physical collection. Defaults to the live collection.
+            
+        Raises:
+            ValueError: If the collection was built with different embeddings.
+        """
+        check_embedding_metadata(self.get_collection_metadata(collection_name), self.embedding_backend.metadata())
+    
+    def collection_exists(self) -> bool:
+        """Check whether the live collection (alias or unversioned collection) exists."""
+        if self.get_live_collection() is not None:
+            return True
+        collections = self.client.get_collections().collections
+        return self.collection_name in [collection.name for collection in collections]
+    
+    def _build_point(self, doc: Dict[str, Any]) -> models.PointStruct:
+        """Convert an embedded document into a Qdrant point."""
+        if len(doc["embedding"]) != self.vector_size:
+            raise ValueError(f"Embedding of chunk {doc['id']} has {len(doc['embedding'])} dimensions, expected {self.vector_size}")
+        
+        # Convert document ID to a valid UUID
+        uuid_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"notion-chunk-{doc['id']}"))
+        
+        # Use the OLD format for Qdrant 1.6.0
+        return models.PointStruct(
+            id=uuid_id,
+            vector=doc["embedding"],  # Use unnamed vector format
+            payload={
+                "chunk_id": doc["id"],
+                "page_idx": doc["page_idx"],
+                "page_id": doc["page_id"],
+                "title": doc["title"],
+                "chunk_idx": doc["chunk_idx"],
+                "chunk": doc["chunk"],
+                "heading_path": doc.get("heading_path", ""),
+                "total_chunks": doc["total_chunks"]
+            }
+        )
+    
+    def store_embeddings(self, documents: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Store document embeddings as a full rebuild of the vector store.
+        
+        The documents are written to a new versioned collection, and the alias is
+        only switched to it once every batch is stored, so searches keep hitting
+        the previous version until then. Old versions are garbage-collected.
+        
+        Args:
+            documents (Iterable[Dict[str, Any]]): Documents with embeddings; may be a
+                generator, so storage overlaps with embedding generation.
+                
+        Returns:
+            Dict[str, Any]: Upsert stats, see upsert_documents().
+        """
+        new_collection = self.create_versioned_collection()
+        
+        try:
+            stats = self.upsert_documents(documents, collection_name=new_collection)
+        except Exception:
+            logger.error(f"Rebuild failed, dropping incomplete collection {new_collection}")
+            self.client.delete_collection(collection_name=new_collection)
+            self.delete_collection_metadata(new_collection)
+            raise
+        
+        self.swap_alias(new_collection)
+        self.garbage_collect()
+        return stats
+    
+    @staticmethod
+    def estimate_point_bytes(doc: Dict[str, Any]) -> int:
+        """Roughly estimate the serialized size of a document's point."""
+        # ~12 bytes per float in JSON, plus the text payload and field overhead
+        return 12 * len(doc["embedding"]) + len(doc["chunk"].encode("utf-8")) + len(doc["title"].encode("utf-8")) + 256
+    
+    def upsert_documents(
+        self,
+        documents: Iterable[Dict[str, Any]],
+        collection_name: Optional[str] = None,
+        on_batch_stored: Optional[Callable[[List[models.PointStruct]], None]] = None
+    ) -> Dict[str, Any]:
+        """Insert or replace document embeddings without clearing the collection.
+        
+        Documents are consumed lazily and packed into batches bounded by payload
+        bytes and point count. Up to max_in_flight batches are sent concurrently
+        without waiting for indexing; only the final batch is sent with wait=True,
+        after every earlier batch has been acknowledged.
+        
+        Args:
+            documents (Iterable[Dict[str, Any]]): Documents with embeddings.
+            collection_name (Optional[str]): Physical collection to write to. Defaults
+                to the live collection.
+            on_batch_stored (Optional[Callable]): Called from the calling thread with
+                each batch of points once Qdrant has acknowledged it.
+                
+        Returns:
+            Dict[str, Any]: Upsert stats (points, batches, seconds, points_per_sec).
+        """
+        if collection_name is None:
+            self.create_collection()
+            collection_name = self.collection_name
+        
+        start_time = time.time()
+        points_stored = 0
+        batches_stored = 0
+        max_in_flight = 1 if self.is_local else self.max_in_flight
+        
+        def upsert_batch(batch, wait):
+            with QDRANT_LATENCY.labels(operation="upsert").time():
+                self.client.upsert(
+                    collection_name=collection_name,
+                    points=batch,
+                    wait=wait
+                )
+            CHUNKS_UPSERTED.inc(len(batch))
+            logger.info(f"Stored batch of {len(batch)} document chunks")
+            return batch
+        
+        def batch_stored(batch):
+            if on_batch_stored:
+                on_batch_stored(batch)
+            return len(batch)
+        
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            in_flight = deque()
+            full_batch = None
+            batch = []
+            batch_bytes = 0
+            
+            for doc in documents:
+                point_bytes = self.estimate_point_bytes(doc)
+                if batch and (batch_bytes + point_bytes > self.batch_max_bytes or len(batch) >= self.batch_max_points):
+                    # Hold one full batch back so the last batch sent can carry wait=True
+                    if full_batch:
+                        if len(in_flight) >= max_in_flight:
+                            points_stored += batch_stored(in_flight.popleft().result())
+                            batches_stored += 1
+                        in_flight.append(executor.submit(upsert_batch, full_batch, False))
+                    full_batch = batch
+                    batch = []
+                    batch_bytes = 0
+                
+                batch.append(self._build_point(doc))
+                batch_bytes += point_bytes
+            
+            final_batch = batch
+            if full_batch and batch:
+                in_flight.append(executor.submit(upsert_batch, full_batch, False))
+            elif full_batch:
+                final_batch = full_batch
+            
+            while in_flight:
+                points_stored += batch_stored(in_flight.popleft().result())
+                batches_stored += 1
+        
+        if final_batch:
+            points_stored += batch_stored(upsert_batch(final_batch, True))
+            batches_stored += 1
+        
+        elapsed = time.time() - start_time
+        stats = {
+            "points": points_stored,
+            "batches": batches_stored,
+            "seconds": round(elapsed, 3),
+            "points_per_sec": round(points_stored / elapsed, 1) if elapsed > 0 else 0.0
+        }
+        logger.info(f"Upserted {stats['points']} points in {stats['batches']} batches ({stats['points_per_sec']} points/sec)")
+        return stats
+    
+    def delete_pages(self, page_ids: List[str], collection_name: Optional[str] = None):
+        """Delete every chunk belonging to the given pages.
+        
+        Args:
+            page_ids (List[str]): IDs of the Notion pages to remove.
+            collection_name (Optional[str]): Physical collection to delete from.
+                Defaults to the live collection.
+        """
+        if not page_ids:
+            return
+        
+        self.client.delete(
+            collection_name=collection_name or self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[
+                        models.FieldCondition(
+                            key="page_id",
+                            match=models.MatchAny(any=list(page_ids))
+                        )
+                    ]
+                )
+            ),
+            wait=True
+        )
+        logger.info(f"Deleted chunks for {len(page_ids)} pages")
+    
+    def delete_stale_chunks(self, page_id: str, total_chunks: int, collection_name: Optional[str] = None):
+        """Delete chunks of a page left over from a version with a different chunk count.
+        
+        Args:
+            page_id (str): The Notion page ID.
+            total_chunks (int): The page's current number of chunks.
+            collection_name (Optional[str]): Physical collection to delete from.
+                Defaults to the live collection.
+        """
+        self.client.delete(
+            collection_name=collection_name or self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[models.FieldCondition(key="page_id", match=models.MatchValue(value=page_id))],
+                    must_not=[models.FieldCondition(key="total_chunks", match=models.MatchValue(value=total_chunks))]
+                )
+            ),
+            wait=True
+        )
+    
+    def physical_collection_exists(self, collection_name: str) -> bool:
+        """Check whether a physical (non-alias) collection exists."""
+        return collection_name in [collection.name for collection in self.client.get_collections().collections]
+    
+    def iter_points(self, collection_name: Optional[str] = None, batch_size: int = 1000) -> Iterable[models.Record]:
+        """Scroll through every point of a collection, with payloads but without vectors.
+        
+        Args:
+            collection_name (Optional[str]): Physical collection to read. Defaults
+                to the live collection.
+            batch_size (int): Points fetched per request.
+            
+        Yields:
+            models.Record: The stored points.
+        """
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection_name or self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            yield from points
+            if offset is None:
+                break